@@ -0,0 +1,67 @@
+"""
+Compares one-contract-per-request annotation with batched prompts.
+
+Usage: python benchmarks/bench_batching.py [--contracts N] [--batch-sizes 1,4,8] [--live]
+
+Contracts are taken from the recorded article fixtures and repeated up to N.
+By default requests go to the fake completions server from tests/fakes.py,
+which charges ~4 characters per token and answers after a latency that grows
+with the completion length. With --live the real API is used (OPENAI_API_KEY
+must be set, and every run costs money). Reports tokens per contract and
+contracts per minute for each batch size.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT.joinpath("src")))
+sys.path.insert(0, str(ROOT.joinpath("tests")))
+
+from annotation_engine import AnnotationEngine
+from config import Config
+from fakes import FIXTURES, start_fake_openai, stop
+from scraper import Scraper
+
+def load_contracts(n: int) -> list:
+    scraper = Scraper(Config())
+    contracts = []
+    for path in sorted(FIXTURES.joinpath("defense_gov").glob("article_*.html")):
+        contracts.extend(scraper.parse_date_contract(path.read_bytes(), f"https://www.defense.gov/{path.stem}/") or [])
+    return [contracts[i % len(contracts)] for i in range(n)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contracts", type=int, default=64)
+    parser.add_argument("--batch-sizes", default="1,4,8")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--live", action="store_true", help="Use the real API instead of the fake server")
+    args = parser.parse_args()
+
+    contracts = load_contracts(args.contracts)
+    server = None
+    if not args.live:
+        import openai
+        server = start_fake_openai(latency=0.2, latency_per_token=0.002, max_delay=0)
+
+    print(f"{'batch':>5} {'requests':>8} {'tokens/contract':>15} {'contracts/min':>13} {'requeued':>8}")
+    try:
+        for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+            config = Config(annotation_batch_size=batch_size, max_concurrent_requests=args.concurrency)
+            client = None
+            if server:
+                client = openai.AsyncOpenAI(base_url=server.base_url, api_key="fake", max_retries=0)
+            engine = AnnotationEngine(config, client=client)
+            start = time.perf_counter()
+            engine.run(contracts)
+            elapsed = time.perf_counter() - start
+            tokens = engine.stats["prompt_tokens"] + engine.stats["completion_tokens"]
+            print(f"{batch_size:>5} {engine.stats['requests']:>8} {tokens / len(contracts):>15.0f} "
+                  f"{60 * len(contracts) / elapsed:>13.0f} {engine.stats['requeued']:>8}")
+    finally:
+        if server:
+            stop(server)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Compares scalar and batch normalization of money amounts and dates.
+
+Usage: python benchmarks/bench_normalize.py [--values N] [--distinct N]
+
+Generates N synthetic annotation values, drawn from a pool of distinct strings
+the way real completion dates and round amounts repeat, and times a loop over
+parse_money/parse_date against one parse_money_batch/parse_date_batch call.
+Both must agree on every value.
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT.joinpath("src")))
+
+import pandas as pd
+from normalize import MONTHS, parse_date, parse_date_batch, parse_money, parse_money_batch
+
+def synthetic(values: int, distinct: int, seed: int = 0):
+    rng = random.Random(seed)
+    amounts, dates = [], []
+    for _ in range(distinct):
+        amounts.append(rng.choice([
+            f"${rng.randint(10000, 999999999):,}",
+            f"${rng.randint(1, 999) / 10} million",
+            f"${rng.randint(1, 20)}B",
+            "Not specified",
+        ]))
+        month = rng.choice(MONTHS)
+        dates.append(rng.choice([
+            f"{month} {rng.randint(1, 28)}, {rng.randint(2024, 2035)}",
+            f"{month[:3]}. {rng.randint(1, 28)}, {rng.randint(2024, 2035)}",
+            f"{month} {rng.randint(2024, 2035)}",
+            "To be determined",
+        ]))
+    return [rng.choice(amounts) for _ in range(values)], [rng.choice(dates) for _ in range(values)]
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--values", type=int, default=1_000_000)
+    parser.add_argument("--distinct", type=int, default=20_000)
+    args = parser.parse_args()
+
+    amounts, dates = synthetic(args.values, args.distinct)
+    # parse_date is lru_cached, so clear it for a fair first pass
+    parse_date.cache_clear()
+    scalar_money, scalar_money_time = timed(lambda: [parse_money(value) for value in amounts])
+    scalar_dates, scalar_dates_time = timed(lambda: [parse_date(value) for value in dates])
+    batch_money, batch_money_time = timed(parse_money_batch, amounts)
+    batch_dates, batch_dates_time = timed(parse_date_batch, dates)
+
+    for expected, value in zip(scalar_money, batch_money):
+        assert pd.isna(value) if expected is None else value == expected
+    for expected, value in zip(scalar_dates, batch_dates):
+        assert value is pd.NaT if expected is None else value.to_pydatetime() == expected
+
+    print(f"{args.values} values, {args.distinct} distinct")
+    print(f"{'':8} {'scalar':>10} {'batch':>10} {'speedup':>8}")
+    for name, scalar, batch in (("money", scalar_money_time, batch_money_time),
+                                ("dates", scalar_dates_time, batch_dates_time)):
+        print(f"{name:8} {scalar:9.3f}s {batch:9.3f}s {scalar / batch:7.1f}x")
+
+if __name__ == "__main__":
+    main()
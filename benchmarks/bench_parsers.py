@@ -0,0 +1,66 @@
+"""
+Compares the HTML parsing backends in htmlparse on recorded defense.gov pages.
+
+Usage: python benchmarks/bench_parsers.py [--iterations N] [--padding KB] [pages ...]
+
+By default the article fixtures from tests/fixtures/defense_gov are used. Real
+pages carry ~100-200 KB of navigation, scripts and footer around the article,
+so the fixtures are padded with that much boilerplate markup to approximate
+the real parse cost. Every backend must produce the same Precontracts.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT.joinpath("src")))
+
+from config import Config
+from htmlparse import PARSERS
+from scraper import Scraper
+
+BOILERPLATE = (
+    '<div class="nav-item"><ul class="menu"><li><a href="/News/">News</a></li>'
+    '<li><a href="/Spotlights/" class="link">Spotlights</a></li></ul>'
+    '<script type="text/javascript">var config = {"a": 1, "b": [1, 2, 3]};</script></div>\n'
+)
+
+def pad(content: bytes, kilobytes: int) -> bytes:
+    padding = (BOILERPLATE * (kilobytes * 1024 // len(BOILERPLATE) + 1)).encode("utf-8")
+    return content.replace(b"<body>", b"<body>\n" + padding, 1).replace(b"</body>", padding + b"</body>", 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages", nargs="*", type=Path)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--padding", type=int, default=150, help="KB of boilerplate added before and after fixture bodies")
+    args = parser.parse_args()
+
+    paths = args.pages or sorted(ROOT.joinpath("tests", "fixtures", "defense_gov").glob("article_*.html"))
+    pages = [path.read_bytes() for path in paths]
+    if not args.pages:
+        pages = [pad(page, args.padding // 2) for page in pages]
+    url = "https://www.defense.gov/News/Contracts/Contract/Article/1/"
+    total_mb = sum(len(page) for page in pages) / 1e6
+
+    results = {}
+    for name in PARSERS:
+        scraper = Scraper(Config(html_parser=name))
+        results[name] = [scraper.parse_date_contract(page, url) for page in pages]
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            for page in pages:
+                scraper.parse_date_contract(page, url)
+        elapsed = time.perf_counter() - start
+        count = args.iterations * len(pages)
+        print(f"{name:12} {1000 * elapsed / count:8.2f} ms/page {count / elapsed:8.1f} pages/s {args.iterations * total_mb / elapsed:7.1f} MB/s")
+
+    outputs = list(results.values())
+    if any(output != outputs[0] for output in outputs[1:]):
+        print("Backends produced different Precontracts")
+        sys.exit(1)
+    print(f"All backends agree on {len(pages)} pages")
+
+if __name__ == "__main__":
+    main()
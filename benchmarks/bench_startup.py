@@ -0,0 +1,90 @@
+"""
+Measures how long the CLI and each pipeline module take to start.
+
+Usage: python benchmarks/bench_startup.py [--runs N] [--budget SECONDS] [--results FILE]
+
+For every command, times a fresh interpreter that runs `cli.py <command> --help`
+(interpreter and argument parsing) and one that imports the module the
+command runs (what the command pays before doing any work), and reports the
+median over --runs. Commands whose startup exceeds --budget are flagged and
+the exit status is 1. The heaviest imports of each module, from
+`python -X importtime`, are listed so regressions can be traced.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+SRC = ROOT.joinpath("src")
+
+# The module each CLI command imports when it runs
+COMMANDS = {
+    "crawl": "scraper",
+    "clean": "scraper",
+    "annotate": "annotator",
+    "validate": "annotator",
+    "convert": "SpacyProcessor",
+    "infer": "infer",
+}
+
+def timed_run(*args: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=SRC, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+def median_run(runs: int, *args: str) -> float:
+    return statistics.median(timed_run(*args) for _ in range(runs))
+
+def heaviest_imports(module: str, top: int = 5) -> list:
+    """
+    Return: (cumulative seconds, package) of the slowest top-level imports of `module`
+    """
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=SRC, check=True, capture_output=True, text=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting is shown by indentation, keep the direct imports of the module
+        if name.startswith("   ") and not name.startswith("    "):
+            imports.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.0, help="Seconds a command may take to start")
+    parser.add_argument("--results", type=Path, default=ROOT.joinpath("benchmarks", "results", "startup.json"))
+    args = parser.parse_args()
+
+    baseline = median_run(args.runs, "-c", "pass")
+    results = {"interpreter": baseline, "commands": {}}
+    print(f"interpreter {baseline:.3f}s")
+    print(f"{'command':10} {'--help':>8} {'imports':>8} {'module':16} heaviest imports")
+    over_budget = []
+    for command, module in COMMANDS.items():
+        help_time = median_run(args.runs, "cli.py", command, "--help")
+        import_time = median_run(args.runs, "-c", f"import cli, {module}")
+        heaviest = heaviest_imports(module)
+        results["commands"][command] = {"help": help_time, "import": import_time, "module": module,
+                                        "heaviest_imports": heaviest}
+        print(f"{command:10} {help_time:7.3f}s {import_time:7.3f}s {module:16} "
+              + ", ".join(f"{name} {seconds:.2f}s" for seconds, name in heaviest[:3]))
+        if max(help_time, import_time) > args.budget:
+            over_budget.append(command)
+
+    args.results.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.results, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=4)
+    if over_budget:
+        print(f"Over the {args.budget:.1f}s budget: {', '.join(over_budget)}")
+        sys.exit(1)
+    print(f"Every command starts within {args.budget:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""
+Times every pipeline stage offline and flags regressions against a baseline.
+
+Usage: python benchmarks/bench_suite.py [--stages fetch parse ...] [--scale N] [--repeat N]
+                                        [--results FILE] [--baseline FILE] [--save-baseline]
+                                        [--tolerance 0.2]
+
+Stages and what they run:
+    fetch     Scraper.get_date_contract against the recorded defense.gov pages
+              served by the local stand-in from tests/fakes.py
+    parse     Scraper.parse_date_contract on the article fixtures, padded with
+              boilerplate to the size of real pages
+    clean     scraper.clean_file on synthetic raw files
+    annotate  AnnotationEngine against the fake completions server
+    validate  validation.validate_file (Annotator.clean_safe_annotation) on
+              synthetic blackbox annotations
+    convert   SpacyProcessor.convert_data on synthetic manual annotations,
+              skipped when spaCy or the model is not installed
+    align     ManualData.align_file, the per-file work of correct_start_end
+
+Synthetic corpora are made from the contracts in the article fixtures, with
+their numbers varied, and grow linearly with --scale. Every stage is run once
+under tracemalloc for its peak Python memory, then --repeat times for timing.
+Reports items/sec (median run), per-item latency percentiles and peak memory,
+and writes them to --results as JSON. With --baseline, stages whose
+throughput fell, or whose p95 latency or peak memory grew, by more than
+--tolerance are flagged, and the exit status is 1. --save-baseline also
+writes the results to the baseline file.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT.joinpath("src")))
+sys.path.insert(0, str(ROOT.joinpath("tests")))
+sys.path.insert(0, str(ROOT.joinpath("benchmarks")))
+
+from bench_parsers import pad
+from config import Config
+from fakes import FIXTURES, start_defense_gov, start_fake_openai, stop
+from model import Precontract
+from scraper import DateTimeEncoder, Scraper
+
+URL = "https://www.defense.gov/News/Contracts/Contract/Article/{}/"
+DIGITS = re.compile(r"\d")
+
+def fixture_contracts() -> List[Precontract]:
+    scraper = Scraper(Config())
+    contracts = []
+    for path in sorted(FIXTURES.joinpath("defense_gov").glob("article_*.html")):
+        contracts.extend(scraper.parse_date_contract(path.read_bytes(), URL.format(path.stem[8:])) or [])
+    return contracts
+
+def synthetic_contracts(n: int, seed: int = 0) -> List[Precontract]:
+    """
+    n Precontracts cycled from the fixtures, with every digit but those of the
+    first contracts replaced, so that caches keyed by text do not flatter the timings.
+    """
+    rng = random.Random(seed)
+    base = fixture_contracts()
+    contracts = []
+    for i in range(n):
+        contract = base[i % len(base)]
+        text = contract.contract_text
+        if i >= len(base):
+            text = DIGITS.sub(lambda _: str(rng.randint(0, 9)), text)
+        contracts.append(Precontract(contract.military_branch, URL.format(i), text + "\n", contract.contract_date))
+    return contracts
+
+def annotation(contract: Precontract) -> str:
+    """
+    An annotation line that passes validation, as the completions endpoint would write it.
+    """
+    amount = re.search(r"\$[\d,]+", contract.contract_text)
+    return json.dumps({
+        "contract_id": "FA8650-24-C-" + str(abs(hash(contract.source_url)) % 10000).zfill(4),
+        "federal_agency": "Air Force Research Laboratory",
+        "contract_amount": amount.group() if amount else "$1,000,000",
+        "company_name": contract.contract_text.split(",", 1)[0],
+        "location": "Malibu, California",
+        "contract_description": "research and development",
+        "estimated_completion_date": "July 19, 2029",
+        "funds_obligated": "$1,000,000"
+    })
+
+def write_files(directory: Path, contracts: List[Precontract], per_file: int, lines: Callable = None):
+    """
+    Writes the contracts to <directory>/<date>_<n>.json, per_file at a time, or
+    one line per contract when `lines` formats them.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    names = []
+    for n, start in enumerate(range(0, len(contracts), per_file)):
+        chunk = contracts[start:start + per_file]
+        name = f"2024-04-19_{n}.json"
+        with open(directory.joinpath(name), 'w', encoding='utf-8') as file:
+            if lines:
+                file.write("".join(lines(contract) + "\n" for contract in chunk))
+            else:
+                json.dump([asdict(contract) for contract in chunk], file, cls=DateTimeEncoder)
+        names.append(name)
+    return names
+
+def each(fn: Callable, items) -> List[float]:
+    """
+    Calls fn on every item. Return: latency of every call, in seconds
+    """
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+# Every stage takes (work directory, scale) and returns the function to time,
+# which returns the latencies of the items it processed
+
+def stage_fetch(workdir: Path, scale: int):
+    server = start_defense_gov()
+    scraper = Scraper(Config(base_url=server.base_url, data_dir=str(workdir), rate_limit=0, page_cache=False))
+    ids = [path.stem[8:] for path in sorted(FIXTURES.joinpath("defense_gov").glob("article_*.html"))]
+    urls = [f"{server.host}/News/Contracts/Contract/Article/{i}/" for i in ids] * (10 * scale)
+    return lambda: each(scraper.get_date_contract, urls), lambda: stop(server)
+
+def stage_parse(workdir: Path, scale: int):
+    scraper = Scraper(Config())
+    pages = [pad(path.read_bytes(), 75) for path in sorted(FIXTURES.joinpath("defense_gov").glob("article_*.html"))]
+    pages = pages * (4 * scale)
+    return lambda: each(lambda page: scraper.parse_date_contract(page, URL.format(1)), pages), None
+
+def stage_clean(workdir: Path, scale: int):
+    from scraper import clean_file
+    raw, clean = workdir.joinpath("raw"), workdir.joinpath("clean")
+    names = write_files(raw, synthetic_contracts(1000 * scale), 50)
+    clean.mkdir(exist_ok=True)
+    return lambda: each(lambda name: clean_file(raw.joinpath(name), clean.joinpath(name)), names), None
+
+def stage_annotate(workdir: Path, scale: int):
+    import openai
+    from annotation_engine import AnnotationEngine
+    server = start_fake_openai(latency=0.02, latency_per_token=0.0002, max_delay=0)
+    client = openai.AsyncOpenAI(base_url=server.base_url, api_key="fake", max_retries=0)
+    latencies = []
+
+    async def create(**params):
+        start = time.perf_counter()
+        try:
+            return await client.chat.completions.create(**params)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    timed_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    contracts = synthetic_contracts(50 * scale)
+    config = Config(annotation_cache="", max_concurrent_requests=16)
+
+    def run():
+        latencies.clear()
+        AnnotationEngine(config, client=timed_client).run(contracts)
+        return list(latencies)
+    return run, lambda: stop(server)
+
+def stage_validate(workdir: Path, scale: int):
+    from validation import validate_file
+    contracts = synthetic_contracts(1000 * scale)
+    names = write_files(workdir.joinpath("clean"), contracts, 50)
+    write_files(workdir.joinpath("blackbox"), contracts, 50, lines=annotation)
+    return lambda: each(lambda name: validate_file(name, str(workdir)), names), None
+
+def manual_annotations(n: int) -> List[dict]:
+    data = []
+    for contract in synthetic_contracts(n):
+        text = contract.contract_text
+        entities = []
+        for label, match in (("company_name", re.match(r"[^,]+", text)), ("contract_amount", re.search(r"\$[\d,]+", text))):
+            if match:
+                # Offsets drifted by a few characters, as after editing the text
+                entities.append({"type": label, "value": match.group(), "start": match.start() + 3, "end": match.end() + 3})
+        data.append({"text": text, "entities": entities})
+    return data
+
+def stage_convert(workdir: Path, scale: int):
+    import importlib.util
+    if importlib.util.find_spec("spacy") is None:
+        raise ModuleNotFoundError("spaCy is not installed")
+    from spacy.tokens import DocBin
+    from SpacyProcessor import SpacyProcessor
+    from ManualData import align_entities
+    data = manual_annotations(500 * scale)
+    for contract in data:
+        align_entities(contract)
+    workdir.joinpath("spacy").mkdir(exist_ok=True)
+    # Loading the model is setup: it is not timed, and a missing model skips the stage
+    processor = SpacyProcessor(Config(data_dir=str(workdir)))
+
+    def run():
+        processor.doc_bin = DocBin()
+        start = time.perf_counter()
+        report = processor.convert_data(data)
+        # Docs are made in batches, so the latency is the mean per doc
+        return [(time.perf_counter() - start) / max(report["docs"], 1)] * report["docs"]
+    return run, None
+
+def stage_align(workdir: Path, scale: int):
+    from ManualData import align_file
+    manual = workdir.joinpath("manual")
+    manual.mkdir(exist_ok=True)
+    data = manual_annotations(1000 * scale)
+    paths = [manual.joinpath(f"{n}.json") for n in range(0, len(data), 50)]
+
+    def run():
+        # align_file fixes the offsets in place, so every run starts from drifted offsets
+        for path, start in zip(paths, range(0, len(data), 50)):
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(data[start:start + 50], file)
+        return each(align_file, paths)
+    return run, None
+
+STAGES: Dict[str, Callable] = {
+    "fetch": stage_fetch,
+    "parse": stage_parse,
+    "clean": stage_clean,
+    "annotate": stage_annotate,
+    "validate": stage_validate,
+    "convert": stage_convert,
+    "align": stage_align,
+}
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+def measure(stage: Callable, workdir: Path, scale: int, repeat: int) -> dict:
+    """
+    Return: items, seconds and items_per_sec of the median run, p50/p95/p99
+    latency in milliseconds over all runs, and peak_mb
+    """
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            run, teardown = stage(workdir, scale)
+    except (ImportError, OSError) as e:
+        return {"skipped": str(e)}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracemalloc.start()
+            try:
+                run()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            runs, latencies = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                items = run()
+                runs.append((time.perf_counter() - start, len(items)))
+                latencies.extend(items)
+    finally:
+        if teardown:
+            teardown()
+    seconds, items = sorted(runs)[len(runs) // 2]
+    return {
+        "items": items,
+        "seconds": seconds,
+        "items_per_sec": items / seconds,
+        "p50_ms": 1000 * percentile(latencies, 0.50),
+        "p95_ms": 1000 * percentile(latencies, 0.95),
+        "p99_ms": 1000 * percentile(latencies, 0.99),
+        "peak_mb": peak / 2 ** 20,
+    }
+
+def run_suite(stages: List[str], scale: int = 1, repeat: int = 3) -> dict:
+    results = {}
+    for name in stages:
+        with tempfile.TemporaryDirectory() as workdir:
+            results[name] = measure(STAGES[name], Path(workdir), scale, repeat)
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float) -> Dict[str, List[str]]:
+    """
+    Return: The regressions of every stage measured in both, by stage name
+    """
+    regressions = {}
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before or "skipped" in result or "skipped" in before:
+            continue
+        found = []
+        if result["items_per_sec"] < before["items_per_sec"] * (1 - tolerance):
+            found.append(f"items/sec {before['items_per_sec']:.1f} -> {result['items_per_sec']:.1f}")
+        for key, label in (("p95_ms", "p95 ms"), ("peak_mb", "peak MB")):
+            if result[key] > before[key] * (1 + tolerance):
+                found.append(f"{label} {before[key]:.2f} -> {result[key]:.2f}")
+        if found:
+            regressions[name] = found
+    return regressions
+
+def metadata(scale: int, repeat: int) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "scale": scale,
+        "repeat": repeat,
+    }
+
+def print_results(results: dict, baseline: Optional[dict] = None):
+    print(f"{'stage':10} {'items':>7} {'items/sec':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'peak MB':>8} {'vs base':>8}")
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name:10} skipped: {result['skipped']}")
+            continue
+        change = ""
+        if baseline and "items_per_sec" in baseline.get(name, {}):
+            change = f"{100 * (result['items_per_sec'] / baseline[name]['items_per_sec'] - 1):+7.1f}%"
+        print(f"{name:10} {result['items']:7} {result['items_per_sec']:10.1f} {result['p50_ms']:8.2f} "
+              f"{result['p95_ms']:8.2f} {result['p99_ms']:8.2f} {result['peak_mb']:8.1f} {change:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--scale", type=int, default=1, help="Multiplies the size of every corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage")
+    parser.add_argument("--results", type=Path, default=ROOT.joinpath("benchmarks", "results", "suite.json"))
+    parser.add_argument("--baseline", type=Path, default=ROOT.joinpath("benchmarks", "results", "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative change before flagging")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline.exists() and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline["meta"]["scale"] != args.scale:
+            print(f"Baseline was measured at scale {baseline['meta']['scale']}, not comparing")
+            baseline = None
+
+    results = run_suite(args.stages, args.scale, args.repeat)
+    print_results(results, baseline["stages"] if baseline else None)
+    report = {"meta": metadata(args.scale, args.repeat), "stages": results}
+    args.results.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.results, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=4)
+    if args.save_baseline:
+        shutil.copyfile(args.results, args.baseline)
+        print(f"Saved baseline to {args.baseline}")
+
+    if baseline:
+        regressions = compare(results, baseline["stages"], args.tolerance)
+        for name, found in regressions.items():
+            print(f"REGRESSION {name}: {', '.join(found)}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {100 * args.tolerance:.0f}% against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Trains and evaluates the NER training profiles on the data/spacy train/test sets.
+
+Usage: python benchmarks/bench_training.py [--profiles transformer cpu] [--skip-train]
+                                           [--gpu-id N] [--max-steps N] [--output-dir DIR] [--results FILE]
+
+For every profile the partial config is filled in, trained with
+`python -m spacy train` (unless --skip-train, which evaluates the models
+already in the output directory) and model-best, picked by its score on the
+dev set, is evaluated on the held-out test set.
+Reports per-entity F1, words/sec and the size of the model on disk, and
+writes them to --results as JSON. Build the corpus first with
+SpacyProcessor.build_corpus.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT.joinpath("src")))
+
+PROFILES = {
+    "transformer": ROOT.joinpath("base_config.cfg"),
+    "cpu": ROOT.joinpath("cpu_config.cfg"),
+}
+
+def spacy_command(*args: str):
+    env = dict(os.environ, PYTHONPATH=str(ROOT.joinpath("src")))
+    subprocess.run([sys.executable, "-m", "spacy", *args], check=True, cwd=ROOT, env=env)
+
+def train(profile: str, output_dir: Path, gpu_id: int, max_steps: int) -> float:
+    """
+    Return: Training time in seconds
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    config_path = output_dir.joinpath("config.cfg")
+    spacy_command("init", "fill-config", str(PROFILES[profile]), str(config_path))
+    overrides = ["--gpu-id", str(gpu_id)]
+    if max_steps:
+        overrides += ["--training.max_steps", str(max_steps)]
+    start = time.perf_counter()
+    spacy_command("train", str(config_path), "--output", str(output_dir),
+                  "--code", str(ROOT.joinpath("src", "corpus.py")), *overrides)
+    return time.perf_counter() - start
+
+def directory_size(path: Path) -> int:
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+def evaluate(model_path: Path, test_path: Path, gpu_id: int) -> dict:
+    import spacy
+    from corpus import create_sharded_corpus
+    if gpu_id >= 0:
+        spacy.require_gpu(gpu_id)
+    nlp = spacy.load(model_path)
+    scores = nlp.evaluate(list(create_sharded_corpus(test_path)(nlp)))
+    return {
+        "ents_f": scores["ents_f"],
+        "ents_p": scores["ents_p"],
+        "ents_r": scores["ents_r"],
+        "ents_per_type": {label: values["f"] for label, values in (scores["ents_per_type"] or {}).items()},
+        "words_per_second": scores["speed"],
+        "model_mb": directory_size(model_path) / 2 ** 20,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profiles", nargs="+", choices=sorted(PROFILES), default=sorted(PROFILES))
+    parser.add_argument("--skip-train", action="store_true")
+    parser.add_argument("--gpu-id", type=int, default=-1)
+    parser.add_argument("--max-steps", type=int, default=0)
+    parser.add_argument("--output-dir", type=Path, default=ROOT.joinpath("training", "bench"))
+    parser.add_argument("--test", type=Path, default=ROOT.joinpath("data", "spacy", "test"))
+    parser.add_argument("--results", type=Path, default=ROOT.joinpath("benchmarks", "results", "training.json"))
+    args = parser.parse_args()
+
+    results = {}
+    for profile in args.profiles:
+        output_dir = args.output_dir.joinpath(profile)
+        train_seconds = None if args.skip_train else train(profile, output_dir, args.gpu_id, args.max_steps)
+        results[profile] = {"train_seconds": train_seconds, **evaluate(output_dir.joinpath("model-best"), args.test, args.gpu_id)}
+
+    labels = sorted({label for result in results.values() for label in result["ents_per_type"]})
+    print(f"{'':28} " + " ".join(f"{profile:>12}" for profile in results))
+    for name, key, fmt in (("F1", "ents_f", "{:12.3f}"), ("words/sec", "words_per_second", "{:12.0f}"),
+                           ("model size (MB)", "model_mb", "{:12.1f}")):
+        print(f"{name:28} " + " ".join(fmt.format(result[key]) for result in results.values()))
+    for label in labels:
+        print(f"  {label:26} " + " ".join(f"{result['ents_per_type'].get(label, 0.0):12.3f}" for result in results.values()))
+
+    args.results.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.results, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=4)
+
+if __name__ == "__main__":
+    main()
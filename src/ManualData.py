@@ -1,23 +1,137 @@
 import json
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from fileutil import write_atomic
 
+def find_occurrences(text: str, values: List[str]) -> Dict[str, List[int]]:
+    """
+    Input: Text (str), entity values (List[str])
+    Return: Start offset of every occurrence of every value, overlaps included
+    All values are found in a single regex scan. At each position the lookahead
+    reports the longest value that matches there; shorter values that are a
+    prefix of it start at the same position too.
+    """
+    values = sorted({value for value in values if value}, key=len, reverse=True)
+    occurrences = {value: [] for value in values}
+    if not values:
+        return occurrences
+    prefixes = {value: [other for other in values if len(other) < len(value) and value.startswith(other)]
+                for value in values}
+    pattern = re.compile("(?=(" + "|".join(map(re.escape, values)) + "))")
+    for match in pattern.finditer(text):
+        value = match.group(1)
+        occurrences[value].append(match.start())
+        for prefix in prefixes[value]:
+            occurrences[prefix].append(match.start())
+    return occurrences
 
-def correct_start_end():
-    path = Path("data").joinpath("manual")
-    files = os.listdir(path)
-    for filename in files:
-        full_path = path.joinpath(filename)
-        with open(full_path, 'r', encoding="utf-8") as file:
-            file_data = json.load(file)  # Use json.load to read json directly from file
+def assign_occurrences(offsets: List[Optional[int]], occurrences: List[int], unaligned_cost: int) -> List[Optional[int]]:
+    """
+    Input: Original offsets of the entities sharing one value, in annotation
+    order (None if unknown), occurrences of the value in the text (sorted)
+    Return: Chosen occurrence per entity, None where there is none left
+    Entities keep their order and each gets its own occurrence; among those
+    assignments the one closest to the original offsets wins. Entities without
+    an offset take the earliest occurrences.
+    """
+    n, m = len(offsets), len(occurrences)
 
-        for contract in file_data:
-            text = contract["text"]
-            for entity in contract["entities"]:
-                entity["start"] = text.find(entity["value"])
-                entity["end"] = entity["start"] + len(entity["value"])
+    def cost(i: int, j: int) -> int:
+        # Without an original offset, the earliest occurrence is nearest
+        return abs(occurrences[j] - (offsets[i] or 0))
 
-        with open(full_path, 'w', encoding="utf-8") as file:
-            json.dump(file_data, file, indent=4)  # Use json.dump to write json directly to file
+    # best[i][j]: lowest cost of placing the first i entities within the first j occurrences
+    best = [[0] * (m + 1)] + [[0] * (m + 1) for _ in range(n)]
+    for i in range(1, n + 1):
+        best[i][0] = best[i - 1][0] + unaligned_cost
+        for j in range(1, m + 1):
+            best[i][j] = min(best[i][j - 1], best[i - 1][j - 1] + cost(i - 1, j - 1), best[i - 1][j] + unaligned_cost)
 
-correct_start_end()
+    chosen = [None] * n
+    i, j = n, m
+    while i > 0:
+        if j > 0 and best[i][j] == best[i - 1][j - 1] + cost(i - 1, j - 1):
+            chosen[i - 1] = occurrences[j - 1]
+            i, j = i - 1, j - 1
+        elif j > 0 and best[i][j] == best[i][j - 1]:
+            j -= 1
+        else:
+            i -= 1
+    return chosen
+
+def align_entities(contract: dict) -> List[dict]:
+    """
+    Input: A manual annotation, {"text": str, "entities": [{"type", "value", "start", "end"}]}
+    Return: The entities that could not be aligned
+    Sets start/end of every entity to an occurrence of its value, in place.
+    Entities that repeat a value (the same city as company location and work
+    location) are matched to the occurrences in order, preferring the ones
+    nearest to their original offsets. Unaligned entities are left unchanged.
+    """
+    text = contract["text"]
+    entities = contract["entities"]
+    occurrences = find_occurrences(text, [entity["value"] for entity in entities])
+
+    by_value: Dict[str, List[int]] = {}
+    for index, entity in enumerate(entities):
+        by_value.setdefault(entity["value"], []).append(index)
+
+    unaligned = []
+    for value, indexes in by_value.items():
+        # Annotation order within a value is the order of the original offsets
+        indexes.sort(key=lambda index: (entities[index].get("start", -1) < 0, entities[index].get("start", -1), index))
+        offsets = [entities[index]["start"] if entities[index].get("start", -1) >= 0 else None for index in indexes]
+        chosen = assign_occurrences(offsets, occurrences.get(value, []), unaligned_cost=len(text) + 1)
+        for index, start in zip(indexes, chosen):
+            if start is None:
+                unaligned.append(entities[index])
+                continue
+            entities[index]["start"] = start
+            entities[index]["end"] = start + len(value)
+    return unaligned
+
+def align_file(path: Path) -> List[Tuple[int, dict]]:
+    """
+    Input: A file of manual annotations (Path)
+    Return: (contract index, entity) for every entity that could not be aligned
+    The file is only rewritten if an offset changed.
+    """
+    with open(path, 'r', encoding="utf-8") as file:
+        file_data = json.load(file)
+    before = json.dumps(file_data)
+    unaligned = []
+    for index, contract in enumerate(file_data):
+        unaligned.extend((index, entity) for entity in align_entities(contract))
+    if json.dumps(file_data) != before:
+        write_atomic(path, json.dumps(file_data, indent=4), label="manual")
+    return unaligned
+
+def iter_corrections(path: Path = Path("data").joinpath("manual"), workers: int = None) -> Iterator[Tuple[str, int, dict]]:
+    """
+    Input: Directory of manual annotations (Path), worker processes (int)
+    Return: (filename, contract index, entity) for every entity that could not be aligned
+    Files are aligned in parallel, one per task, as the result is consumed.
+    """
+    path = Path(path)
+    files = sorted(filename for filename in os.listdir(path) if filename.endswith(".json"))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for filename, unaligned in zip(files, pool.map(align_file, [path.joinpath(filename) for filename in files])):
+            for index, entity in unaligned:
+                yield filename, index, entity
+
+def correct_start_end(path: Path = Path("data").joinpath("manual"), workers: int = None) -> List[Tuple[str, int, dict]]:
+    """
+    Input: Directory of manual annotations (Path), worker processes (int)
+    Return: (filename, contract index, entity) for every entity that could not be aligned
+    Aligns every file before returning, see iter_corrections for the lazy version.
+    """
+    return list(iter_corrections(path, workers))
+
+if __name__ == "__main__":
+    unaligned = correct_start_end()
+    for filename, index, entity in unaligned:
+        print(f"{filename}[{index}] {entity['type']}: {entity['value']!r} not found")
+    print(f"{len(unaligned)} entities could not be aligned")
@@ -1,57 +1,156 @@
+from collections import Counter
 from dataclasses import asdict
-from typing import List
-import spacy
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Tuple
 import json
 from datetime import datetime
 from pathlib import Path
-from spacy.tokens import DocBin
-from sentence_transformers import SentenceTransformer, util
 from config import Config
-from sklearn.model_selection import train_test_split
+from dedup import NearDuplicateIndex, near_duplicate_index
+from fileutil import write_atomic
+from splits import assign_split, record_key
+
+if TYPE_CHECKING:
+    from spacy.tokens import Doc
 
 class SpacyProcessor():
 
     def __init__(self, config: Config):
+        # spaCy is imported here rather than at module level, so that importing
+        # this module (as the CLI does) does not load it
+        import spacy
+        from spacy.tokens import DocBin
+        self.config = config
         self.data_dir = Path(config.data_dir)
         self.anon_dir = self.data_dir.joinpath("manual")
-        self.nlp = spacy.load('en_core_web_lg')
+        self.nlp = spacy.load(config.spacy_model)
         # self.nlp = spacy.blank("en")
         self.doc_bin = DocBin()
-        # self.st_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.raw_data = self.load_data()
 
-    def load_data(self) -> List:
-        contracts = []
-        for json_file in self.anon_dir.glob('*.json'):
+    def iter_data(self) -> Iterator[dict]:
+        """
+        Streams the manual annotations, one file in memory at a time.
+        """
+        for json_file in sorted(self.anon_dir.glob('*.json')):
             with open(json_file, 'r', encoding='utf-8') as file:
-                contracts.extend(json.load(file))
-        return contracts
-    
-    def convert_data(self, data: List):
-        """
-        Convert data to spacy format.
-        """
-        spacy_folder = self.data_dir.joinpath("spacy")
-
-        for idx, contract in enumerate(data):
-            print(f"{idx+1}/{len(data)}")
-            ents = []
-            doc = self.nlp(contract["text"])
-            for entity in contract["entities"]:
-                span = doc.char_span(start_idx=entity["start"],
-                                     end_idx=entity["end"],
-                                     label=entity["type"])
-                if span != None:
-                    ents.append(span)
-            doc.ents = ents
+                yield from json.load(file)
+
+    def load_data(self) -> List:
+        return list(self.iter_data())
+
+    def make_docs(self, data: Iterable[dict], report: Counter, batch_size: int = None,
+                  n_process: int = None) -> Iterator[Tuple[dict, "Doc"]]:
+        """
+        Input: Manual annotations, {"text": str, "entities": [{"type", "start", "end"}]} (Iterable)
+        Return: (annotation, Doc with its entities) pairs, in input order
+        Entity spans that do not line up with token boundaries are dropped and
+        counted in `report` by label, along with the "docs", "spans", "dropped"
+        and "overlapping" totals.
+
+        Only tokens are needed to build the spans, so every pipeline component is
+        disabled and the texts are tokenized in batches with nlp.pipe.
+        """
+        from spacy.util import filter_spans
+        batch_size = batch_size or self.config.spacy_batch_size
+        n_process = n_process or self.config.spacy_n_process
+        with self.nlp.select_pipes(disable=self.nlp.pipe_names):
+            texts = ((contract["text"], contract) for contract in data)
+            for doc, contract in self.nlp.pipe(texts, as_tuples=True, batch_size=batch_size, n_process=n_process):
+                ents = []
+                for entity in contract["entities"]:
+                    span = doc.char_span(start_idx=entity["start"],
+                                         end_idx=entity["end"],
+                                         label=entity["type"])
+                    if span is None:
+                        report[entity["type"]] += 1
+                        report["dropped"] += 1
+                    else:
+                        ents.append(span)
+                report["spans"] += len(contract["entities"])
+                # Overlapping spans would make set_ents raise, keep the longest
+                kept = filter_spans(ents)
+                report["overlapping"] += len(ents) - len(kept)
+                doc.set_ents(kept)
+                report["docs"] += 1
+                yield contract, doc
+
+    @staticmethod
+    def print_report(report: Counter):
+        print(f"{report['docs']} docs, {report['spans']} entity spans, {report['dropped']} dropped "
+              f"({100 * report['dropped'] / max(report['spans'], 1):.1f}%), {report['overlapping']} overlapping")
+        for label, count in report.most_common():
+            if label not in ("docs", "spans", "dropped", "overlapping", "train", "dev", "test"):
+                print(f"  {label:28} {count:8}")
+
+    def convert_data(self, data: Iterable[dict], batch_size: int = None, n_process: int = None,
+                     checkpoint_every: int = None) -> Counter:
+        """
+        Input: Manual annotations (Iterable), see make_docs
+        Return: Histogram of the dropped entity spans, see make_docs
+        Output: data/spacy/dataset.spacy
+
+        The DocBin is written once at the end, and every `checkpoint_every`
+        documents if set. For corpora that do not fit in memory use build_corpus.
+        """
+        checkpoint_every = self.config.spacy_checkpoint_every if checkpoint_every is None else checkpoint_every
+        output_path = self.data_dir.joinpath("spacy", "dataset.spacy")
+        report = Counter()
+        for _, doc in self.make_docs(data, report, batch_size, n_process):
             self.doc_bin.add(doc)
-            self.doc_bin.to_disk(spacy_folder.joinpath("dataset.spacy"))
-
-sp = SpacyProcessor(Config())
-sp.convert_data(sp.raw_data)
-docs = list(sp.doc_bin.get_docs(sp.nlp.vocab))
-train_docs, test_docs = train_test_split(docs, test_size=0.3, random_state=42)
-train_db = DocBin(docs=train_docs, store_user_data=True)
-train_db.to_disk("data/spacy/train.spacy")
-test_db = DocBin(docs=test_docs, store_user_data=True)
-test_db.to_disk("data/spacy/test.spacy")
\ No newline at end of file
+            if checkpoint_every and report["docs"] % checkpoint_every == 0:
+                write_atomic(output_path, self.doc_bin.to_bytes(), label="spacy")
+                print(f"{report['docs']} docs")
+        write_atomic(output_path, self.doc_bin.to_bytes(), label="spacy")
+        self.print_report(report)
+        return report
+
+    def cluster_data(self) -> NearDuplicateIndex:
+        """
+        Clusters the near-duplicate manual annotations, keyed by record_key.
+        """
+        index = near_duplicate_index(self.config)
+        for contract in self.iter_data():
+            index.add(record_key(contract), contract["text"])
+        return index
+
+    def build_corpus(self, data: Iterable[dict] = None, test_size: float = 0.3, shard_size: int = None,
+                     batch_size: int = None, n_process: int = None, near_duplicates: NearDuplicateIndex = None,
+                     dev_size: float = 0.15) -> Counter:
+        """
+        Input: Manual annotations (Iterable, streamed from data/manual by default),
+        share of the test split (float), docs per shard (int), share of the dev split (float)
+        Return: Histogram of the dropped entity spans plus the "train", "dev" and "test" sizes
+        Output: data/spacy/train/train-00000.spacy ..., data/spacy/dev/dev-00000.spacy ...,
+        data/spacy/test/test-00000.spacy ...
+
+        Each record goes to train, dev or test by a stable hash of its contract
+        ID (or text), so the split never changes as the data grows, and docs are
+        written out shard by shard as they are made. Train with the
+        "defense.ShardedCorpus.v1" reader from corpus.py.
+        With a NearDuplicateIndex keyed by record_key (see cluster_data), whole
+        clusters of near-duplicates go to the same side, so that the test set
+        does not contain modifications of contracts that were trained on.
+        Training scores model-best on dev; test is held out for the final
+        evaluation in benchmarks/bench_training.py.
+        """
+        from corpus import ShardWriter
+        data = self.iter_data() if data is None else data
+        shard_size = shard_size or self.config.spacy_shard_size
+        spacy_dir = self.data_dir.joinpath("spacy")
+        writers = {split: ShardWriter(spacy_dir.joinpath(split), split, shard_size) for split in ("train", "dev", "test")}
+        report = Counter()
+        for contract, doc in self.make_docs(data, report, batch_size, n_process):
+            key = record_key(contract)
+            if near_duplicates is not None:
+                key = near_duplicates.representative(key)
+            split = assign_split(key, test_size, dev_size=dev_size)
+            writers[split].add(doc)
+            report[split] += 1
+        for writer in writers.values():
+            writer.close()
+        self.print_report(report)
+        print(", ".join(f"{split}: {report[split]} docs in {writer.shards} shards" for split, writer in writers.items()))
+        return report
+
+if __name__ == "__main__":
+    sp = SpacyProcessor(Config())
+    sp.build_corpus(near_duplicates=sp.cluster_data())
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Optional, Union
+from config import Config
+
+class AnnotationCache:
+    """
+    On-disk SQLite cache of raw completions.
+
+    Entries are keyed by the SHA-256 of the request: system prompt, model,
+    sampling parameters and the contract text with its whitespace collapsed.
+    Any change to one of them is a miss. Entries remember which prompt and
+    model made them, so stale entries can be purged after a prompt change, and
+    when they were last used, so the cache can be capped by LRU eviction.
+    """
+
+    def __init__(self, path: Path, max_entries: int = 0):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS annotations (
+                key TEXT PRIMARY KEY,
+                prompt_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS annotations_prompt ON annotations (prompt_hash, model)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS annotations_last_used ON annotations (last_used)")
+
+    @staticmethod
+    def hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def key(cls, params: dict) -> str:
+        """
+        Cache key of a chat completions request. The first message is the system
+        prompt and the last one the contract text.
+        """
+        messages = params["messages"]
+        options = {name: value for name, value in params.items() if name != "messages"}
+        return cls.hash(json.dumps([
+            cls.hash(messages[0]["content"]),
+            options,
+            " ".join(messages[-1]["content"].split())
+        ], sort_keys=True))
+
+    def get(self, params: dict) -> Optional[str]:
+        key = self.key(params)
+        with self.lock:
+            row = self.connection.execute("SELECT content FROM annotations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.counts["misses"] += 1
+                return None
+            self.counts["hits"] += 1
+            self.connection.execute("UPDATE annotations SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, params: dict, content: str):
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO annotations VALUES (?, ?, ?, ?, ?, ?)",
+                (self.key(params), self.hash(params["messages"][0]["content"]), params["model"], content, now, now)
+            )
+            self.counts["writes"] += 1
+            if self.max_entries and self.counts["writes"] % 100 == 0:
+                self.evict()
+
+    def evict(self) -> int:
+        """
+        Deletes the least recently used entries beyond max_entries. Returns the number deleted.
+        """
+        if not self.max_entries:
+            return 0
+        deleted = self.connection.execute("""
+            DELETE FROM annotations WHERE key IN (
+                SELECT key FROM annotations ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,)).rowcount
+        self.counts["evictions"] += deleted
+        return deleted
+
+    def purge_stale(self, prompts: Union[str, Iterable[str]], model: str) -> int:
+        """
+        Deletes every entry that was not made with one of these prompts and this
+        model. Returns the number deleted.
+        """
+        hashes = [self.hash(prompts)] if isinstance(prompts, str) else sorted({self.hash(prompt) for prompt in prompts})
+        with self.lock:
+            deleted = self.connection.execute(
+                f"DELETE FROM annotations WHERE prompt_hash NOT IN ({', '.join('?' * len(hashes))}) OR model != ?",
+                (*hashes, model)
+            ).rowcount
+        self.counts["evictions"] += deleted
+        return deleted
+
+    def stats(self) -> dict:
+        with self.lock:
+            entries = self.connection.execute("SELECT COUNT(*) FROM annotations").fetchone()[0]
+        lookups = self.counts["hits"] + self.counts["misses"]
+        return {
+            "hits": self.counts["hits"],
+            "misses": self.counts["misses"],
+            "hit_rate": self.counts["hits"] / lookups if lookups else 0.0,
+            "writes": self.counts["writes"],
+            "evictions": self.counts["evictions"],
+            "entries": entries,
+        }
+
+    def close(self):
+        with self.lock:
+            self.evict()
+            self.connection.close()
+
+def open_annotation_cache(config: Config) -> Optional[AnnotationCache]:
+    """
+    Opens the cache configured by Config.annotation_cache, or returns None if it
+    is disabled. With Config.purge_stale_annotations, entries from other
+    models, or made with a prompt the AnnotationEngine would no longer send,
+    are deleted right away.
+    """
+    if not config.annotation_cache:
+        return None
+    cache = AnnotationCache(Path(config.data_dir).joinpath(config.annotation_cache), config.annotation_cache_max_entries)
+    if config.purge_stale_annotations:
+        # Imported here, the engine module imports this one
+        from annotation_engine import AnnotationEngine
+        cache.purge_stale(AnnotationEngine(config).system_prompts(), config.model)
+    return cache
@@ -0,0 +1,379 @@
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from itertools import combinations
+from typing import Callable, Iterable, List, Optional, Tuple
+from config import Config
+from annotation_cache import AnnotationCache
+from extractor import ANNOTATION_FIELDS, RuleExtractor
+from metrics import REGISTRY
+from model import Precontract
+
+class TokenBucket:
+    """
+    Async budget that refills continuously up to `per_minute` units per minute.
+    Used for both the request and the token limits of the API.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float):
+        # Requests larger than the whole budget wait for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            self.refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self.refill()
+            self.tokens -= amount
+
+    def refund(self, amount: float):
+        """
+        Returns unused budget, e.g. when a response used fewer tokens than estimated.
+        """
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class AnnotationEngine:
+    """
+    Annotates contracts with the chat completions API concurrently.
+
+    At most Config.max_concurrent_requests requests are in flight, and request
+    and token budgets per minute are enforced client side. 429, 5xx, timeout and
+    connection errors are retried with exponential backoff and jitter. Results
+    always come back in input order; a contract that could not be annotated
+    yields None. With an AnnotationCache, cached requests are answered without
+    touching the API or the budgets. With Config.rule_extraction, the fields a
+    RuleExtractor can fill are not asked for, and contracts it fills completely
+    are not sent at all.
+    """
+
+    def __init__(self, config: Config = Config(), client=None, cache: AnnotationCache = None):
+        self.config = config
+        self.prompt = config.prompt
+        self.model = config.model
+        self.max_concurrent_requests = config.max_concurrent_requests
+        self.batch_size = config.annotation_batch_size
+        self.max_retries = config.max_retries
+        self.backoff_factor = config.backoff_factor
+        self.client = client
+        self.cache = cache
+        self.extractor = RuleExtractor() if config.rule_extraction else None
+        self.stats = Counter()
+        self.coverage = Counter()
+
+    def get_client(self):
+        if self.client is None:
+            from openai import AsyncOpenAI
+            # Retries are handled here, so that they respect the budgets
+            self.client = AsyncOpenAI(max_retries=0)
+        return self.client
+
+    def system_prompt(self, fields: Tuple[str, ...] = None) -> str:
+        """
+        The full prompt, or the prompt asking only for `fields`.
+        """
+        if fields is None:
+            return self.prompt
+        return self.config.fields_prompt.format(fields=", ".join(fields))
+
+    def system_prompts(self) -> List[str]:
+        """
+        Every system prompt this engine can send: the full prompt and, with a
+        RuleExtractor, the prompt for each set of fields the rules can leave open.
+        """
+        prompts = [self.system_prompt()]
+        if self.extractor is not None:
+            for size in range(1, len(ANNOTATION_FIELDS) + 1):
+                prompts.extend(self.system_prompt(fields) for fields in combinations(ANNOTATION_FIELDS, size))
+        return prompts
+
+    def request_params(self, contract: Precontract, fields: Tuple[str, ...] = None) -> dict:
+        """
+        Same request as Annotator.annotate_contract_safe, or one asking only for `fields`.
+        """
+        return dict(
+            model=self.model,
+            response_format={ "type": "json_object" },
+            max_tokens=1024,
+            temperature=0.5,
+            messages=[
+                {
+                    "role": "system",
+                    "content": f"{self.system_prompt(fields)}",
+                },
+                {
+                    "role": "user",
+                    "content": f"\"{contract.contract_text}\""
+                }
+            ]
+        )
+
+    @staticmethod
+    def estimate_tokens(params: dict) -> int:
+        """
+        Rough upper bound of the tokens a request is charged, about 4 characters
+        per token for the prompt plus the completion limit.
+        """
+        return sum(len(message["content"]) for message in params["messages"]) // 4 + params["max_tokens"]
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        from openai import APIConnectionError, APIStatusError
+        if isinstance(error, APIConnectionError):  # Includes timeouts
+            return True
+        return isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+    def backoff(self, attempt: int) -> float:
+        delay = self.backoff_factor * (2 ** attempt)
+        return delay + random.uniform(0, delay)
+
+    async def send(self, params: dict) -> Optional[str]:
+        """
+        Sends one request within the concurrency limit and budgets, retrying
+        transient errors. Returns the message content, or None on failure.
+        Time spent waiting for the budgets goes to llm_budget_wait_seconds and
+        the request itself to llm_request_seconds.
+        """
+        estimate = self.estimate_tokens(params)
+        for attempt in range(self.max_retries + 1):
+            with REGISTRY.timer("llm_budget_wait_seconds", model=params["model"]):
+                await self.request_budget.acquire(1)
+                await self.token_budget.acquire(estimate)
+            async with self.semaphore:
+                try:
+                    with REGISTRY.timer("llm_request_seconds", model=params["model"]):
+                        response = await self.get_client().chat.completions.create(**params)
+                except Exception as e:
+                    REGISTRY.inc("llm_requests_total", model=params["model"], status=type(e).__name__)
+                    if not self.is_retryable(e):
+                        self.stats["failed"] += 1
+                        REGISTRY.inc("llm_failures_total", model=params["model"])
+                        print(f"Annotation failed: {e}")
+                        return None
+                    error = e
+                else:
+                    self.stats["requests"] += 1
+                    REGISTRY.inc("llm_requests_total", model=params["model"], status="ok")
+                    if response.usage:
+                        self.stats["prompt_tokens"] += response.usage.prompt_tokens
+                        self.stats["completion_tokens"] += response.usage.completion_tokens
+                        REGISTRY.inc("llm_tokens_total", response.usage.prompt_tokens, model=params["model"], kind="prompt")
+                        REGISTRY.inc("llm_tokens_total", response.usage.completion_tokens, model=params["model"], kind="completion")
+                        self.token_budget.refund(max(estimate - response.usage.total_tokens, 0))
+                    return response.choices[0].message.content
+            self.stats["retries"] += 1
+            REGISTRY.inc("llm_retries_total", model=params["model"])
+            await asyncio.sleep(self.backoff(attempt))
+        self.stats["failed"] += 1
+        REGISTRY.inc("llm_failures_total", model=params["model"])
+        print(f"Annotation failed after {self.max_retries} retries: {error}")
+        return None
+
+    def cached(self, params: dict) -> Optional[str]:
+        if not self.cache:
+            return None
+        content = self.cache.get(params)
+        if content is not None:
+            self.stats["cached"] += 1
+        REGISTRY.inc("annotation_cache_total", result="miss" if content is None else "hit")
+        return content
+
+    def store(self, params: dict, content: Optional[str]):
+        if self.cache and content:
+            self.cache.put(params, content)
+
+    async def complete(self, params: dict) -> Optional[str]:
+        """
+        Like send, but answers from the annotation cache when possible.
+        """
+        content = self.cached(params)
+        if content is None:
+            content = await self.send(params)
+            self.store(params, content)
+        return content
+
+    def batch_params(self, contracts: List[Precontract], fields: Tuple[str, ...] = None) -> dict:
+        """
+        One request for several contracts. Each contract gets an id, its
+        position in the batch, which the reply has to echo back.
+        """
+        return dict(
+            model=self.model,
+            response_format={ "type": "json_object" },
+            max_tokens=min(1024 * len(contracts), 4096),
+            temperature=0.5,
+            messages=[
+                {
+                    "role": "system",
+                    "content": f"{self.system_prompt(fields)}{self.config.batch_prompt}",
+                },
+                {
+                    "role": "user",
+                    "content": json.dumps({"contracts": [
+                        {"id": str(i), "text": contract.contract_text} for i, contract in enumerate(contracts)
+                    ]})
+                }
+            ]
+        )
+
+    @staticmethod
+    def split_batch(content: Optional[str], size: int) -> List[Optional[str]]:
+        """
+        Splits a batched reply into one raw annotation per contract. Results
+        that are missing, duplicated or not JSON objects come back as None.
+        """
+        outputs = [None] * size
+        try:
+            results = json.loads(content)["results"]
+        except (TypeError, KeyError, json.JSONDecodeError):
+            return outputs
+        seen = set()
+        for result in results if isinstance(results, list) else []:
+            if not isinstance(result, dict) or not isinstance(result.get("output"), dict):
+                continue
+            index = str(result.get("id"))
+            if not index.isdigit() or int(index) >= size or index in seen:
+                continue
+            seen.add(index)
+            outputs[int(index)] = json.dumps(result["output"])
+        return outputs
+
+    async def annotate_batch(self, contracts: List[Precontract], fields: Tuple[str, ...] = None) -> List[Optional[str]]:
+        """
+        Annotates contracts with a single request. Items that come back
+        malformed are re-queued as individual requests.
+        """
+        outputs = self.split_batch(await self.send(self.batch_params(contracts, fields)), len(contracts))
+        params = [self.request_params(contract, fields) for contract in contracts]
+        requeued = [i for i, output in enumerate(outputs) if output is None]
+        self.stats["requeued"] += len(requeued)
+        for i, output in zip(requeued, await asyncio.gather(*(self.send(params[i]) for i in requeued))):
+            outputs[i] = output
+        for request, output in zip(params, outputs):
+            self.store(request, output)
+        return outputs
+
+    async def annotate_requests(self, contracts: List[Precontract], fields: Tuple[str, ...] = None) -> List[Optional[str]]:
+        """
+        Annotates contracts one request each, or Config.annotation_batch_size
+        contracts per request. Batched results are cached under the same keys
+        as single requests, so both modes share the cache.
+        """
+        if self.batch_size <= 1:
+            return await asyncio.gather(*(self.complete(self.request_params(contract, fields)) for contract in contracts))
+
+        results = [self.cached(self.request_params(contract, fields)) for contract in contracts]
+        pending = [i for i, result in enumerate(results) if result is None]
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        outputs = await asyncio.gather(*(self.annotate_batch([contracts[i] for i in batch], fields) for batch in batches))
+        for batch, batch_outputs in zip(batches, outputs):
+            for i, output in zip(batch, batch_outputs):
+                results[i] = output
+        return results
+
+    @staticmethod
+    def merge(extracted: dict, fields: Tuple[str, ...], output: Optional[str]) -> Optional[str]:
+        """
+        Combines the fields the rules extracted with the LLM's reply for the
+        rest. Replies that are not JSON objects are returned unchanged, so that
+        validation rejects them as usual.
+        """
+        if output is None:
+            return None
+        try:
+            answer = json.loads(output)
+        except json.JSONDecodeError:
+            return output
+        if not isinstance(answer, dict):
+            return output
+        merged = {**{name: value for name, value in answer.items() if name in fields}, **extracted}
+        return json.dumps({name: merged[name] for name in ANNOTATION_FIELDS if name in merged})
+
+    async def annotate_many(self, contracts: List[Precontract]) -> List[Optional[str]]:
+        """
+        Annotates contracts, in input order. With a RuleExtractor, contracts are
+        grouped by the fields the rules left open and only those are requested.
+        """
+        if self.extractor is None:
+            return await self.annotate_requests(contracts)
+
+        extracted = [self.extractor.extract(contract.contract_text) for contract in contracts]
+        results = [None] * len(contracts)
+        groups = {}
+        for i, fields in enumerate(extracted):
+            self.coverage.update(fields.keys())
+            self.coverage["contracts"] += 1
+            missing = self.extractor.missing(fields)
+            if missing:
+                groups.setdefault(missing, []).append(i)
+            else:
+                self.coverage["complete"] += 1
+                self.stats["rules_only"] += 1
+                results[i] = json.dumps({name: fields[name] for name in ANNOTATION_FIELDS})
+        outputs = await asyncio.gather(*(
+            self.annotate_requests([contracts[i] for i in indexes], missing) for missing, indexes in groups.items()
+        ))
+        for (missing, indexes), group_outputs in zip(groups.items(), outputs):
+            for i, output in zip(indexes, group_outputs):
+                results[i] = self.merge(extracted[i], missing, output)
+        return results
+
+    async def annotate_files(self, files: Iterable[Tuple[str, List[Precontract]]],
+                             write: Callable[[str, List[Optional[str]]], None], files_in_flight: int):
+        """
+        Annotates (filename, contracts) pairs, keeping up to `files_in_flight`
+        files in progress so that short days do not starve the request pool.
+        write(filename, annotations) is called once per file with its results
+        in input order.
+        """
+        pending = set()
+
+        async def annotate_file(filename: str, contracts: List[Precontract]):
+            write(filename, await self.annotate_many(contracts))
+
+        for filename, contracts in files:
+            if len(pending) >= files_in_flight:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            pending.add(asyncio.create_task(annotate_file(filename, contracts)))
+        await asyncio.gather(*pending)
+
+    def start(self):
+        # Budgets and the semaphore belong to the running event loop
+        self.semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        self.request_budget = TokenBucket(self.config.requests_per_minute)
+        self.token_budget = TokenBucket(self.config.tokens_per_minute)
+
+    def run(self, contracts: List[Precontract]) -> List[Optional[str]]:
+        """
+        Input: Contracts (List[Precontract])
+        Return: Raw annotation per contract, in input order
+        """
+        async def main():
+            self.start()
+            return await self.annotate_many(contracts)
+        return asyncio.run(main())
+
+    def run_files(self, files: Iterable[Tuple[str, List[Precontract]]],
+                  write: Callable[[str, List[Optional[str]]], None]):
+        """
+        Input: (filename, contracts) pairs, callback receiving each file's annotations
+        Output: None
+        """
+        async def main():
+            self.start()
+            await self.annotate_files(files, write, files_in_flight=max(2, self.max_concurrent_requests // 4))
+        asyncio.run(main())
@@ -1,3 +1,4 @@
+from collections import Counter
 from dataclasses import asdict
 from datetime import datetime
 import json
@@ -5,21 +6,61 @@ import os
 from pathlib import Path
 from typing import List
 from config import Config
-from scraper import Scraper
+from scraper import iter_precontracts, read_precontract
+from annotation_engine import AnnotationEngine
+from annotation_cache import AnnotationCache, open_annotation_cache
+from dedup import NearDuplicateIndex, near_duplicate_index
+from extractor import RuleExtractor, format_coverage
+from metrics import REGISTRY, export, stage
+from validation import format_histogram, record_outcomes, validate_file, validate_files
 from model import Precontract, Contract
-from openai import OpenAI
 
 class Annotator:
 
     key = Config.key
     prompt = Config.prompt
-    client = OpenAI()
+    model = Config.model
+    client = None
+    cache = None
     base_data_filename = Path(Config.data_dir)
     date_format = Config.date_format
 
+    def get_cache(self) -> AnnotationCache:
+        """
+        The shared annotation cache, opened on first use. None if disabled in Config.
+        """
+        if Annotator.cache is None:
+            Annotator.cache = open_annotation_cache(Config())
+        return Annotator.cache
+
+    def get_client(self):
+        """
+        The shared OpenAI client, created on first use so that importing this
+        module does not load openai or require an API key.
+        """
+        if Annotator.client is None:
+            from openai import OpenAI
+            Annotator.client = OpenAI()
+        return Annotator.client
+
+    def complete(self, **params) -> str:
+        """
+        Runs a chat completion and returns the message content. Requests that
+        were answered before are served from the annotation cache.
+        """
+        cache = self.get_cache()
+        if cache:
+            content = cache.get(params)
+            if content is not None:
+                return content
+        content = self.get_client().chat.completions.create(**params).choices[0].message.content
+        if cache and content:
+            cache.put(params, content)
+        return content
+
     def annotate_contract_safe(self, contract: Precontract) -> str:
-        annotated = self.client.chat.completions.create(
-            model="gpt-3.5-turbo-0125",
+        annotated = self.complete(
+            model=self.model,
             response_format={ "type": "json_object" },
             max_tokens=1024,  # Adjust based on how long you expect the response to be
             temperature=0.5,  # Adjust for creativity. Lower is more deterministic.
@@ -35,11 +76,11 @@ class Annotator:
             ]
         )
         # filename = f"{contract.contract_date.strftime('%Y-%m-%d')}_{contract.source_url[56:-1]}.json"
-        return annotated.choices[0].message.content
+        return annotated
 
     def annotate_contract(self, contract: Precontract) -> Contract:
-        annotated = self.client.chat.completions.create(
-            model="gpt-3.5-turbo-0125",
+        annotated = self.complete(
+            model=self.model,
             response_format={ "type": "json_object" },
             max_tokens=250,  # Adjust based on how long you expect the response to be
             temperature=0.5,  # Adjust for creativity. Lower is more deterministic.
@@ -55,7 +96,7 @@ class Annotator:
             ]
         )
         
-        annotated = json.loads(annotated.choices[0].message.content)
+        annotated = json.loads(annotated)
         new_contract = Contract(
             contract_id = annotated['contract_id'],
             federal_agency = annotated['federal_agency'],
@@ -75,7 +116,7 @@ class Annotator:
         if not strings:
             return
         filepath = self.base_data_filename.joinpath("blackbox").joinpath(strings[0][0])
-        with open(filepath, 'w', encoding='utf-8') as file:
+        with REGISTRY.timer("file_write_seconds", dir="blackbox"), open(filepath, 'w', encoding='utf-8') as file:
             for _, second_element in strings:
                 second_element = " ".join(line.strip() for line in second_element.splitlines())
                 file.write(second_element + '\n')
@@ -108,13 +149,12 @@ class Annotator:
 
     def annotate_all(self):
         annotator=Annotator()
-        scraper=Scraper()
         files = os.listdir("data/clean")
         for file in files:
             if file.startswith("."):
                 continue
             print(f"File: {file}")
-            contracts = scraper.read_precontract(filename=f"data/clean/{file}")
+            contracts = read_precontract(filename=f"data/clean/{file}")
             annotations = []
             for contract in contracts:
                 print(f"Contract: {contract.source_url}")
@@ -135,17 +175,25 @@ class Annotator:
                 with open(filepath, 'w') as file:
                     json.dump(contracts_dict, file, cls=DateTimeEncoder, indent=4)
 
-        for file in os.listdir("data/clean"):
-            if file.startswith("."):
-                continue
-            if file != start_file and skip==True:
-                continue
-            elif file == start_file:
-                skip = False
-            if file == end_file:
-                break
-            contracts = self.clean_safe_annotation(file)
-            write_safe_annotation_list(contracts)
+        def selected_files():
+            nonlocal skip
+            for file in os.listdir("data/clean"):
+                if file.startswith("."):
+                    continue
+                if file != start_file and skip==True:
+                    continue
+                elif file == start_file:
+                    skip = False
+                if file == end_file:
+                    break
+                yield file
+
+        outcomes = Counter()
+        with stage("validate", Config()):
+            for file, contracts, file_outcomes in validate_files(selected_files(), str(self.base_data_filename)):
+                outcomes.update(file_outcomes)
+                write_safe_annotation_list(contracts)
+        print(format_histogram(outcomes))
 
     def clean_safe_annotation(self, filename: str) -> List[Contract]:
         """
@@ -155,193 +203,92 @@ class Annotator:
         We also need to check each line for two things:
         1. JSON Validity
         2. All fields are present, are of the right type, and have relevant data.
-        """
-        def parse_money(raw_money: str) -> float:
-            try:
-                money = float(raw_money.replace('$', '').replace(',', ''))
-            except ValueError:
-                print("Error: The string does not contain a valid number")
-                return None
-            return money
 
-        def parse_date(raw_date: str) -> datetime:
-            date_text = raw_date.split(" ")
-            if "Jan" in date_text[0]:
-                date_text[0] = "January"
-            elif "Feb" in date_text[0]:
-                date_text[0] = "February"
-            elif "Mar" in date_text[0]:
-                date_text[0] = "March"
-            elif "Apr" in date_text[0]:
-                date_text[0] = "April"
-            elif "Jun" in date_text[0]:
-                date_text[0] = "June"
-            elif "Jul" in date_text[0]:
-                date_text[0] = "July"
-            elif "Aug" in date_text[0]:
-                date_text[0] = "August"
-            elif "Sep" in date_text[0]:
-                date_text[0] = "September"
-            elif "Oct" in date_text[0]:
-                date_text[0] = "October"
-            elif "Nov" in date_text[0]:
-                date_text[0] = "November"
-            elif "Dec" in date_text[0]:
-                date_text[0] = "December"
-            if len(date_text) == 3:
-                # Month Day, Year
-                if not "," in date_text[1]:
-                    date_text[1] = f"{date_text[1]},"
-                try:
-                    date = datetime.strptime(f"{date_text[0]} {date_text[1]} {date_text[2]}", self.date_format)
-                    return date
-                except ValueError as e:
-                    return None
-            elif len(date_text) == 2:
-                # Month, Year
-                try:
-                    date = datetime.strptime(f"{date_text[0]} {date_text[1]} 1", "%B %Y %d")
-                    return date
-                except ValueError as e:
-                    return None
-            else:
-                return None
-        
-        def read_specific_line(filepath: str, line_number: int) -> str:
-            try:
-                with open(filepath, 'r', encoding="utf-8", errors="ignore") as file:
-                    lines = file.readlines()
-                    return lines[line_number - 1].strip()
-            except Exception as e:
-                print(filepath)
-                raise e
-        
-        def verify_contract_fields(raw_data: str) -> bool:
-            def find_banned_words(raw_data: str, log=False) -> bool:
-                """
-                Returns true if banned word is found
-                """
-                banned_words = [
-                    "To be determined",
-                    "Not specified",
-                    "Not provided",
-                    "n/a",
-                    "Not applicable",
-                    "N/a",
-                    "n/A",
-                    "N/A",
-                    "No completion date"
-                ]
-                for word in banned_words:
-                    if word in raw_data:
-                        if log:
-                            print(word)
-                        return True
-                if raw_data == "":
-                    return True
-                else:
-                    return False
-            # Check 1: Does it parse?
-            try:
-                json_data = json.loads(raw_data)
-            except Exception:
-                # print("Unable to parse.")
-                return False
-
-            # Check 2: Are all fields present?
-            valid_fields = [
-                            "contract_id",
-                            "federal_agency",
-                            "contract_amount",
-                            "company_name",
-                            "location",
-                            "contract_description",
-                            "estimated_completion_date",
-                            "funds_obligated"
-                            ]
-            if set(valid_fields) != set(json_data.keys()):
-                # print(f"Missing fields {set(valid_fields).symmetric_difference(set(json_data.keys()))}")
-                return False
-
-            # Check 3: Are all fields valid types?
-            if type(json_data["contract_id"]) != type("") or len(json_data["contract_id"]) < 13:
-                print("contract_id error: " +str(json_data["contract_id"]))
-                return False
-            if type(json_data["federal_agency"]) != type("") or find_banned_words(json_data["federal_agency"]):
-                print("federal_agency error")
-                return False
-            if type(json_data["contract_amount"]) != type("") or not '$' in json_data["contract_amount"] or find_banned_words(json_data["contract_amount"]):
-                print("contract_amount error")
-                return False
-            if type(json_data["company_name"]) != type("") or find_banned_words(json_data["company_name"]):
-                print("company_name error")
-                return False
-            if type(json_data["location"]) != type("") or find_banned_words(json_data["location"]):
-                print("location error")
-                return False
-            if type(json_data["contract_description"]) != type("") or find_banned_words(json_data["contract_description"]):
-                print("contract_description error")
-                return False
-            if type(json_data["estimated_completion_date"]) != type("") or find_banned_words(json_data["estimated_completion_date"]) or parse_date(json_data["estimated_completion_date"]) is None:
-                print("estimated_completion_date error: "+ str(json_data["estimated_completion_date"]))
-                return False
-            if type(json_data["funds_obligated"]) != type("") or find_banned_words(json_data["funds_obligated"]):
-                print("funds_obligated error")
-                return False
-            
-            return True
-        
-        scraper = Scraper()
-        contracts = []
-        precontracts = scraper.read_precontract(filename=f"data/clean/{filename}")
-        for idx, contract in enumerate(precontracts):
-            annotated_raw = read_specific_line(f"data/blackbox/{filename}", idx+1)
-            # print(verify_contract_fields(annotated_raw))
-            if verify_contract_fields(annotated_raw):
-                json_data = json.loads(annotated_raw)
-                contracts.append(
-                    Contract(
-                        contract_id = json_data["contract_id"],
-                        federal_agency = json_data["federal_agency"],
-                        military_branch = contract.military_branch,
-                        contract_amount = parse_money(json_data["contract_amount"]),
-                        contract_date = contract.contract_date,
-                        company_name = json_data["company_name"],
-                        location = json_data["location"],
-                        contract_description = json_data["contract_description"],
-                        estimated_completion_date = parse_date(json_data["estimated_completion_date"]),
-                        funds_obligated = json_data["funds_obligated"],
-                        source_url = contract.source_url,
-                        contract_text = contract.contract_text
-                    )
-                )
+        See validation.validate_file, which also returns a histogram of the
+        rejection reasons.
+        """
+        contracts, outcomes = validate_file(filename, str(self.base_data_filename))
+        record_outcomes(outcomes)
         return contracts
 
 
-    def annotate_all_safe(self, start_file: str, skip: bool):
-        annotator=Annotator()
-        scraper=Scraper()
-        files = os.listdir("data/clean")
-        for file in files:
+    def near_duplicates(self) -> NearDuplicateIndex:
+        """
+        Clusters the near-duplicate precontracts of all of data/clean, keyed by
+        (file, position in the file).
+        """
+        index = near_duplicate_index(Config())
+        for file in sorted(os.listdir(self.base_data_filename.joinpath("clean"))):
             if file.startswith("."):
                 continue
-            if file != start_file and skip==True:
-                continue
-            elif file == start_file:
-                skip = False
-            print(f"File: {file}")
-            contracts = scraper.read_precontract(filename=f"data/clean/{file}")
-            annotations = []
-            for contract in contracts:
-                try:
-                    json_content = json.loads(annotator.annotate_contract_safe(contract))
-                    annotations.append(json_content)
-                except json.decoder.JSONDecodeError as e:
-                    print(f"JSONDecodeError! Skipping contract.")
-            # annotator.write_contracts_safe(annotations)
-            with open(Path("data/blackbox").joinpath(file), 'w') as file:
-                json.dump(annotations, file, indent=4)
+            for i, contract in enumerate(iter_precontracts(self.base_data_filename.joinpath("clean", file))):
+                index.add((file, i), contract.contract_text)
+        print(f"{len(index)} contracts in {len(index.clusters())} near-duplicate clusters")
+        return index
+
+    def annotate_all_safe(self, start_file: str, skip: bool, representatives_only: bool = False):
+        """
+        Annotates every file in data/clean, starting at start_file if skip is set.
+        Requests run concurrently through the AnnotationEngine. Each file's raw
+        annotations are written to data/blackbox one line per precontract, in
+        the same order, with an empty line for contracts that failed.
+        With representatives_only, only the first contract of each cluster of
+        near-duplicates (modifications and options of one award) is annotated;
+        the others get an empty line.
+        The run is the "annotate" stage of the metrics, exported to
+        Config.metrics_file as files finish.
+        """
+        engine=AnnotationEngine(Config(), cache=self.get_cache())
+        index = self.near_duplicates() if representatives_only else None
+        selected = {}
+
+        def pending_files():
+            nonlocal skip
+            for file in os.listdir("data/clean"):
+                if file.startswith("."):
+                    continue
+                if file != start_file and skip==True:
+                    continue
+                elif file == start_file:
+                    skip = False
+                print(f"File: {file}")
+                contracts = read_precontract(filename=f"data/clean/{file}")
+                if index is not None:
+                    selected[file] = [index.is_representative((file, i)) for i in range(len(contracts))]
+                    contracts = [contract for contract, keep in zip(contracts, selected[file]) if keep]
+                yield file, contracts
+
+        def write(file: str, annotations: List[str]):
+            if index is not None:
+                annotations = iter(annotations)
+                annotations = [next(annotations) if keep else "" for keep in selected.pop(file)]
+            self.write_contracts_safe([(file, annotation or "") for annotation in annotations])
+            REGISTRY.inc("annotated_files_total")
+            export(Config(), Config.metrics_interval)
+
+        with stage("annotate", Config()):
+            engine.run_files(pending_files(), write)
+        print(f"Requests: {engine.stats['requests']}, retries: {engine.stats['retries']}, failed: {engine.stats['failed']}, "
+              f"tokens: {engine.stats['prompt_tokens'] + engine.stats['completion_tokens']}, cached: {engine.stats['cached']}")
+        if self.get_cache():
+            print(f"Annotation cache: {self.get_cache().stats()}")
+        if engine.extractor:
+            print(f"Answered by rules alone: {engine.stats['rules_only']}")
+            print(format_coverage(engine.coverage))
+
+    def rule_coverage(self) -> Counter:
+        """
+        Reports how many contracts in data/clean each field is extracted for by
+        the rules alone, without any request.
+        """
+        texts = (contract.contract_text
+                 for file in sorted(os.listdir(self.base_data_filename.joinpath("clean"))) if not file.startswith(".")
+                 for contract in iter_precontracts(self.base_data_filename.joinpath("clean", file)))
+        coverage = RuleExtractor().coverage(texts)
+        print(format_coverage(coverage))
+        return coverage
 
-annotator = Annotator()
-annotator.annotate_all_safe("2020-01-02_2049494.json", True)
+if __name__ == "__main__":
+    annotator = Annotator()
+    annotator.annotate_all_safe("2020-01-02_2049494.json", True)
 # annotator.write_safe_annotations("2014-07-03_605970.json", "2017-09-05_1299955.json", True)
\ No newline at end of file
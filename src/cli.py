@@ -0,0 +1,103 @@
+"""
+Command line entry point for the whole pipeline.
+
+Usage: python src/cli.py <command> [options]
+
+    crawl     Download the contract articles from defense.gov to data/raw
+    clean     Clean data/raw into data/clean
+    annotate  Annotate data/clean with the LLM into data/blackbox
+    validate  Validate data/blackbox into data/annotated
+    convert   Build the spaCy train/dev/test corpus from data/manual
+    infer     Run the trained NER pipeline over data/clean into data/ner
+
+Every command imports what it needs when it runs, so that `--help` and the
+light commands never pay for loading spaCy, torch or the OpenAI client.
+"""
+import argparse
+import sys
+from dataclasses import replace
+from typing import List
+from config import Config
+
+def run_crawl(args: argparse.Namespace):
+    from scraper import Scraper
+    config = replace(Config(), offline=args.offline, clean_inline=args.clean_inline)
+    Scraper(config).download_all_contracts(args.start_page, args.workers, args.incremental, args.revalidate)
+
+def run_clean(args: argparse.Namespace):
+    from scraper import Scraper
+    Scraper(Config()).clean_data(args.workers, args.force)
+
+def run_annotate(args: argparse.Namespace):
+    from annotator import Annotator
+    Annotator().annotate_all_safe(args.start_file, args.start_file is not None, args.representatives_only)
+
+def run_validate(args: argparse.Namespace):
+    from annotator import Annotator
+    Annotator().write_safe_annotations(args.start_file, args.end_file, args.start_file is not None)
+
+def run_convert(args: argparse.Namespace):
+    from SpacyProcessor import SpacyProcessor
+    processor = SpacyProcessor(Config())
+    near_duplicates = None if args.keep_near_duplicates else processor.cluster_data()
+    processor.build_corpus(test_size=args.test_size, shard_size=args.shard_size, batch_size=args.batch_size,
+                           n_process=args.n_process, near_duplicates=near_duplicates, dev_size=args.dev_size)
+
+def run_infer(args: argparse.Namespace):
+    from infer import NerInference
+    config = replace(Config(), ner_model=args.model) if args.model else Config()
+    NerInference(config).run(args.batch_size, args.n_process, args.force)
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    command = commands.add_parser("crawl", help="Download contract articles to data/raw")
+    command.add_argument("--start-page", type=int, default=0)
+    command.add_argument("--workers", type=int, default=None, help="Requests in flight, defaults to Config.workers")
+    command.add_argument("--incremental", action="store_true", help="Stop at the first page without new articles")
+    command.add_argument("--revalidate", action="store_true", help="Refetch known articles with conditional requests")
+    command.add_argument("--offline", action="store_true", help="Replay from the page cache")
+    command.add_argument("--clean-inline", action="store_true", help="Write cleaned records straight to data/clean")
+    command.set_defaults(run=run_crawl)
+
+    command = commands.add_parser("clean", help="Clean data/raw into data/clean")
+    command.add_argument("--workers", type=int, default=None, help="Worker processes, defaults to the CPU count")
+    command.add_argument("--force", action="store_true", help="Clean unchanged files too")
+    command.set_defaults(run=run_clean)
+
+    command = commands.add_parser("annotate", help="Annotate data/clean into data/blackbox")
+    command.add_argument("--start-file", default=None, help="Skip the files listed before this one")
+    command.add_argument("--representatives-only", action="store_true",
+                         help="Annotate only the first contract of each cluster of near-duplicates")
+    command.set_defaults(run=run_annotate)
+
+    command = commands.add_parser("validate", help="Validate data/blackbox into data/annotated")
+    command.add_argument("--start-file", default=None, help="Skip the files listed before this one")
+    command.add_argument("--end-file", default=None, help="Stop before this file")
+    command.set_defaults(run=run_validate)
+
+    command = commands.add_parser("convert", help="Build the spaCy corpus from data/manual")
+    command.add_argument("--test-size", type=float, default=0.3)
+    command.add_argument("--dev-size", type=float, default=0.15, help="Share of the dev split scored during training")
+    command.add_argument("--shard-size", type=int, default=None, help="Docs per shard, defaults to Config.spacy_shard_size")
+    command.add_argument("--batch-size", type=int, default=None)
+    command.add_argument("--n-process", type=int, default=None)
+    command.add_argument("--keep-near-duplicates", action="store_true",
+                         help="Split records independently instead of keeping clusters of near-duplicates together")
+    command.set_defaults(run=run_convert)
+
+    command = commands.add_parser("infer", help="Run the NER pipeline over data/clean into data/ner")
+    command.add_argument("--model", default=None, help="Pipeline to load, defaults to Config.ner_model")
+    command.add_argument("--batch-size", type=int, default=None)
+    command.add_argument("--n-process", type=int, default=None)
+    command.add_argument("--force", action="store_true", help="Redo files that already have output")
+    command.set_defaults(run=run_infer)
+    return parser
+
+def main(argv: List[str] = None):
+    args = build_parser().parse_args(argv)
+    args.run(args)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -11,6 +11,54 @@ class Config:
     base_url: str = field(default="https://www.defense.gov/News/Contracts/")
     data_dir: str = field(default="data")
     date_format: str = field(default="%B %d, %Y")
+    storage_format: str = field(default="json")  # "json" or "jsonl"
+    html_parser: str = field(default="html.parser")  # "html.parser" or "lxml"
+    clean_inline: bool = field(default=False)  # Write cleaned records straight to data/clean
+    dataset_dir: str = field(default="dataset")  # Parquet dataset, relative to data_dir
+    contract_store: str = field(default="contracts.sqlite")  # SQLite store, relative to data_dir
+    # Crawler settings
+    workers: int = field(default=8)
+    rate_limit: float = field(default=4.0)  # Requests per second, per host
+    max_retries: int = field(default=3)
+    backoff_factor: float = field(default=1.0)
+    timeout: float = field(default=30.0)
+    state_file: str = field(default="crawl_state.json")  # Relative to data_dir
+    page_cache: bool = field(default=True)  # Keep every fetched page in the page cache
+    cache_dir: str = field(default="cache")  # Relative to data_dir
+    offline: bool = field(default=False)  # Replay from the page cache without network access
+    # Annotation settings
+    model: str = field(default="gpt-3.5-turbo-0125")
+    max_concurrent_requests: int = field(default=16)
+    requests_per_minute: int = field(default=3500)
+    tokens_per_minute: int = field(default=160000)
+    annotation_batch_size: int = field(default=1)  # Contracts packed into one request
+    annotation_cache: str = field(default="annotation_cache.sqlite")  # Relative to data_dir, "" disables
+    annotation_cache_max_entries: int = field(default=0)  # 0 keeps every entry
+    purge_stale_annotations: bool = field(default=False)  # Drop entries made with another prompt or model
+    rule_extraction: bool = field(default=False)  # Fill rigid fields with rules, ask the LLM only for the rest
+    # Near-duplicate detection
+    dedup_threshold: float = field(default=0.8)  # Estimated Jaccard similarity of word shingles
+    dedup_num_perm: int = field(default=128)  # MinHash signature length
+    dedup_bands: int = field(default=16)  # LSH bands, num_perm must be a multiple
+    # spaCy settings
+    spacy_model: str = field(default="en_core_web_lg")
+    spacy_batch_size: int = field(default=256)  # Texts per nlp.pipe batch
+    spacy_n_process: int = field(default=1)
+    spacy_checkpoint_every: int = field(default=0)  # Documents between DocBin checkpoints, 0 writes once at the end
+    spacy_shard_size: int = field(default=10000)  # Documents per .spacy corpus shard
+    ner_model: str = field(default="training/model-best")  # Trained pipeline used by infer.py
+    ner_dir: str = field(default="ner")  # NER output, relative to data_dir
+    # Metrics and tracing
+    metrics_file: str = field(default="metrics.prom")  # Relative to data_dir, .json for a JSON snapshot, "" disables
+    metrics_interval: float = field(default=30.0)  # Seconds between exports during long stages
+    profile_stages: tuple = field(default=())  # Stages run under cProfile, e.g. ("crawl", "annotate")
+    profile_dir: str = field(default="profiles")  # cProfile output, relative to data_dir
+    trace_memory: bool = field(default=False)  # Record the peak traced allocation of every stage
+    # Semantic search
+    embedding_model: str = field(default="all-MiniLM-L6-v2")  # sentence-transformers model
+    embedding_dir: str = field(default="embeddings")  # Embedding index, relative to data_dir
+    embedding_dtype: str = field(default="float32")  # "float32", or "float16" for half the disk at slower queries
+    embedding_batch_size: int = field(default=256)  # Texts per encoder batch
     headers: dict = field(default_factory=lambda: {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
     })
@@ -72,3 +120,14 @@ class Config:
 
     '''
     )
+    fields_prompt: str = field(default=
+    '''
+        You are a parser. Extract the following fields from the defense contract announcement you are given: {fields}. It must be a direct extraction, so no paraphrasing. If you cannot find something to extract for a field, make it an empty string. You must not talk back. Reply only with a JSON object that has exactly these fields as keys and strings as values.
+    '''
+    )
+    batch_prompt: str = field(default=
+    '''
+        BATCH MODE:
+        The input is a JSON object {"contracts": [{"id": "0", "text": "..."}, ...]} holding several contracts. Parse every contract on its own, exactly as described above. Reply with a single JSON object {"results": [{"id": "0", "output": {...}}, ...]} containing exactly one result per contract, where "id" is copied from the input and "output" is the output you would give for that contract alone.
+    '''
+    )
@@ -0,0 +1,192 @@
+import sqlite3
+import threading
+from datetime import date, datetime
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, List, Optional
+from config import Config
+from fileutil import read_contracts
+from model import Contract
+
+COLUMNS = [
+    "contract_id", "federal_agency", "military_branch", "contract_amount", "contract_date",
+    "company_name", "location", "contract_description", "estimated_completion_date",
+    "funds_obligated", "source_url", "contract_text"
+]
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS contracts (
+        id INTEGER PRIMARY KEY,
+        contract_id TEXT NOT NULL,
+        federal_agency TEXT,
+        military_branch TEXT,
+        contract_amount REAL,
+        contract_date TEXT,
+        company_name TEXT,
+        location TEXT,
+        contract_description TEXT,
+        estimated_completion_date TEXT,
+        funds_obligated TEXT,
+        source_url TEXT NOT NULL,
+        contract_text TEXT,
+        UNIQUE (contract_id, source_url)
+    );
+    CREATE INDEX IF NOT EXISTS contracts_company ON contracts (company_name COLLATE NOCASE);
+    CREATE INDEX IF NOT EXISTS contracts_agency ON contracts (federal_agency COLLATE NOCASE);
+    CREATE INDEX IF NOT EXISTS contracts_branch_date ON contracts (military_branch, contract_date);
+    CREATE INDEX IF NOT EXISTS contracts_amount ON contracts (contract_amount);
+    CREATE INDEX IF NOT EXISTS contracts_date ON contracts (contract_date);
+    CREATE INDEX IF NOT EXISTS contracts_completion ON contracts (estimated_completion_date);
+
+    -- External content FTS index, kept in sync with contracts by the triggers below
+    CREATE VIRTUAL TABLE IF NOT EXISTS contracts_fts USING fts5(
+        contract_text, content='contracts', content_rowid='id', tokenize='porter unicode61'
+    );
+    CREATE TRIGGER IF NOT EXISTS contracts_ai AFTER INSERT ON contracts BEGIN
+        INSERT INTO contracts_fts (rowid, contract_text) VALUES (new.id, new.contract_text);
+    END;
+    CREATE TRIGGER IF NOT EXISTS contracts_ad AFTER DELETE ON contracts BEGIN
+        INSERT INTO contracts_fts (contracts_fts, rowid, contract_text) VALUES ('delete', old.id, old.contract_text);
+    END;
+    CREATE TRIGGER IF NOT EXISTS contracts_au AFTER UPDATE OF contract_text ON contracts BEGIN
+        INSERT INTO contracts_fts (contracts_fts, rowid, contract_text) VALUES ('delete', old.id, old.contract_text);
+        INSERT INTO contracts_fts (rowid, contract_text) VALUES (new.id, new.contract_text);
+    END;
+"""
+
+def as_text(value) -> Optional[str]:
+    """
+    Dates are stored as ISO "YYYY-MM-DD" text, which sorts and compares correctly.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.date().isoformat() if isinstance(value, datetime) else value.isoformat()
+
+class ContractStore:
+    """
+    Embedded SQLite database of annotated contracts, with an index on every
+    field that is looked up and an FTS5 index over contract_text.
+
+    A contract is identified by its contract ID and the article it came from,
+    so upserting a re-annotated file replaces its rows instead of duplicating them.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM contracts").fetchone()[0]
+
+    @staticmethod
+    def to_row(contract: Contract) -> tuple:
+        return (
+            contract.contract_id, contract.federal_agency, contract.military_branch,
+            contract.contract_amount, as_text(contract.contract_date), contract.company_name,
+            contract.location, contract.contract_description, as_text(contract.estimated_completion_date),
+            contract.funds_obligated, contract.source_url, contract.contract_text
+        )
+
+    @staticmethod
+    def from_row(row: tuple) -> Contract:
+        fields = dict(zip(COLUMNS, row))
+        for name in ("contract_date", "estimated_completion_date"):
+            if fields[name] is not None:
+                fields[name] = datetime.fromisoformat(fields[name])
+        return Contract(**fields)
+
+    def upsert(self, contracts: Iterable[Contract], batch_size: int = 10000) -> int:
+        """
+        Input: Contracts (Iterable[Contract]), rows per transaction (int)
+        Return: Number of contracts written
+        Each batch is written in one transaction, which is what makes bulk loads
+        fast: SQLite syncs once per commit, not once per row.
+        """
+        statement = f"""
+            INSERT INTO contracts ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))})
+            ON CONFLICT (contract_id, source_url) DO UPDATE SET
+            {", ".join(f"{name} = excluded.{name}" for name in COLUMNS if name not in ("contract_id", "source_url"))}
+        """
+        contracts = iter(contracts)
+        total = 0
+        while True:
+            rows = [self.to_row(contract) for contract in islice(contracts, batch_size)]
+            if not rows:
+                return total
+            with self.lock:
+                self.connection.execute("BEGIN")
+                try:
+                    self.connection.executemany(statement, rows)
+                except BaseException:
+                    self.connection.execute("ROLLBACK")
+                    raise
+                self.connection.execute("COMMIT")
+            total += len(rows)
+
+    def ingest(self, annotated_dir: Path, batch_size: int = 10000) -> int:
+        """
+        Upserts every file in data/annotated.
+        Return: Number of contracts written
+        """
+        paths = sorted(Path(annotated_dir).glob("*.json*"))
+        return self.upsert((contract for path in paths for contract in read_contracts(path)), batch_size)
+
+    def find(self, contract_id: str = None, company: str = None, agency: str = None, branch: str = None,
+             min_amount: float = None, max_amount: float = None,
+             start_date: date = None, end_date: date = None,
+             text: str = None, limit: int = 100) -> List[Contract]:
+        """
+        Input: Any combination of filters; company and agency match whole names,
+        ignoring case, dates are inclusive bounds on contract_date and text is an
+        FTS5 query over contract_text, e.g. "hypersonic AND missile"
+        Return: Matching contracts, best text matches first, otherwise newest first
+        """
+        clauses, params = [], []
+
+        def where(clause: str, value):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+
+        where("contracts.contract_id = ?", contract_id)
+        where("company_name = ? COLLATE NOCASE", company)
+        where("federal_agency = ? COLLATE NOCASE", agency)
+        where("military_branch = ?", branch)
+        where("contract_amount >= ?", min_amount)
+        where("contract_amount <= ?", max_amount)
+        where("contract_date >= ?", as_text(start_date))
+        where("contract_date <= ?", as_text(end_date))
+        source = "contracts"
+        order = "contract_date DESC, contracts.id"
+        if text is not None:
+            source = "contracts_fts JOIN contracts ON contracts.id = contracts_fts.rowid"
+            where("contracts_fts MATCH ?", text)
+            order = "bm25(contracts_fts)"
+        query = f"""
+            SELECT {", ".join(f"contracts.{name}" for name in COLUMNS)} FROM {source}
+            {"WHERE " + " AND ".join(clauses) if clauses else ""}
+            ORDER BY {order} LIMIT ?
+        """
+        with self.lock:
+            rows = self.connection.execute(query, params + [limit]).fetchall()
+        return [self.from_row(row) for row in rows]
+
+    def search(self, text: str, limit: int = 100) -> List[Contract]:
+        """
+        Full-text search over contract_text, best matches first.
+        """
+        return self.find(text=text, limit=limit)
+
+    def close(self):
+        with self.lock:
+            self.connection.execute("PRAGMA optimize")
+            self.connection.close()
+
+def open_contract_store(config: Config) -> ContractStore:
+    return ContractStore(Path(config.data_dir).joinpath(config.contract_store))
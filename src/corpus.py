@@ -0,0 +1,92 @@
+"""
+Sharded .spacy corpora.
+
+ShardWriter writes Docs to numbered DocBin files of at most `shard_size` docs,
+so building a corpus never holds more than one shard in memory. The
+"defense.ShardedCorpus.v1" reader streams them back during training; load
+this module with `PYTHONPATH=src python -m spacy train ... --code src/corpus.py`.
+"""
+import os
+import shutil
+from pathlib import Path
+from typing import Callable, Iterator, List
+import spacy
+from spacy.tokens import Doc, DocBin
+from spacy.training import Example
+from fileutil import write_atomic
+
+class ShardWriter:
+    """
+    Shards are written to a hidden .<name>.building directory next to
+    `directory`, which replaces it in close(). Until then the previous corpus is
+    left as it was, so an interrupted build does not destroy it.
+    """
+
+    def __init__(self, directory: Path, prefix: str, shard_size: int = 10000):
+        self.directory = Path(directory)
+        self.building = self.directory.with_name(f".{self.directory.name}.building")
+        self.previous = self.directory.with_name(f".{self.directory.name}.previous")
+        # A swap that died between its two renames left the old corpus aside
+        if self.previous.exists() and not self.directory.exists():
+            os.replace(self.previous, self.directory)
+        for leftover in (self.building, self.previous):
+            if leftover.exists():
+                shutil.rmtree(leftover)
+        self.building.mkdir(parents=True)
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.shards = 0
+        self.docs = 0
+        self.doc_bin = DocBin(store_user_data=True)
+
+    def add(self, doc: Doc):
+        self.doc_bin.add(doc)
+        self.docs += 1
+        if len(self.doc_bin) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.doc_bin) == 0:
+            return
+        write_atomic(self.building.joinpath(f"{self.prefix}-{self.shards:05}.spacy"), self.doc_bin.to_bytes(), label="spacy")
+        self.shards += 1
+        self.doc_bin = DocBin(store_user_data=True)
+
+    def close(self):
+        """
+        Writes the last shard and swaps the new shards in for the old ones.
+        """
+        self.flush()
+        if self.directory.exists():
+            os.replace(self.directory, self.previous)
+        os.replace(self.building, self.directory)
+        if self.previous.exists():
+            shutil.rmtree(self.previous)
+
+def shard_paths(path: Path) -> List[Path]:
+    """
+    A single .spacy file, or every .spacy file of a directory in name order.
+    """
+    path = Path(path)
+    return sorted(path.glob("*.spacy")) if path.is_dir() else [path]
+
+def read_shards(path: Path, vocab) -> Iterator[Doc]:
+    for shard in shard_paths(path):
+        yield from DocBin().from_disk(shard).get_docs(vocab)
+
+@spacy.registry.readers("defense.ShardedCorpus.v1")
+def create_sharded_corpus(path: Path, max_length: int = 0, limit: int = 0) -> Callable[["spacy.Language"], Iterator[Example]]:
+    """
+    Like spacy.Corpus.v1, but reads one shard at a time. Docs longer than
+    max_length tokens are skipped, and at most `limit` examples are read.
+    """
+    def read(nlp) -> Iterator[Example]:
+        count = 0
+        for reference in read_shards(path, nlp.vocab):
+            if max_length and len(reference) > max_length:
+                continue
+            yield Example(nlp.make_doc(reference.text), reference)
+            count += 1
+            if limit and count >= limit:
+                return
+    return read
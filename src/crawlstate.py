@@ -0,0 +1,69 @@
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+from fileutil import write_atomic
+
+class CrawlState:
+    """
+    Persistent record of the article URLs that have already been ingested,
+    together with the ETag/Last-Modified validators they were served with.
+    Stored as a single JSON file that is replaced atomically on save.
+
+    File Format:
+    {
+        "articles": {
+            "<url>": {"etag": str, "last_modified": str, "crawled_at": str}
+        }
+    }
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.articles: Dict[str, dict] = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as file:
+                self.articles = json.load(file)["articles"]
+
+    def __len__(self) -> int:
+        return len(self.articles)
+
+    def is_known(self, url: str) -> bool:
+        return url in self.articles
+
+    def conditional_headers(self, url: str) -> Optional[dict]:
+        """
+        Headers for revalidating a known article, or None if there is nothing
+        to revalidate against.
+        """
+        entry = self.articles.get(url)
+        if not entry:
+            return None
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers or None
+
+    def record(self, url: str, etag: str = None, last_modified: str = None):
+        """
+        Marks an article as ingested. Only call this once its contracts are written.
+        """
+        with self.lock:
+            self.articles[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "crawled_at": datetime.now().isoformat(timespec="seconds")
+            }
+
+    def save(self):
+        """
+        Writes the state to disk. A temporary file is renamed over the old state,
+        so an interrupted save never leaves a truncated file behind.
+        """
+        with self.lock:
+            data = json.dumps({"articles": self.articles}, indent=4)
+        write_atomic(self.path, data, label="state")
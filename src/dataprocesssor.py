@@ -1,30 +1,42 @@
 import json
+import random
+from itertools import islice
 from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple
 from config import Config
+from dedup import NearDuplicateIndex, near_duplicate_index
+from splits import assign_split, record_key
 
 class DataProcessor:
     def __init__(self, tokenizer=None, config: Config=Config()):
         """ Initialize the processor with an optional tokenizer function. """
         self.tokenizer = tokenizer
+        self.config = config
         self.data_dir = config.data_dir
 
+    def iter_data(self) -> Iterator[dict]:
+        """ Lazily yield contracts from the JSON and JSON Lines files in data/annotated, one file in memory at a time. """
+        for json_file in sorted(Path(self.data_dir).joinpath("annotated").glob('*.json*')):
+            with open(json_file, 'r', encoding='utf-8') as file:
+                if json_file.suffix == ".jsonl":
+                    for line in file:
+                        if line.strip():
+                            yield json.loads(line)
+                else:
+                    yield from json.load(file)
+
     def load_data(self):
         """ Load and return a list of contracts from JSON files in the specified directory. """
-        contracts = []
-        for json_file in Path(self.data_dir).joinpath("annotated").glob('*.json'):
-            with open(json_file, 'r', encoding='utf-8') as file:
-                contracts.extend(json.load(file))
-        return contracts
+        return list(self.iter_data())
 
-    def preprocess(self, data):
-        """ Perform cleaning and tokenization on contract data. """
-        processed_data = []
+    def iter_preprocess(self, data: Iterable[dict]) -> Iterator[dict]:
+        """ Lazily clean and tokenize contract data, one record at a time. """
         for contract in data:
             text = contract.get('contract_text', '')
             text = self.clean_text(text)
             if self.tokenizer:
                 text = self.tokenizer(text)  # Tokenize if tokenizer is provided
-            processed_data.append({
+            yield {
                 'text': text,
                 'labels': {
                     'contract_id': contract.get('contract_id', ''),
@@ -36,16 +48,70 @@ class DataProcessor:
                     'estimated_completion_date': contract.get('estimated_completion_date', ''),
                     'funds_obligated': contract.get('funds_obligated', ''),
                 }
-            })
-        return processed_data
-    
-    def get_train_test_data(self, data, test_size=0.2):
-        import random
-        """Split data into training and testing sets."""
-        random.shuffle(data)  # Shuffle the data to ensure randomness
-        split_index = int(len(data) * (1 - test_size))
-        train_data = data[:split_index]
-        test_data = data[split_index:]
+            }
+
+    def preprocess(self, data):
+        """ Perform cleaning and tokenization on contract data. """
+        return list(self.iter_preprocess(data))
+
+    def shuffle(self, data: Iterable, buffer_size: int = 10000, seed: int = None) -> Iterator:
+        """
+        Approximately shuffle a stream while holding at most buffer_size items:
+        each incoming item replaces a random item of the buffer, which is yielded.
+        """
+        rng = random.Random(seed)
+        buffer = []
+        for item in data:
+            if len(buffer) < buffer_size:
+                buffer.append(item)
+                continue
+            index = rng.randrange(buffer_size)
+            yield buffer[index]
+            buffer[index] = item
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def cluster_data(self, data: Iterable[dict] = None) -> NearDuplicateIndex:
+        """ Cluster near-duplicate contracts (modifications and options of one award), keyed by record_key. """
+        index = near_duplicate_index(self.config)
+        for contract in self.iter_data() if data is None else data:
+            index.add(record_key(contract), contract.get('contract_text', ''))
+        return index
+
+    def assign(self, contract: dict, test_size: float, near_duplicates: NearDuplicateIndex = None) -> str:
+        key = record_key(contract)
+        if near_duplicates is not None:
+            key = near_duplicates.representative(key)
+        return assign_split(key, test_size)
+
+    def iter_split(self, data: Iterable[dict], split: str, test_size: float = 0.2,
+                   near_duplicates: NearDuplicateIndex = None) -> Iterator[dict]:
+        """
+        Lazily yield the records of one split ("train" or "test"). Records are
+        assigned by a stable hash of their contract ID, so a contract stays in
+        the same split across runs and as the archive grows. With an index from
+        cluster_data, each cluster of near-duplicates stays on one side.
+        """
+        for contract in data:
+            if self.assign(contract, test_size, near_duplicates) == split:
+                yield contract
+
+    def get_train_test_data(self, data, test_size=0.2, near_duplicates: NearDuplicateIndex = None,
+                            seed: int = None) -> Tuple[List[dict], List[dict]]:
+        """
+        Split data into training and testing sets, without modifying `data`.
+        Records are assigned by hash as in iter_split, then each side is shuffled
+        (reproducibly with a seed).
+        """
+        train_data, test_data = [], []
+        for contract in data:
+            if self.assign(contract, test_size, near_duplicates) == "test":
+                test_data.append(contract)
+            else:
+                train_data.append(contract)
+        # A buffer as large as the data makes shuffle a full shuffle
+        train_data = list(self.shuffle(train_data, max(len(train_data), 1), seed))
+        test_data = list(self.shuffle(test_data, max(len(test_data), 1), seed))
         return train_data, test_data
 
     def clean_text(self, text):
@@ -53,7 +119,11 @@ class DataProcessor:
         text = text.replace('\n', ' ').replace('\r', ' ').strip()
         return text
 
-    def get_batches(self, data, batch_size):
-        """ Yield processed data in batches. """
-        for i in range(0, len(data), batch_size):
-            yield data[i:i + batch_size]
+    def get_batches(self, data: Iterable, batch_size: int) -> Iterator[list]:
+        """ Yield data in batches from any iterable, holding one batch at a time. """
+        iterator = iter(data)
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                return
+            yield batch
@@ -0,0 +1,139 @@
+from collections import defaultdict
+from dataclasses import asdict
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from config import Config
+from fileutil import read_contracts
+from model import Contract
+
+# Typed columns: real dates, float amounts and dictionary encoded (categorical)
+# branch and agency, which only take a few hundred distinct values.
+SCHEMA = pa.schema([
+    ("contract_id", pa.string()),
+    ("federal_agency", pa.dictionary(pa.int32(), pa.string())),
+    ("military_branch", pa.dictionary(pa.int32(), pa.string())),
+    ("contract_amount", pa.float64()),
+    ("contract_date", pa.date32()),
+    ("company_name", pa.string()),
+    ("location", pa.string()),
+    ("contract_description", pa.string()),
+    ("estimated_completion_date", pa.date32()),
+    ("funds_obligated", pa.string()),
+    ("source_url", pa.string()),
+    ("contract_text", pa.string()),
+])
+PARTITIONING = ds.partitioning(pa.schema([("year", pa.int16()), ("month", pa.int8())]), flavor="hive")
+
+def as_date(value) -> Optional[date]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.date() if isinstance(value, datetime) else value
+
+class ContractDataset:
+    """
+    Columnar copy of the annotated contracts, stored as Parquet and
+    partitioned by the year and month of the contract date:
+
+    data/dataset/year=2024/month=4/part-0.parquet
+
+    Queries only open the partitions and read the columns they need; filters
+    on other columns are pushed down to the Parquet row group statistics.
+    """
+
+    def __init__(self, config: Config = Config()):
+        self.root = Path(config.data_dir).joinpath(config.dataset_dir)
+        self.annotated_dir = Path(config.data_dir).joinpath("annotated")
+
+    @staticmethod
+    def to_table(contracts: Iterable[Contract]) -> pa.Table:
+        """
+        Input: Contracts (Iterable[Contract])
+        Return: Arrow table with SCHEMA plus the year and month partition columns
+        """
+        columns = defaultdict(list)
+        for contract in contracts:
+            for name, value in asdict(contract).items():
+                if name in ("contract_date", "estimated_completion_date"):
+                    value = as_date(value)
+                columns[name].append(value)
+        table = pa.table({name: columns[name] for name in SCHEMA.names}, schema=SCHEMA) if columns else SCHEMA.empty_table()
+        dates = table.column("contract_date")
+        return table.append_column("year", pc.year(dates).cast(pa.int16())) \
+                    .append_column("month", pc.month(dates).cast(pa.int8()))
+
+    def write(self, contracts: Iterable[Contract]):
+        """
+        Input: Contracts (Iterable[Contract])
+        Output: None
+        Every month that appears in `contracts` is rewritten as a whole, so pass
+        all contracts of a month at once. Other months are left untouched.
+        """
+        table = self.to_table(contracts)
+        if table.num_rows == 0:
+            return
+        ds.write_dataset(
+            table,
+            self.root,
+            format="parquet",
+            partitioning=PARTITIONING,
+            existing_data_behavior="delete_matching",
+            basename_template="part-{i}.parquet"
+        )
+
+    def iter_annotated(self) -> Iterator[Tuple[str, List[Contract]]]:
+        """
+        Yields (month, contracts) for the files in data/annotated, one month at
+        a time. File Format: data/annotated/2024-04-19_3749216.json(l)
+        """
+        months: Dict[str, List[Path]] = defaultdict(list)
+        for path in sorted(self.annotated_dir.glob("*.json*")):
+            months[path.name[:7]].append(path)
+        for month, paths in months.items():
+            contracts = [contract for path in paths for contract in read_contracts(path)]
+            yield month, contracts
+
+    def ingest(self) -> int:
+        """
+        Rebuilds the dataset from data/annotated, one month per write.
+        Return: Number of contracts written
+        """
+        total = 0
+        for month, contracts in self.iter_annotated():
+            self.write(contracts)
+            total += len(contracts)
+            print(f"Ingested {month}: {len(contracts)} contracts")
+        return total
+
+    def load(self, columns: List[str] = None, filters=None):
+        """
+        Input: Columns to read (List[str]), filters in the pandas/pyarrow
+        ("column", "op", value) form, e.g.
+            [("year", "==", 2022), ("military_branch", "==", "NAVY"), ("contract_amount", ">", 100e6)]
+        Return: pandas DataFrame, with categorical branch and agency columns
+        Filters on year and month skip whole partitions.
+        """
+        dataset = ds.dataset(self.root, format="parquet", partitioning=PARTITIONING)
+        expression = pq.filters_to_expression(filters) if filters else None
+        return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+    @staticmethod
+    def to_contracts(frame) -> List[Contract]:
+        """
+        Input: A DataFrame returned by load with every Contract column
+        Return: The rows as Contracts, with dates as datetimes like the JSON files
+        """
+        contracts = []
+        for row in frame.to_dict("records"):
+            fields = {name: row[name] for name in SCHEMA.names}
+            for name in ("contract_date", "estimated_completion_date"):
+                if isinstance(fields[name], date):
+                    fields[name] = datetime.combine(fields[name], datetime.min.time())
+            contracts.append(Contract(**fields))
+        return contracts
@@ -0,0 +1,143 @@
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Tuple
+import numpy as np
+from config import Config
+
+PRIME = (1 << 31) - 1
+# Amounts, dates and other numbers are what modifications of one award differ in
+NUMBER = re.compile(r"\d[\d,.]*")
+WORD = re.compile(r"\w+|\$")
+
+def shingles(text: str, size: int = 3) -> np.ndarray:
+    """
+    Input: Contract text (str), words per shingle (int)
+    Return: CRC32 of every word shingle, with numbers masked (uint64 array)
+    """
+    words = WORD.findall(NUMBER.sub("0", text.lower()))
+    if len(words) < size:
+        words = words + [""] * (size - len(words))
+    return np.fromiter(
+        (zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)),
+        dtype=np.uint64
+    )
+
+class NearDuplicateIndex:
+    """
+    Clusters near-duplicate contract texts, such as the modifications and
+    options of one award, with MinHash signatures and LSH banding.
+
+    Every text gets a MinHash signature of `num_perm` values, split into
+    `bands` bands. Texts that share a band are candidates, and candidates whose
+    estimated Jaccard similarity is at least `threshold` join one cluster. Only
+    candidates are compared, and a band bucket keeps one member per cluster, so
+    adding n texts costs about O(n) rather than O(n^2), also when many of them
+    are near-duplicates of each other. The representative of a cluster is its first added member.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, threshold: float = 0.8, shingle_size: int = 3, seed: int = 0):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, PRIME, size=num_perm, dtype=np.uint64)
+        self.buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(bands)]
+        self.keys: List[Hashable] = []
+        self.ids: Dict[Hashable, int] = {}
+        self.signatures: List[np.ndarray] = []
+        self.parent: List[int] = []
+        # Similarity estimates computed by add()
+        self.comparisons = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        MinHash signature: for each of the num_perm hash functions
+        (a * x + b) mod PRIME, the minimum over the text's shingles.
+        """
+        hashes = shingles(text, self.shingle_size)
+        # a < 2^31 and x < 2^32, so a * x + b does not overflow 64 bits
+        return ((np.outer(hashes, self.a) + self.b) % PRIME).min(axis=0).astype(np.uint32)
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int):
+        i, j = self.find(i), self.find(j)
+        # The earlier member stays the representative
+        if i != j:
+            self.parent[max(i, j)] = min(i, j)
+
+    def add(self, key: Hashable, text: str) -> Hashable:
+        """
+        Input: Unique key of the contract (Hashable), its text (str)
+        Return: Key of the representative of the contract's cluster
+        Adding a key again does nothing.
+        """
+        if key in self.ids:
+            return self.representative(key)
+        i = len(self.keys)
+        self.keys.append(key)
+        self.ids[key] = i
+        self.parent.append(i)
+        signature = self.signature(text)
+        self.signatures.append(signature)
+        for band, buckets in enumerate(self.buckets):
+            band_key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            bucket = buckets[band_key]
+            for j in bucket:
+                if self.find(i) != self.find(j):
+                    self.comparisons += 1
+                    if self.similarity(i, j) >= self.threshold:
+                        self.union(i, j)
+            # A bucket keeps one member per cluster, so a cluster of k
+            # near-duplicates costs k comparisons rather than k^2 / 2
+            roots = set()
+            members = []
+            for j in bucket + [i]:
+                root = self.find(j)
+                if root not in roots:
+                    roots.add(root)
+                    members.append(j)
+            buckets[band_key] = members
+        return self.representative(key)
+
+    def add_all(self, items: Iterable[Tuple[Hashable, str]]) -> "NearDuplicateIndex":
+        for key, text in items:
+            self.add(key, text)
+        return self
+
+    def similarity(self, i: int, j: int) -> float:
+        """
+        Estimated Jaccard similarity of the shingles of two added texts.
+        """
+        return float(np.mean(self.signatures[i] == self.signatures[j]))
+
+    def representative(self, key: Hashable) -> Hashable:
+        return self.keys[self.find(self.ids[key])]
+
+    def is_representative(self, key: Hashable) -> bool:
+        return self.representative(key) == key
+
+    def clusters(self) -> Dict[Hashable, List[Hashable]]:
+        """
+        Return: Members of every cluster, by representative, in insertion order
+        """
+        clusters = defaultdict(list)
+        for i, key in enumerate(self.keys):
+            clusters[self.keys[self.find(i)]].append(key)
+        return dict(clusters)
+
+def near_duplicate_index(config: Config = Config()) -> NearDuplicateIndex:
+    return NearDuplicateIndex(config.dedup_num_perm, config.dedup_bands, config.dedup_threshold)
@@ -0,0 +1,193 @@
+import json
+import os
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Tuple
+import numpy as np
+from config import Config
+from fileutil import write_atomic
+
+class EmbeddingIndex:
+    """
+    Persisted sentence embeddings of contract texts, for "find similar
+    contracts" queries.
+
+    Vectors are L2-normalized and appended to a raw float32 or float16 matrix
+    (vectors.bin) that is memory-mapped for queries, row i belonging to line i
+    of ids.txt. meta.json holds the dimension, dtype, model and number of
+    committed rows, and is replaced last on every append; whatever an
+    interrupted append left in the other files is cut off when the index is
+    opened. Texts are encoded once; adding a known ID does nothing. Opening an
+    index built with another embedding model raises ValueError, as its vectors
+    live in a different space.
+
+    Directory Format:
+    data/embeddings/
+        meta.json    {"dim": 384, "dtype": "float32", "count": 123456, "model": "all-MiniLM-L6-v2"}
+        ids.txt      one record ID per line
+        vectors.bin  count x dim matrix, row-major
+    """
+
+    def __init__(self, config: Config = Config(), encoder: Callable[[List[str]], np.ndarray] = None):
+        self.directory = Path(config.data_dir).joinpath(config.embedding_dir)
+        self.model_name = config.embedding_model
+        self.batch_size = config.embedding_batch_size
+        self.dtype = np.dtype(config.embedding_dtype)
+        self.encoder = encoder
+        self.dim = None
+        self.ids: List[str] = []
+        self.positions = {}
+        self.matrix = None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        meta_path = self.directory.joinpath("meta.json")
+        if meta_path.exists():
+            with open(meta_path, 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+            if meta.get("model", self.model_name) != self.model_name:
+                raise ValueError(f"{self.directory} was built with {meta['model']}, not {self.model_name}; "
+                                 f"delete it to re-encode with {self.model_name}")
+            self.dim, self.dtype = meta["dim"], np.dtype(meta["dtype"])
+            with open(self.directory.joinpath("ids.txt"), 'r', encoding='utf-8') as file:
+                self.ids = file.read().splitlines()[:meta["count"]]
+            self.positions = {record_id: i for i, record_id in enumerate(self.ids)}
+        self.truncate()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, record_id: str) -> bool:
+        return record_id in self.positions
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Input: Texts (List[str])
+        Return: L2-normalized embeddings, one row per text (float32)
+        """
+        if self.encoder is None:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(self.model_name)
+            self.encoder = lambda batch: model.encode(batch, batch_size=self.batch_size, convert_to_numpy=True)
+        vectors = np.asarray(self.encoder(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def truncate(self):
+        """
+        Cuts vectors.bin and ids.txt back to the committed count. An append
+        that died before meta.json was replaced can leave rows in either file,
+        and later rows would be misaligned with their IDs if they stayed.
+        """
+        vectors_path = self.directory.joinpath("vectors.bin")
+        size = len(self.ids) * self.dim * self.dtype.itemsize if self.dim else 0
+        if vectors_path.exists() and vectors_path.stat().st_size != size:
+            os.truncate(vectors_path, size)
+        ids_path = self.directory.joinpath("ids.txt")
+        content = "".join(f"{record_id}\n" for record_id in self.ids)
+        if ids_path.exists() and ids_path.stat().st_size != len(content.encode("utf-8")):
+            write_atomic(ids_path, content, label="embeddings")
+
+    def append(self, ids: List[str], vectors: np.ndarray):
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        try:
+            with open(self.directory.joinpath("vectors.bin"), 'ab') as file:
+                file.write(vectors.astype(self.dtype).tobytes())
+                file.flush()
+                os.fsync(file.fileno())
+            with open(self.directory.joinpath("ids.txt"), 'a', encoding='utf-8') as file:
+                file.write("".join(f"{record_id}\n" for record_id in ids))
+        except BaseException:
+            self.truncate()
+            raise
+        for record_id in ids:
+            self.positions[record_id] = len(self.ids)
+            self.ids.append(record_id)
+        write_atomic(self.directory.joinpath("meta.json"), json.dumps({
+            "dim": self.dim, "dtype": self.dtype.name, "count": len(self.ids), "model": self.model_name
+        }), label="embeddings")
+        self.matrix = None
+
+    def add(self, records: Iterable[Tuple[str, str]], chunk_size: int = 4096) -> int:
+        """
+        Input: (record ID, text) pairs (Iterable)
+        Return: Number of records encoded
+        Records are encoded and appended chunk by chunk; known IDs are skipped.
+        """
+        added = 0
+        chunk = {}
+        for record_id, text in records:
+            if record_id in self.positions or record_id in chunk:
+                continue
+            chunk[record_id] = text
+            if len(chunk) >= chunk_size:
+                added += self.add_chunk(chunk)
+                chunk = {}
+        if chunk:
+            added += self.add_chunk(chunk)
+        return added
+
+    def add_chunk(self, chunk: dict) -> int:
+        self.append(list(chunk), self.encode(list(chunk.values())))
+        return len(chunk)
+
+    def get_matrix(self) -> np.ndarray:
+        if self.matrix is None and self.ids:
+            self.matrix = np.memmap(self.directory.joinpath("vectors.bin"), dtype=self.dtype, mode="r",
+                                    shape=(len(self.ids), self.dim))
+        return self.matrix
+
+    def vector(self, record_id: str) -> np.ndarray:
+        return np.asarray(self.get_matrix()[self.positions[record_id]], dtype=np.float32)
+
+    def top_k(self, query: np.ndarray, k: int = 10, block_rows: int = 32768) -> List[Tuple[str, float]]:
+        """
+        Input: A normalized query vector (np.ndarray), number of results (int)
+        Return: (record ID, cosine similarity) of the k nearest records, best first
+        Scores come from one matrix-vector product per block of block_rows rows,
+        which bounds the temporary memory; float16 blocks are widened to float32
+        first. Nothing is re-encoded.
+        """
+        matrix = self.get_matrix()
+        if matrix is None:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        best_rows, best_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        for start in range(0, len(matrix), block_rows):
+            block = matrix[start:start + block_rows]
+            scores = (block if block.dtype == np.float32 else block.astype(np.float32)) @ query
+            if len(scores) > k:
+                rows = np.argpartition(-scores, k)[:k]
+            else:
+                rows = np.arange(len(scores))
+            best_rows = np.concatenate([best_rows, rows + start])
+            best_scores = np.concatenate([best_scores, scores[rows]])
+        order = np.argsort(-best_scores, kind="stable")[:k]
+        return [(self.ids[best_rows[i]], float(best_scores[i])) for i in order]
+
+    def search(self, text: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Contracts most similar to a free text query.
+        """
+        return self.top_k(self.encode([text])[0], k)
+
+    def similar(self, record_id: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Contracts most similar to an indexed one, without re-encoding it.
+        """
+        return [result for result in self.top_k(self.vector(record_id), k + 1) if result[0] != record_id][:k]
+
+def iter_clean_texts(config: Config = Config()) -> Iterator[Tuple[str, str]]:
+    """
+    Yields ("<file>:<position>", contract_text) for every precontract in data/clean.
+    """
+    from scraper import iter_precontracts
+    clean_dir = Path(config.data_dir).joinpath("clean")
+    for path in sorted(clean_dir.glob("*.json*")):
+        if path.name.startswith("."):
+            continue
+        for i, contract in enumerate(iter_precontracts(path)):
+            yield f"{path.name}:{i}", contract.contract_text
+
+if __name__ == "__main__":
+    config = Config()
+    index = EmbeddingIndex(config)
+    print(f"Encoded {index.add(iter_clean_texts(config))} new contracts, {len(index)} indexed")
@@ -0,0 +1,137 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable
+from normalize import MONTHS, parse_date
+
+# Fields of an annotation, in the order they are written
+ANNOTATION_FIELDS = (
+    "contract_id",
+    "federal_agency",
+    "contract_amount",
+    "company_name",
+    "location",
+    "contract_description",
+    "estimated_completion_date",
+    "funds_obligated"
+)
+
+STATES = [
+    "Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado", "Connecticut", "Delaware",
+    "Florida", "Georgia", "Hawaii", "Idaho", "Illinois", "Indiana", "Iowa", "Kansas", "Kentucky",
+    "Louisiana", "Maine", "Maryland", "Massachusetts", "Michigan", "Minnesota", "Mississippi",
+    "Missouri", "Montana", "Nebraska", "Nevada", "New Hampshire", "New Jersey", "New Mexico",
+    "New York", "North Carolina", "North Dakota", "Ohio", "Oklahoma", "Oregon", "Pennsylvania",
+    "Rhode Island", "South Carolina", "South Dakota", "Tennessee", "Texas", "Utah", "Vermont",
+    "Virginia", "Washington", "West Virginia", "Wisconsin", "Wyoming", "District of Columbia",
+    "D.C.", "Puerto Rico", "Guam"
+]
+
+CONTRACT_ID = r"[A-Z0-9]{6}-?\d{2}-?[A-Z0-9]-?[A-Z0-9]{4}"
+AMOUNT = r"\$\d[\d,]*(?:\.\d+)?"
+MONTH = "|".join(MONTHS + [f"{month[:3]}\\.?" for month in MONTHS] + ["Sept\\.?"])
+DATE = rf"(?:{MONTH}) (?:\d{{1,2}}, )?\d{{4}}"
+# A sentence fragment: no commas, and no periods except inside abbreviations like "U.S."
+FRAGMENT = r"(?:[^.,\s]|\.(?=\S)|[ \t])+?"
+
+RULES = {
+    # "(FA9453-24-C-X011)." at the very end
+    "contract_id": re.compile(rf"\(({CONTRACT_ID})\)\.?\s*$"),
+    # Modifications without one: "modification (P00015) to contract FA8106-21-C-0004"
+    "modified_contract_id": re.compile(rf"to (?:previously awarded )?contract ({CONTRACT_ID})\b"),
+    # "HRL Laboratories LLC, Malibu, California, was awarded"
+    "company_location": re.compile(
+        rf"^\s*(.+?), ([A-Z][A-Za-z.' -]*?, (?:{'|'.join(map(re.escape, STATES))})),"
+        r" (?:is|was|has been|have been|are|were)(?: being)? awarded"
+    ),
+    # "was awarded a $26,991,707", "has been awarded a maximum $250,000,000"
+    "contract_amount": re.compile(rf"awarded (?:an? )?(?:(?:maximum|estimated|not-to-exceed|ceiling) )?({AMOUNT})\b"),
+    # The rest of the award sentence, up to one of the sentences that follow it
+    "contract_description": re.compile(
+        rf"awarded (?:an? )?(?:(?:maximum|estimated|not-to-exceed|ceiling) )?{AMOUNT} (.+?)\.\s+"
+        r"(?=(?:Work|The work|This|Fiscal|Location|Type|Using|Funds|No funds|Bids)\b)"
+    ),
+    # "expected to be completed by July 19, 2029", "with an estimated completion date of Nov. 30, 2026"
+    "estimated_completion_date": re.compile(
+        rf"(?:expected to be completed by|(?:estimated|expected) completion date of)\s+({DATE})\b"
+    ),
+    # "The Air Force Research Laboratory, Kirtland Air Force Base, New Mexico, is the contracting activity"
+    "federal_agency": re.compile(
+        rf"(?:^|(?<=[.)])\s+)(?:The )?([A-Z]{FRAGMENT})(?:, (?:[^.]|\.(?=\S))*?)?,? is the contracting activity"
+    ),
+    # "The contracting activity is the Defense Logistics Agency Troop Support, Philadelphia, Pennsylvania"
+    "federal_agency_inverted": re.compile(rf"[Tt]he contracting activity is (?:the )?([A-Z]{FRAGMENT})(?:,|\s*\(|\.\s|\.?$)"),
+    # "funds in the amount of $38,716,559 will be obligated"
+    "funds_obligated": re.compile(rf"funds in the amount of ({AMOUNT}) (?:are|were|will be|is)(?: being)? obligated"),
+}
+
+class RuleExtractor:
+    """
+    Deterministic extraction of the fields that follow rigid patterns in
+    defense.gov announcements. Only fields that match are returned, with the
+    value copied from the text the same way the LLM is asked to; the rest are
+    left for the LLM.
+    """
+
+    def extract(self, text: str) -> Dict[str, str]:
+        """
+        Input: Contract text (str)
+        Return: The fields the rules could fill (Dict[str, str])
+        """
+        fields = {}
+        match = RULES["contract_id"].search(text) or RULES["modified_contract_id"].search(text)
+        if match:
+            fields["contract_id"] = match.group(1)
+
+        match = RULES["federal_agency"].search(text) or RULES["federal_agency_inverted"].search(text)
+        if match:
+            fields["federal_agency"] = match.group(1).strip()
+
+        match = RULES["contract_amount"].search(text)
+        if match:
+            fields["contract_amount"] = match.group(1)
+
+        match = RULES["contract_description"].search(text)
+        if match:
+            fields["contract_description"] = match.group(1)
+
+        match = RULES["company_location"].search(text)
+        if match:
+            fields["company_name"] = match.group(1)
+            fields["location"] = match.group(2)
+
+        match = RULES["estimated_completion_date"].search(text)
+        if match and parse_date(match.group(1)) is not None:
+            fields["estimated_completion_date"] = match.group(1)
+
+        match = RULES["funds_obligated"].search(text)
+        if match:
+            fields["funds_obligated"] = match.group(1)
+        return fields
+
+    @staticmethod
+    def missing(fields: Dict[str, str]) -> tuple:
+        """
+        The annotation fields the rules did not fill, in annotation order.
+        """
+        return tuple(name for name in ANNOTATION_FIELDS if name not in fields)
+
+    def coverage(self, texts: Iterable[str]) -> Counter:
+        """
+        Input: Contract texts (Iterable[str])
+        Return: How many contracts each field was filled for, plus "contracts"
+        and "complete" (every field filled, no LLM request needed)
+        """
+        counts = Counter()
+        for text in texts:
+            fields = self.extract(text)
+            counts.update(fields.keys())
+            counts["contracts"] += 1
+            counts["complete"] += not self.missing(fields)
+        return counts
+
+def format_coverage(counts: Counter) -> str:
+    total = counts["contracts"]
+    lines = [f"{total} contracts, {counts['complete']} fully extracted by rules"]
+    for name in ANNOTATION_FIELDS:
+        lines.append(f"  {name:28} {counts[name]:8} ({100 * counts[name] / max(total, 1):.1f}%)")
+    return "\n".join(lines)
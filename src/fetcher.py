@@ -0,0 +1,140 @@
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from config import Config
+from metrics import REGISTRY
+from pagecache import CacheMiss, PageCache
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class RateLimiter:
+    """
+    Spaces out requests to the same host so that no more than `rate`
+    requests per second are started against it. A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_slot: Dict[str, float] = {}
+
+    def wait(self, host: str):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class Fetcher:
+    """
+    Thread-safe HTTP client shared by every request of a crawl.
+    Keeps connections alive in a pooled session, rate limits per host and
+    retries connection errors and 429/5xx responses with exponential backoff.
+
+    Every page fetched is stored in the page cache. In offline mode pages are
+    served from the cache only and no request ever reaches the network.
+    """
+
+    def __init__(self, config: Config = Config()):
+        self.offline = config.offline
+        self.cache = None
+        if config.page_cache or config.offline:
+            self.cache = PageCache(Path(config.data_dir).joinpath(config.cache_dir))
+        self.timeout = config.timeout
+        self.max_retries = config.max_retries
+        self.backoff_factor = config.backoff_factor
+        self.rate_limiter = RateLimiter(config.rate_limit)
+        self.session = requests.Session()
+        self.session.headers.update(config.headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(config.workers, 1))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def backoff(self, attempt: int, response: requests.Response = None) -> float:
+        """
+        Seconds to wait before retry number `attempt` (starting at 0).
+        A numeric Retry-After header from the server takes precedence.
+        """
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return float(retry_after)
+        delay = self.backoff_factor * (2 ** attempt)
+        return delay + random.uniform(0, delay / 2)
+
+    def get(self, url: str, headers: dict = None) -> requests.Response:
+        """
+        Input: URL (str), extra request headers (dict)
+        Return: Response
+        Performs a GET request and stores successful responses in the page cache.
+        In offline mode the page is read from the cache instead.
+        """
+        if self.offline:
+            return self.get_cached(url)
+        response = self.fetch(url, headers)
+        if self.cache and response.status_code == 200:
+            self.cache.put(url, response.content, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return response
+
+    def get_cached(self, url: str) -> requests.Response:
+        """
+        Builds a response from the page cache. Raises CacheMiss for pages that were never fetched.
+        """
+        page = self.cache.get(url)
+        if page is None:
+            REGISTRY.inc("page_cache_total", result="miss")
+            raise CacheMiss(url)
+        REGISTRY.inc("page_cache_total", result="hit")
+        response = requests.Response()
+        response.url = url
+        response.status_code = 200
+        response._content = page.content
+        response.headers = CaseInsensitiveDict()
+        if page.etag:
+            response.headers["ETag"] = page.etag
+        if page.last_modified:
+            response.headers["Last-Modified"] = page.last_modified
+        return response
+
+    def fetch(self, url: str, headers: dict = None) -> requests.Response:
+        """
+        Performs the request against the network, retrying transient failures.
+        Raises an HTTPError for bad responses once the retries are exhausted.
+        A conditional request answered with 304 Not Modified is returned as is.
+        Every attempt is counted in http_requests_total{host, status} and timed
+        in http_request_seconds{host}; the time spent waiting for the rate
+        limiter is not included.
+        """
+        host = urlsplit(url).netloc
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait(host)
+            try:
+                with REGISTRY.timer("http_request_seconds", host=host):
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                REGISTRY.inc("http_requests_total", host=host, status=type(e).__name__)
+                if attempt == self.max_retries:
+                    raise
+                REGISTRY.inc("http_retries_total", host=host)
+                time.sleep(self.backoff(attempt))
+                continue
+            REGISTRY.inc("http_requests_total", host=host, status=response.status_code)
+            REGISTRY.inc("http_response_bytes_total", len(response.content), host=host)
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                REGISTRY.inc("http_retries_total", host=host)
+                time.sleep(self.backoff(attempt, response))
+                continue
+            response.raise_for_status()  # Raises an HTTPError for bad responses
+            return response
+
+    def close(self):
+        self.session.close()
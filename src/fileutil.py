@@ -0,0 +1,40 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import List, Union
+from metrics import REGISTRY
+from model import Contract
+
+def write_atomic(filepath: Union[str, Path], content: Union[str, bytes], label: str = "other"):
+    """
+    Writes content to a temporary file next to filepath, then renames it into place,
+    so readers never see a partially written file.
+    Timed into file_write_seconds, labelled dir=`label`. Callers pass a fixed
+    label (raw, clean, cache, state, ...) rather than one derived from the path,
+    so sharded directories do not each become their own series.
+    """
+    filepath = Path(filepath)
+    tmp_path = filepath.with_name(f"{filepath.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    mode, encoding = ('wb', None) if isinstance(content, bytes) else ('w', 'utf-8')
+    with REGISTRY.timer("file_write_seconds", dir=label):
+        with open(tmp_path, mode, encoding=encoding) as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+            size = file.tell()
+        os.replace(tmp_path, filepath)
+    REGISTRY.inc("file_write_bytes_total", size, dir=label)
+
+def read_contracts(filepath: Union[str, Path]) -> List[Contract]:
+    """
+    Reads an annotated file written by Annotator, either a JSON list or one
+    contract per line (.jsonl).
+    """
+    filepath = Path(filepath)
+    with open(filepath, 'r', encoding='utf-8') as file:
+        if filepath.suffix == ".jsonl":
+            items = [json.loads(line) for line in file if line.strip()]
+        else:
+            items = json.load(file)
+    return [Contract(**item) for item in items]
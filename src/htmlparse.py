@@ -0,0 +1,148 @@
+from typing import List, NamedTuple, Optional, Tuple
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+class Block(NamedTuple):
+    """
+    A top-level element of an article body, e.g. a branch header or a contract paragraph.
+    text is the element's full text and stripped_text the concatenation of its
+    stripped strings, matching BeautifulSoup's getText() and getText(strip=True).
+    """
+    has_attrs: bool
+    text: str
+    stripped_text: str
+
+class PageParser:
+    """
+    Extracts the few parts of defense.gov pages that the scraper uses.
+    Subclasses implement the extraction for one HTML parsing backend and must
+    return identical results.
+    """
+
+    def max_page(self, content: bytes) -> int:
+        """
+        Returns the number of the last page link, read from a listing page
+        requested with an out-of-range page number.
+        """
+        raise NotImplementedError
+
+    def article_urls(self, content: bytes) -> List[str]:
+        """
+        Returns the article urls of a listing page.
+        """
+        raise NotImplementedError
+
+    def article(self, content: bytes) -> Optional[Tuple[str, List[Block]]]:
+        """
+        Returns the title and body blocks of an article page, or None if it has no
+        contracts title.
+        """
+        raise NotImplementedError
+
+def has_class(attrs: dict, name: str) -> bool:
+    classes = attrs.get("class") or []
+    if isinstance(classes, str):
+        classes = classes.split()
+    return name in classes
+
+class SoupParser(PageParser):
+    """
+    BeautifulSoup with the builtin html.parser. Article and listing pages are
+    parsed through a SoupStrainer, so only the needed subtrees are built.
+    """
+    listing_strainer = SoupStrainer("feature-template")
+    article_strainer = SoupStrainer(
+        lambda name, attrs: (name == "h1" and has_class(attrs, "maintitle"))
+        or (name == "div" and has_class(attrs, "ntext"))
+    )
+
+    def max_page(self, content: bytes) -> int:
+        soup = BeautifulSoup(content, 'html.parser')
+        return int(soup.find('span', class_='fa-chevron-right').parent.parent.fetchPrevious("div")[0].getText(strip=True))
+
+    def article_urls(self, content: bytes) -> List[str]:
+        soup = BeautifulSoup(content, 'html.parser', parse_only=self.listing_strainer)
+        return [item.get('article-url') for item in list(soup.find('feature-template').children) if item != "\n"]
+
+    def article(self, content: bytes) -> Optional[Tuple[str, List[Block]]]:
+        soup = BeautifulSoup(content, 'html.parser', parse_only=self.article_strainer)
+        title = soup.find("h1", class_="maintitle")
+        if title is None:
+            return None
+        body = list(soup.find("div", class_="ntext").children)[1]
+        blocks = [
+            Block(bool(item.attrs), item.getText(), item.getText(strip=True))
+            for item in body.children
+            if type(item) == Tag
+        ]
+        return title.getText(strip=True), blocks
+
+class LxmlParser(PageParser):
+    """
+    lxml.html backend. libxml2 builds the tree in C, several times faster than
+    html.parser, and the needed nodes are selected with XPath.
+    """
+
+    def __init__(self):
+        try:
+            import lxml.html
+        except ImportError as e:
+            raise ImportError("The lxml HTML parser requires the lxml package (pip install lxml)") from e
+        self.html = lxml.html
+
+    def parse(self, content: bytes):
+        # Decode up front, libxml2 would otherwise guess latin-1 for pages without a charset
+        try:
+            text = content.decode("utf-8")
+        except UnicodeDecodeError:
+            text = content.decode("cp1252", errors="replace")
+        return self.html.document_fromstring(text)
+
+    @staticmethod
+    def stripped_text(element) -> str:
+        return "".join(text.strip() for text in element.itertext())
+
+    def max_page(self, content: bytes) -> int:
+        tree = self.parse(content)
+        span = tree.xpath("//span[contains(concat(' ', normalize-space(@class), ' '), ' fa-chevron-right ')]")[0]
+        # The closest div before the span's grandparent, in document order
+        page = span.getparent().getparent().xpath("(preceding::div | ancestor::div)[last()]")[0]
+        return int(self.stripped_text(page))
+
+    def article_urls(self, content: bytes) -> List[str]:
+        tree = self.parse(content)
+        template = tree.xpath("//feature-template")[0]
+        return [item.get('article-url') for item in template if isinstance(item.tag, str)]
+
+    def article(self, content: bytes) -> Optional[Tuple[str, List[Block]]]:
+        tree = self.parse(content)
+        title = tree.xpath("//h1[contains(concat(' ', normalize-space(@class), ' '), ' maintitle ')]")
+        if not title:
+            return None
+        ntext = tree.xpath("//div[contains(concat(' ', normalize-space(@class), ' '), ' ntext ')]")[0]
+        # Child nodes as BeautifulSoup sees them, with text nodes interleaved
+        children = [ntext.text] if ntext.text else []
+        for child in ntext:
+            children.append(child)
+            if child.tail:
+                children.append(child.tail)
+        body = children[1]
+        blocks = [
+            Block(bool(item.attrib), item.text_content(), self.stripped_text(item))
+            for item in body
+            if isinstance(item.tag, str)
+        ]
+        return self.stripped_text(title[0]), blocks
+
+PARSERS = {
+    "html.parser": SoupParser,
+    "lxml": LxmlParser,
+}
+
+def get_parser(name: str) -> PageParser:
+    """
+    Input: Backend name, one of PARSERS (str)
+    Return: PageParser
+    """
+    if name not in PARSERS:
+        raise ValueError(f"Unknown HTML parser {name!r}, expected one of {sorted(PARSERS)}")
+    return PARSERS[name]()
@@ -0,0 +1,142 @@
+import json
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import asdict
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+from config import Config
+from fileutil import write_atomic
+from model import Contract, Precontract
+from normalize import parse_date, parse_money
+from scraper import DateTimeEncoder, iter_precontracts
+
+def entities_to_contract(entities: Iterable[Tuple[str, str]], precontract: Precontract) -> Contract:
+    """
+    Input: (label, text) of the entities found in a contract, its Precontract
+    Return: Contract with the first entity of each label, amounts and dates normalized
+    The entity labels of the trained pipeline are the Contract field names.
+    Fields without an entity are empty strings, or None for the amount and date.
+    """
+    found = {}
+    for label, text in entities:
+        found.setdefault(label, text)
+    return Contract(
+        contract_id=found.get("contract_id", ""),
+        federal_agency=found.get("federal_agency", ""),
+        military_branch=precontract.military_branch,
+        contract_amount=parse_money(found["contract_amount"]) if "contract_amount" in found else None,
+        contract_date=precontract.contract_date,
+        company_name=found.get("company_name", ""),
+        location=found.get("location", ""),
+        contract_description=found.get("contract_description", ""),
+        estimated_completion_date=parse_date(found["estimated_completion_date"]) if "estimated_completion_date" in found else None,
+        funds_obligated=found.get("funds_obligated", ""),
+        source_url=precontract.source_url,
+        contract_text=precontract.contract_text
+    )
+
+def peak_rss_mb() -> Optional[Tuple[float, float]]:
+    """
+    Peak resident set size of this process and of its finished child processes,
+    in MB, or None where the resource module does not exist (Windows).
+    """
+    if sys.platform == "win32":
+        return None
+    import resource
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux and the BSDs
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale)
+
+class NerInference:
+    """
+    Runs the trained NER pipeline over every Precontract in data/clean and
+    writes one Contract file per input file to data/ner, in the same format as
+    data/annotated. The model is loaded once, texts stream through nlp.pipe,
+    and each file is written as soon as its last contract comes out of the
+    pipeline, so memory does not grow with the corpus.
+    """
+
+    def __init__(self, config: Config = Config(), nlp=None):
+        self.config = config
+        self.data_dir = Path(config.data_dir)
+        self.output_dir = self.data_dir.joinpath(config.ner_dir)
+        self.batch_size = config.spacy_batch_size
+        self.n_process = config.spacy_n_process
+        self.nlp = nlp
+        self.stats = Counter()
+
+    def get_nlp(self):
+        if self.nlp is None:
+            import spacy
+            self.nlp = spacy.load(self.config.ner_model)
+        return self.nlp
+
+    def pending_files(self, force: bool = False) -> List[Path]:
+        """
+        Files in data/clean that have no output yet, or all of them with force.
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        files = sorted(path for path in self.data_dir.joinpath("clean").glob("*.json*") if not path.name.startswith("."))
+        return [path for path in files if force or not self.output_dir.joinpath(path.name).exists()]
+
+    def iter_contracts(self, files: Iterable[Path]) -> Iterator[Tuple[Path, Precontract]]:
+        for path in files:
+            for precontract in iter_precontracts(path):
+                yield path, precontract
+
+    def write(self, path: Path, contracts: List[Contract]):
+        if str(path).endswith(".jsonl"):
+            content = "".join(json.dumps(asdict(contract), cls=DateTimeEncoder) + "\n" for contract in contracts)
+        else:
+            content = json.dumps([asdict(contract) for contract in contracts], cls=DateTimeEncoder, indent=4)
+        write_atomic(self.output_dir.joinpath(path.name), content, label="ner")
+        self.stats["files"] += 1
+
+    def run(self, batch_size: int = None, n_process: int = None, force: bool = False) -> Counter:
+        """
+        Input: Texts per nlp.pipe batch (int), worker processes (int), redo finished files (bool)
+        Return: Counter of "files", "docs" and "entities"
+        Output: data/ner/<file> for every file in data/clean
+        """
+        nlp = self.get_nlp()
+        batch_size = batch_size or self.batch_size
+        n_process = n_process or self.n_process
+        texts = ((precontract.contract_text, (path, precontract)) for path, precontract in self.iter_contracts(self.pending_files(force)))
+
+        # Without RSS figures, the peak Python allocation is reported instead
+        trace = peak_rss_mb() is None and not tracemalloc.is_tracing()
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        current, contracts = None, []
+        for doc, (path, precontract) in nlp.pipe(texts, as_tuples=True, batch_size=batch_size, n_process=n_process):
+            if path != current:
+                if current is not None:
+                    self.write(current, contracts)
+                current, contracts = path, []
+            contracts.append(entities_to_contract(((ent.label_, ent.text) for ent in doc.ents), precontract))
+            self.stats["docs"] += 1
+            self.stats["entities"] += len(doc.ents)
+            if self.stats["docs"] % 10000 == 0:
+                print(f"{self.stats['docs']} docs, {self.stats['docs'] / (time.perf_counter() - start):.1f} docs/sec")
+        if current is not None:
+            self.write(current, contracts)
+
+        elapsed = time.perf_counter() - start
+        peak = peak_rss_mb()
+        if peak is not None:
+            memory = f"peak RSS {peak[0]:.0f} MB (workers {peak[1]:.0f} MB)"
+        else:
+            memory = f"peak traced memory {tracemalloc.get_traced_memory()[1] / 2 ** 20:.0f} MB"
+            if trace:
+                tracemalloc.stop()
+        print(f"{self.stats['docs']} docs in {self.stats['files']} files, {elapsed:.1f}s, "
+              f"{self.stats['docs'] / elapsed if elapsed else 0:.1f} docs/sec, "
+              f"{memory}, n_process={n_process}, batch_size={batch_size}")
+        return self.stats
+
+if __name__ == "__main__":
+    NerInference(Config()).run()
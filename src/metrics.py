@@ -0,0 +1,210 @@
+import cProfile
+import json
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+from config import Config
+
+# Upper bounds in seconds, from a cached page to a slow completion
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+class Histogram:
+    """
+    Cumulative-bucket histogram, as in the Prometheus exposition format.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimated by linear interpolation within the bucket the quantile falls in.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+class Metrics:
+    """
+    Thread-safe counters, gauges and latency histograms, each identified by a
+    name and a set of labels, exported as a Prometheus text file or a JSON
+    snapshot. The crawler threads and the annotation event loop share the
+    module-level REGISTRY.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.last_export = None
+
+    @staticmethod
+    def key(name: str, labels: dict) -> Tuple[str, Labels]:
+        return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels):
+        with self.lock:
+            self.gauges[self.key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """
+        Observes the seconds spent in the block, also when it raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def value(self, name: str, **labels) -> float:
+        """
+        Current value of a counter or gauge, 0 if it was never set.
+        """
+        key = self.key(name, labels)
+        return self.counters.get(key, self.gauges.get(key, 0))
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.last_export = None
+
+    def snapshot(self) -> dict:
+        """
+        Return: {"counters": [...], "gauges": [...], "histograms": [...]} with
+        count, sum and estimated p50/p95/p99 for every histogram
+        """
+        with self.lock:
+            return {
+                "time": time.time(),
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                "gauges": [{"name": name, "labels": dict(labels), "value": value}
+                           for (name, labels), value in sorted(self.gauges.items())],
+                "histograms": [{"name": name, "labels": dict(labels), "count": histogram.count, "sum": histogram.sum,
+                                "p50": histogram.quantile(0.5), "p95": histogram.quantile(0.95),
+                                "p99": histogram.quantile(0.99)}
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+            }
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self.lock:
+            for kind, series in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({name for name, _ in series}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (series_name, labels), value in sorted(series.items()):
+                        if series_name == name:
+                            lines.append(f"{name}{format_labels(labels)} {value:g}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (series_name, labels), histogram in sorted(self.histograms.items()):
+                    if series_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{name}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path):
+        """
+        Writes a JSON snapshot for a .json path, the Prometheus text format otherwise.
+        """
+        # fileutil records its own writes here, so it is imported late
+        from fileutil import write_atomic
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        content = json.dumps(self.snapshot(), indent=4) if path.suffix == ".json" else self.to_prometheus()
+        write_atomic(path, content, label="metrics")
+
+REGISTRY = Metrics()
+
+def export(config: Config = Config(), interval: float = 0.0):
+    """
+    Writes REGISTRY to Config.metrics_file, at most once every `interval`
+    seconds. Does nothing if metrics_file is empty.
+    """
+    if not config.metrics_file:
+        return
+    now = time.monotonic()
+    if interval and REGISTRY.last_export is not None and now - REGISTRY.last_export < interval:
+        return
+    REGISTRY.last_export = now
+    REGISTRY.write(Path(config.data_dir).joinpath(config.metrics_file))
+
+@contextmanager
+def stage(name: str, config: Config = Config()) -> Iterator[None]:
+    """
+    Times a pipeline stage into stage_seconds{stage=name} and exports the
+    metrics when it ends. With the stage in Config.profile_stages, the stage
+    runs under cProfile and the stats are dumped to data/profiles/<name>.prof
+    (cProfile only sees the calling thread, so the time of worker threads
+    shows up as waiting on their results). With Config.trace_memory, the
+    peak traced allocation goes to stage_peak_memory_bytes{stage=name}.
+    """
+    profiler = cProfile.Profile() if name in config.profile_stages else None
+    trace = config.trace_memory and not tracemalloc.is_tracing()
+    if trace:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+    try:
+        with REGISTRY.timer("stage_seconds", stage=name):
+            yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profile_path = Path(config.data_dir).joinpath(config.profile_dir, f"{name}.prof")
+            profile_path.parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(profile_path)
+            print(f"Profile of {name} written to {profile_path}")
+        if trace:
+            REGISTRY.set("stage_peak_memory_bytes", tracemalloc.get_traced_memory()[1], stage=name)
+            tracemalloc.stop()
+        export(config)
@@ -0,0 +1,87 @@
+"""
+Normalization of the money amounts and dates found in contract texts and
+annotations, shared by the scraper and the annotation validator.
+
+parse_money and parse_date handle one value. parse_money_batch and
+parse_date_batch convert whole columns with vectorized pandas string
+operations; each distinct value is parsed once, which matters because
+completion dates and round amounts repeat a lot.
+"""
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, Optional
+
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+# Every prefix of at least three letters, e.g. "sep", "sept" and "september"
+MONTH_NUMBERS = {
+    month[:length].lower(): number
+    for number, month in enumerate(MONTHS, start=1)
+    for length in range(3, len(month) + 1)
+}
+MULTIPLIERS = {"": 1.0, "k": 1e3, "thousand": 1e3, "m": 1e6, "million": 1e6, "b": 1e9, "billion": 1e9, "trillion": 1e12}
+
+# "$26,991,707", "$1.2 million", "$5B", "26991707"
+MONEY_PATTERN = r"^\s*\$?\s*((?:\d[\d,]*)?\.?\d+)\s*(thousand|million|billion|trillion|[kmb])?\s*$"
+# "July 19, 2029", "Sept. 30, 2024", "Dec 1 2025", "December 2025"
+DATE_PATTERN = r"^\s*([A-Za-z]{3,9})\.?,?\s+(?:(\d{1,2})(?:st|nd|rd|th)?,?\s+)?(\d{4})\s*$"
+MONEY = re.compile(MONEY_PATTERN, re.IGNORECASE)
+DATE = re.compile(DATE_PATTERN)
+
+def parse_money(raw_money: str) -> Optional[float]:
+    """
+    Returns the amount in dollars, or None if the string is not a single amount.
+    """
+    match = MONEY.match(raw_money)
+    if match is None:
+        return None
+    return float(match.group(1).replace(",", "")) * MULTIPLIERS[(match.group(2) or "").lower()]
+
+@lru_cache(maxsize=65536)
+def parse_date(raw_date: str) -> Optional[datetime]:
+    """
+    Parses "Month Day, Year" and "Month Year" (as the first of the month), with
+    full or abbreviated month names. Returns None for anything else.
+    """
+    match = DATE.match(raw_date)
+    if match is None:
+        return None
+    month = MONTH_NUMBERS.get(match.group(1).lower())
+    if month is None:
+        return None
+    try:
+        return datetime(int(match.group(3)), month, int(match.group(2) or 1))
+    except ValueError:
+        return None
+
+def parse_money_batch(values: Iterable[str]):
+    """
+    Input: Amounts (Iterable[str])
+    Return: pandas Series of float64, NaN where a value is not an amount
+    """
+    import numpy as np
+    import pandas as pd
+    codes, uniques = pd.factorize(pd.Series(list(values), dtype="object"))
+    parts = pd.Series(uniques, dtype="string").str.extract(MONEY_PATTERN, flags=re.IGNORECASE)
+    number = pd.to_numeric(parts[0].str.replace(",", "", regex=False), errors="coerce").astype("float64")
+    multiplier = parts[1].str.lower().fillna("").map(MULTIPLIERS).astype("float64")
+    parsed = (number * multiplier).to_numpy(dtype="float64", na_value=np.nan)
+    # Missing values have code -1, which takes the NaN appended at the end
+    return pd.Series(np.append(parsed, np.nan).take(codes))
+
+def parse_date_batch(values: Iterable[str]):
+    """
+    Input: Dates (Iterable[str])
+    Return: pandas Series of datetime64, NaT where a value is not a date
+    """
+    import numpy as np
+    import pandas as pd
+    codes, uniques = pd.factorize(pd.Series(list(values), dtype="object"))
+    parts = pd.Series(uniques, dtype="string").str.extract(DATE_PATTERN)
+    parsed = pd.to_datetime({
+        "year": pd.to_numeric(parts[2], errors="coerce").astype("float64"),
+        "month": parts[0].str.lower().map(MONTH_NUMBERS).astype("float64"),
+        "day": pd.to_numeric(parts[1], errors="coerce").astype("float64").fillna(1),
+    }, errors="coerce").to_numpy(dtype="datetime64[ns]")
+    return pd.Series(np.append(parsed, np.datetime64("NaT", "ns")).take(codes))
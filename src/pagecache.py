@@ -0,0 +1,73 @@
+import gzip
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple, Optional
+from fileutil import write_atomic
+
+class CachedPage(NamedTuple):
+    url: str
+    content: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+class CacheMiss(KeyError):
+    """
+    Raised in offline mode when a page was never fetched.
+    """
+
+class PageCache:
+    """
+    Compressed, content-addressed store of every fetched page.
+
+    Page bodies are gzipped and stored under the SHA-256 of their content, so a
+    page served unchanged by several urls or crawls is kept once. A small JSON
+    ref per url, named by the SHA-256 of the url, points at the body and keeps
+    the response's validators.
+
+    Layout:
+    <root>/objects/ab/abcdef....gz
+    <root>/urls/12/1234....json   {"url", "object", "etag", "last_modified", "fetched_at"}
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.objects = self.root.joinpath("objects")
+        self.urls = self.root.joinpath("urls")
+
+    @staticmethod
+    def sharded(directory: Path, digest: str, suffix: str) -> Path:
+        return directory.joinpath(digest[:2], digest + suffix)
+
+    def ref_path(self, url: str) -> Path:
+        return self.sharded(self.urls, hashlib.sha256(url.encode("utf-8")).hexdigest(), ".json")
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """
+        Returns the last cached version of a url, or None.
+        """
+        ref_path = self.ref_path(url)
+        if not ref_path.exists():
+            return None
+        with open(ref_path, 'r', encoding='utf-8') as file:
+            ref = json.load(file)
+        with open(self.sharded(self.objects, ref["object"], ".gz"), 'rb') as file:
+            content = gzip.decompress(file.read())
+        return CachedPage(url, content, ref["etag"], ref["last_modified"])
+
+    def put(self, url: str, content: bytes, etag: str = None, last_modified: str = None):
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = self.sharded(self.objects, digest, ".gz")
+        if not object_path.exists():
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(object_path, gzip.compress(content, compresslevel=6, mtime=0), label="cache")
+        ref_path = self.ref_path(url)
+        ref_path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(ref_path, json.dumps({
+            "url": url,
+            "object": digest,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": datetime.now().isoformat(timespec="seconds")
+        }), label="cache")
@@ -1,19 +1,118 @@
 import json
-import requests
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from bs4 import BeautifulSoup, NavigableString, Tag
 from datetime import datetime
-from typing import List
+from typing import Callable, Iterable, Iterator, List, Tuple
+from requests import Response
 from model import Precontract
 from config import Config
+from crawlstate import CrawlState
+from fetcher import Fetcher
+from fileutil import write_atomic
+from htmlparse import get_parser
+from metrics import REGISTRY, export, stage
+from normalize import parse_date
 from dataclasses import asdict
 
+def ordered_map(pool: ThreadPoolExecutor, fn: Callable, items: Iterable, window: int) -> Iterator:
+    """
+    Like pool.map, but pulls from `items` lazily and keeps at most `window`
+    calls in flight. Results are yielded in input order.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+# Newlines, tabs and carriage returns are deleted from every text field
+CLEAN_TABLE = str.maketrans("", "", "\n\t\r")
+
+def clean_record(item: dict) -> dict:
+    """
+    Cleans the text fields of a precontract dict in place and returns it.
+    """
+    item["military_branch"] = item["military_branch"].translate(CLEAN_TABLE)
+    item["source_url"] = item["source_url"].translate(CLEAN_TABLE)
+    item["contract_text"] = item["contract_text"].translate(CLEAN_TABLE)
+    return item
+
+def clean_file(file_path, new_file_path=None):
+    """
+    Cleans a .json or .jsonl precontract file, see Scraper.clean_file.
+    Defined at module level so it can run in a process pool.
+    """
+    with open(file_path, 'r', encoding='utf-8') as file:
+        content = file.read()
+    if str(file_path).endswith(".jsonl"):
+        items = [clean_record(json.loads(line)) for line in content.splitlines() if line.strip()]
+        cleaned_content = "".join(json.dumps(item) + "\n" for item in items)
+    else:
+        cleaned_content = json.dumps([clean_record(item) for item in json.loads(content)])
+    write_atomic(new_file_path if new_file_path else file_path, cleaned_content, label="clean")
+
+class DateTimeEncoder(json.JSONEncoder):
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+def iter_precontracts(filename: str) -> Iterator[Precontract]:
+    """
+    Input: Path to a .json or .jsonl precontract file (str)
+    Return: Iterator of Precontracts
+    JSON Lines files are streamed one record at a time. A torn final line,
+    left behind by an append that was interrupted, is skipped with a warning.
+    Needs no crawl state or HTTP session, unlike a Scraper.
+    """
+    def to_precontract(item: dict) -> Precontract:
+        return Precontract(
+            military_branch=item['military_branch'],
+            source_url=item['source_url'],
+            contract_text=item['contract_text'],
+            contract_date=datetime.fromisoformat(item['contract_date'])
+        )
+
+    if not str(filename).endswith(".jsonl"):
+        with open(filename, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        for item in data:
+            yield to_precontract(item)
+        return
+
+    with open(filename, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.isspace():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                if line.endswith("\n"):
+                    raise
+                print(f"Skipping incomplete last record in {filename}")
+                return
+            yield to_precontract(item)
+
+def read_precontract(filename: str) -> List[Precontract]:
+    return list(iter_precontracts(filename))
+
 class Scraper:
 
-    base_url = Config.base_url
-    date_format = Config.date_format
-    base_data_filename = Path(Config.data_dir)
+    def __init__(self, config: Config = Config(), fetcher: Fetcher = None):
+        self.config = config
+        self.base_url = config.base_url
+        self.date_format = config.date_format
+        self.base_data_filename = Path(config.data_dir)
+        self.workers = config.workers
+        self.storage_format = config.storage_format
+        self.clean_inline = config.clean_inline
+        self.fetcher = fetcher if fetcher else Fetcher(config)
+        self.parser = get_parser(config.html_parser)
+        self.state = CrawlState(self.base_data_filename.joinpath(config.state_file))
 
     def get_max_pages(self) -> int:
         """
@@ -24,10 +123,8 @@ class Scraper:
         """
         # Set to an arbitrarily large number to ensure we reach the last page
         test_url = f"{self.base_url}?Page=1000000000"
-        response = requests.get(test_url)
-        response.raise_for_status()  # Raises an HTTPError for bad responses
-        soup = BeautifulSoup(response.content, 'html.parser')
-        return int(soup.find('span', class_='fa-chevron-right').parent.parent.fetchPrevious("div")[0].getText(strip=True))
+        response = self.fetcher.get(test_url)
+        return self.parser.max_page(response.content)
 
     def get_date_url(self, page_num: int) -> List[str]:
         """
@@ -35,10 +132,17 @@ class Scraper:
         Return: List of URLs
         This will take in a page number and return the URLs for each date on a specific page
         """
-        response = requests.get(self.base_url+f"?Page={page_num}")
-        response.raise_for_status()  # Raises an HTTPError for bad responses
-        soup = BeautifulSoup(response.content, 'html.parser')
-        return [item.get('article-url') for item in list(soup.find('feature-template').children) if item != "\n"]
+        response = self.fetcher.get(self.base_url+f"?Page={page_num}")
+        return self.parse_date_url(response.content)
+
+    def parse_date_url(self, content: bytes) -> List[str]:
+        """
+        Input: Listing page HTML (bytes)
+        Return: List of URLs
+        Timed into parse_seconds{page="listing"}.
+        """
+        with REGISTRY.timer("parse_seconds", page="listing"):
+            return self.parser.article_urls(content)
         
     def get_date_contract(self, url: str) -> List[Precontract]:
         """
@@ -46,128 +150,212 @@ class Scraper:
         Return: List of Contracts
         This will take in a url for a specific date and return a list of Precontract objects.
         """
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        date_text_find = soup.find("h1", class_="maintitle")
-        if date_text_find is None:
+        _, _, contracts = self.crawl_article(url)
+        return contracts
+
+    def crawl_article(self, url: str, revalidate: bool = False) -> Tuple[str, Response, List[Precontract]]:
+        """
+        Input: A date's url (str), whether to send a conditional request (bool)
+        Return: (url, response, contracts)
+        Fetches and extracts one article. When revalidating an article that is
+        already in the crawl state, the request carries its ETag/Last-Modified
+        validators and a 304 response comes back with contracts set to None.
+        """
+        headers = self.state.conditional_headers(url) if revalidate else None
+        response = self.fetcher.get(url, headers=headers)
+        if response.status_code == 304:
+            return url, response, None
+        return url, response, self.parse_date_contract(response.content, url)
+
+    def parse_date_contract(self, content: bytes, url: str) -> List[Precontract]:
+        """
+        Input: Article page HTML (bytes), the article's url (str)
+        Return: List of Contracts, or None if the page is not a contracts article
+        Timed into parse_seconds{page="article"}.
+        """
+        with REGISTRY.timer("parse_seconds", page="article"):
+            contracts = self.extract_contracts(content, url)
+        if contracts is not None:
+            REGISTRY.inc("contracts_extracted_total", len(contracts))
+        return contracts
+
+    def extract_contracts(self, content: bytes, url: str) -> List[Precontract]:
+        article = self.parser.article(content)
+        if article is None:
             return None
-        date_text = date_text_find.getText(strip=True)[14:].split(" ")
-
-        if date_text[0] == "Jan.":
-            date_text[0] = "January"
-        elif date_text[0] == "Feb.":
-            date_text[0] = "February"
-        elif date_text[0] == "Aug.":
-            date_text[0] = "August"
-        elif date_text[0] == "Sept.":
-            date_text[0] = "September"
-        elif date_text[0] == "Oct.":
-            date_text[0] = "October"
-        elif date_text[0] == "Nov.":
-            date_text[0] = "November"
-        elif date_text[0] == "Dec.":
-            date_text[0] = "December"
-
-        date = datetime.strptime(f"{date_text[0]} {date_text[1]} {date_text[2]}", self.date_format)
-        contract_data = [item for item in list(list(soup.find("div", class_="ntext").children)[1].children) if item != "\n"]
+        title, blocks = article
+        # "Contracts For Sept. 19, 2023"
+        date = parse_date(title[14:])
+        if date is None:
+            raise ValueError(f"Unrecognized date in title {title!r}")
         contracts = []
         curr_branch = ""
-        for contract in contract_data:
-            if type(contract) == NavigableString:
+        for block in blocks:
+            if block.has_attrs and not block.text.isspace() and block.stripped_text != "CONTRACTS":
+                curr_branch = block.text
+                continue
+            if len(block.text) < 100:
                 continue
-            if type(contract) == Tag:
-                if bool(contract.attrs) and not contract.getText().isspace() and contract.getText(strip=True) != "CONTRACTS":
-                    curr_branch = contract.text
-                    continue
-                if len(contract.text) < 100:
-                    continue
-                contracts.append(
-                    Precontract(
-                        military_branch=curr_branch,
-                        source_url=url,
-                        contract_text = contract.text,
-                        contract_date = date
-                    )
+            contracts.append(
+                Precontract(
+                    military_branch=curr_branch,
+                    source_url=url,
+                    contract_text = block.text,
+                    contract_date = date
                 )
+            )
         return contracts
     
+    def iter_precontracts(self, filename: str) -> Iterator[Precontract]:
+        return iter_precontracts(filename)
+
     def read_precontract(self, filename: str) -> List[Precontract]:
-        with open(filename, 'r') as file:
-            data = json.load(file)
-            
-        precontracts = [
-            Precontract(
-                military_branch=item['military_branch'],
-                source_url=item['source_url'],
-                contract_text=item['contract_text'],
-                contract_date=datetime.fromisoformat(item['contract_date'])
-            )
-            for item in data
-        ]
-        return precontracts
+        return read_precontract(filename)
+
+    def write_precontracts(self, contracts: List[Precontract], append: bool = False):
+        """
+        Input: Unprocessed contracts from a single article (List[Precontract]), append flag (bool)
+        Output: None
+        Writes all contracts of an article with one write. By default the day's
+        file is replaced atomically: the data goes to a temporary file that is then
+        renamed over the old one, so a crash never leaves a half-written file.
+        With append, the contracts are added to the existing file instead; for
+        the jsonl format this is a single append without reading the file back.
+        With Config.clean_inline, the records are cleaned on the way and written
+        straight to data/clean, so no separate clean pass or raw copy is needed.
+        File Format: data/raw/2024-04-19_3749216.json (or .jsonl)
+        """
+        if not contracts:
+            return
+        directory = "clean" if self.clean_inline else "raw"
+        filepath = self.base_data_filename.joinpath(directory).joinpath(self.contract_filename(contracts[0]))
+        contract_dicts = [asdict(contract) for contract in contracts]
+        if self.clean_inline:
+            contract_dicts = [clean_record(item) for item in contract_dicts]
+
+        if self.storage_format == "jsonl":
+            content = "".join(json.dumps(item, cls=DateTimeEncoder) + "\n" for item in contract_dicts)
+            if append:
+                with REGISTRY.timer("file_write_seconds", dir=directory), open(filepath, 'a', encoding='utf-8') as file:
+                    file.write(content)
+                return
+        else:
+            if append and filepath.exists():
+                contract_dicts = [asdict(contract) for contract in self.iter_precontracts(filepath)] + contract_dicts
+            content = json.dumps(contract_dicts, cls=DateTimeEncoder, indent=4)
+        write_atomic(filepath, content, label=directory)
 
     def write_precontract(self, contract: Precontract):
         """
         Input: An unprocessed contract (Precontract)
         Output: None
-        This takes a precontract and writes it to json
-        File Format: data/2024-04-19_3749216.json
-        """
-        contract_dict = asdict(contract)
-        class DateTimeEncoder(json.JSONEncoder):
-            def default(self, o):
-                if isinstance(o, datetime):
-                    return o.isoformat()
-                return super().default(o)
-        filepath = self.base_data_filename.joinpath("raw").joinpath(f"{contract.contract_date.strftime('%Y-%m-%d')}_{contract.source_url[56:-1]}.json")
-        # Check if the file already exists
-        if filepath.exists():
-            # Read the existing data
-            with open(filepath, 'r') as file:
-                try:
-                    data = json.load(file)
-                    # Ensure data is in list format
-                    if not isinstance(data, list):
-                        data = [data]
-                except json.JSONDecodeError:
-                    data = []
-        else:
-            data = []
-        
-        # Append the new contract data
-        data.append(contract_dict)
-        
-        # Write the updated data back to the file
-        with open(filepath, 'w') as file:
-            json.dump(data, file, cls=DateTimeEncoder, indent=4)
+        Appends a single precontract to its day's file. Prefer write_precontracts
+        when the whole article is available.
+        """
+        self.write_precontracts([contract], append=True)
 
-    def download_all_contracts(self, start_page: int):
+    def contract_filename(self, contract: Precontract, suffix: str = None) -> str:
         """
-        Input: None
+        File Format: 2024-04-19_3749216.json, where the number is the article id
+        at the end of the source url. The suffix defaults to the storage format.
+        """
+        suffix = suffix if suffix else f".{self.storage_format}"
+        article_id = contract.source_url.rstrip("/").rsplit("/", 1)[-1]
+        return f"{contract.contract_date.strftime('%Y-%m-%d')}_{article_id}{suffix}"
+
+    def download_all_contracts(self, start_page: int = 0, workers: int = None, incremental: bool = False,
+                               revalidate: bool = False, checkpoint_every: int = 50):
+        """
+        Input: First page to crawl (int), number of requests in flight (int),
+        incremental and revalidate flags (bool), articles per state checkpoint (int)
         Output: None
-        This downloads all available contracts.
+        This downloads all available contracts. Listing pages and articles are
+        fetched concurrently over a shared session, but contracts are written
+        in page order, so the output does not depend on the number of workers.
+
+        Every ingested article is recorded in the crawl state. An incremental
+        run skips known articles and stops at the first listing page on which
+        every article is known. With revalidate, known articles are fetched
+        again with conditional requests and only rewritten if they changed.
+        The run is the "crawl" stage of the metrics, exported every
+        Config.metrics_interval seconds.
         """
-        for i in range(start_page, self.get_max_pages()):
-            print(f"Page {i+1}")
-            urls = self.get_date_url(i)
-            for w in urls:
-                contracts = self.get_date_contract(w)
-                if contracts is None:
-                    continue
-                for x in contracts:
-                    self.write_precontract(x)
+        with stage("crawl", self.config):
+            workers = workers if workers else self.workers
+            pages = range(start_page, self.get_max_pages())
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                def date_urls():
+                    # Incremental runs read one listing page at a time so that no
+                    # page past the stopping point is requested
+                    window = 1 if incremental else workers
+                    for i, urls in zip(pages, ordered_map(pool, self.get_date_url, pages, window)):
+                        print(f"Page {i+1}")
+                        REGISTRY.inc("listing_pages_total")
+                        if incremental and all(self.state.is_known(url) for url in urls):
+                            print(f"Page {i+1} has no new articles, stopping")
+                            return
+                        for url in urls:
+                            if incremental and not revalidate and self.state.is_known(url):
+                                continue
+                            yield url
+
+                def crawl(url: str):
+                    return self.crawl_article(url, revalidate)
 
-    def clean_data(self):
+                try:
+                    articles = ordered_map(pool, crawl, date_urls(), workers)
+                    for count, (url, response, contracts) in enumerate(articles, start=1):
+                        if response.status_code == 304:
+                            REGISTRY.inc("articles_total", result="not_modified")
+                            continue
+                        self.write_precontracts(contracts)
+                        REGISTRY.inc("articles_total", result="written" if contracts else "not_contracts")
+                        self.state.record(url, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                        if count % checkpoint_every == 0:
+                            self.state.save()
+                        export(self.config, self.config.metrics_interval)
+                finally:
+                    self.state.save()
+
+    def clean_data(self, workers: int = None, force: bool = False):
         """
-        Cleans all data of escape sequences.
+        Input: Number of worker processes, defaults to the CPU count (int), force flag (bool)
+        Output: None
+        Cleans all data of escape sequences, spreading the files over a process pool.
+        Raw files whose size and modification time are unchanged since the last
+        run are skipped unless force is set. The fingerprints are kept in
+        data/clean/.manifest (JSON).
         """
-        files = os.listdir("data/raw")
-        for file in files:
-            if file.startswith("."):
+        raw_dir = self.base_data_filename.joinpath("raw")
+        clean_dir = self.base_data_filename.joinpath("clean")
+        manifest_path = clean_dir.joinpath(".manifest")
+        manifest = {}
+        if manifest_path.exists() and not force:
+            with open(manifest_path, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+
+        pending = []
+        fingerprints = {}
+        for file in sorted(os.listdir(raw_dir)):
+            if file.startswith(".") or file.endswith(".tmp"):
                 continue
-            self.clean_file(f"data/raw/{file}", f"data/clean/{file}")
-    
+            stat = raw_dir.joinpath(file).stat()
+            fingerprints[file] = [stat.st_mtime_ns, stat.st_size]
+            if manifest.get(file) == fingerprints[file] and clean_dir.joinpath(file).exists():
+                continue
+            pending.append(file)
+
+        print(f"Cleaning {len(pending)} of {len(fingerprints)} files")
+        REGISTRY.inc("clean_files_total", len(pending), result="cleaned")
+        REGISTRY.inc("clean_files_total", len(fingerprints) - len(pending), result="unchanged")
+        with stage("clean", self.config):
+            if pending:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    sources = [raw_dir.joinpath(file) for file in pending]
+                    targets = [clean_dir.joinpath(file) for file in pending]
+                    list(pool.map(clean_file, sources, targets, chunksize=64))
+            write_atomic(manifest_path, json.dumps(fingerprints), label="clean")
+
     def clean_file(self, file_path, new_file_path=None):
         """
         Reads a file, cleans its content, and writes the cleaned data back.
@@ -178,18 +366,4 @@ class Scraper:
         new_file_path (str, optional): The path to save the cleaned data to. If not specified, 
         it will overwrite the original file.
         """
-        def clean_text(text):
-            # Replace newlines and tabs with a single space
-            text = json.loads(text)
-            for i in range(len(text)):
-                text[i]["military_branch"] = text[i]["military_branch"].replace('\n', '').replace('\t', '').replace('\r', '')
-                text[i]["source_url"] = text[i]["source_url"].replace('\n', '').replace('\t', '').replace('\r', '')
-                text[i]["contract_text"] = text[i]["contract_text"].replace('\n', '').replace('\t', '').replace('\r', '')
-            return json.dumps(text)
-        
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-        cleaned_content = clean_text(content)
-        output_file_path = new_file_path if new_file_path else file_path
-        with open(output_file_path, 'w', encoding='utf-8') as file:
-            file.write(cleaned_content)
\ No newline at end of file
+        clean_file(file_path, new_file_path)
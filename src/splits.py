@@ -0,0 +1,33 @@
+import hashlib
+
+def record_key(record: dict) -> str:
+    """
+    Stable identity of a training record: its contract ID if it has one (as a
+    field, or as an annotated contract_id entity), otherwise its text with the
+    whitespace collapsed.
+    """
+    if record.get("contract_id"):
+        return record["contract_id"]
+    for entity in record.get("entities", ()):
+        if entity.get("type") == "contract_id" and entity.get("value"):
+            return entity["value"]
+    return " ".join(record.get("text", record.get("contract_text", "")).split())
+
+def hash_fraction(key: str, seed: str = "") -> float:
+    """
+    Maps a key to [0, 1), the same way on every machine and in every run.
+    """
+    digest = hashlib.sha1(f"{seed}:{key}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+def assign_split(key: str, test_size: float, seed: str = "", dev_size: float = 0.0) -> str:
+    """
+    Returns "test" for about `test_size` of all keys, "dev" for about
+    `dev_size` and "train" for the rest. A key always lands in the same split,
+    however the data grows or is ordered, and the test keys do not depend on
+    `dev_size`, so adding a dev split keeps the test set as it was.
+    """
+    fraction = hash_fraction(key, seed)
+    if fraction < test_size:
+        return "test"
+    return "dev" if fraction < test_size + dev_size else "train"
@@ -1,7 +1,8 @@
 import spacy
 
-nlp = spacy.load('en_core_web_lg')
-ner = nlp.get_pipe('ner')
+if __name__ == "__main__":
+    nlp = spacy.load('en_core_web_lg')
+    ner = nlp.get_pipe('ner')
 
-doc=nlp("Nithin Joseph is the president of the USA.")
-print(doc.ents)
\ No newline at end of file
+    doc=nlp("Nithin Joseph is the president of the USA.")
+    print(doc.ents)
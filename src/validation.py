@@ -0,0 +1,159 @@
+import json
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import zip_longest
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+from config import Config
+from metrics import REGISTRY
+from model import Contract
+from normalize import parse_date, parse_date_batch, parse_money_batch
+from scraper import iter_precontracts
+
+VALID_FIELDS = {
+    "contract_id",
+    "federal_agency",
+    "contract_amount",
+    "company_name",
+    "location",
+    "contract_description",
+    "estimated_completion_date",
+    "funds_obligated"
+}
+
+BANNED_WORDS = [
+    "To be determined",
+    "Not specified",
+    "Not provided",
+    "n/a",
+    "Not applicable",
+    "N/a",
+    "n/A",
+    "N/A",
+    "No completion date"
+]
+
+# One scan per field instead of one substring search per banned word
+BANNED = re.compile("|".join(re.escape(word) for word in BANNED_WORDS))
+
+def is_banned(value: str) -> bool:
+    """
+    True if the value is empty or contains a placeholder such as "N/A".
+    """
+    return value == "" or BANNED.search(value) is not None
+
+def check_annotation(raw_data: str, check_date: bool = True) -> Tuple[Optional[dict], str]:
+    """
+    Input: A raw annotation line (str), whether to parse the completion date (bool)
+    Return: (parsed annotation, "ok"), or (None, rejection reason)
+    Checks that the line parses, that exactly the expected fields are present,
+    and that every field is a string with relevant data. Callers that parse
+    the dates of a whole file at once pass check_date=False.
+    """
+    if not raw_data:
+        # Failed requests and skipped near-duplicates leave an empty line
+        return None, "not_annotated"
+    try:
+        json_data = json.loads(raw_data)
+    except ValueError:
+        return None, "invalid_json"
+    if not isinstance(json_data, dict) or VALID_FIELDS != json_data.keys():
+        return None, "fields"
+    for name in VALID_FIELDS:
+        if type(json_data[name]) != str:
+            return None, name
+    if len(json_data["contract_id"]) < 13:
+        return None, "contract_id"
+    for name in ("federal_agency", "contract_amount", "company_name", "location",
+                 "contract_description", "estimated_completion_date", "funds_obligated"):
+        if is_banned(json_data[name]):
+            return None, name
+    if not '$' in json_data["contract_amount"]:
+        return None, "contract_amount"
+    if check_date and parse_date(json_data["estimated_completion_date"]) is None:
+        return None, "estimated_completion_date"
+    return json_data, "ok"
+
+def validate_file(filename: str, data_dir: str = Config.data_dir) -> Tuple[List[Contract], Counter]:
+    """
+    Input: Name of a file in data/clean (str), data directory (str)
+    Return: (valid contracts, histogram of outcomes)
+    Walks the precontracts in data/clean and their annotation lines in
+    data/blackbox side by side, in a single pass over both files.
+    """
+    import pandas as pd
+    data_dir = Path(data_dir)
+    candidates = []
+    outcomes = Counter()
+    with open(data_dir.joinpath("blackbox", filename), 'r', encoding="utf-8", errors="ignore") as blackbox:
+        precontracts = iter_precontracts(data_dir.joinpath("clean", filename))
+        for contract, annotated_raw in zip_longest(precontracts, blackbox):
+            if contract is None:
+                outcomes["extra_annotation"] += 1
+                break
+            if annotated_raw is None:
+                outcomes["missing_annotation"] += 1
+                continue
+            json_data, outcome = check_annotation(annotated_raw.strip(), check_date=False)
+            if json_data is None:
+                outcomes[outcome] += 1
+                continue
+            candidates.append((contract, json_data))
+
+    # Amounts and dates of the whole file are normalized in one call each
+    amounts = parse_money_batch(json_data["contract_amount"] for _, json_data in candidates)
+    dates = parse_date_batch(json_data["estimated_completion_date"] for _, json_data in candidates)
+    contracts = []
+    for (contract, json_data), amount, date in zip(candidates, amounts, dates):
+        if date is pd.NaT:
+            outcomes["estimated_completion_date"] += 1
+            continue
+        outcomes["ok"] += 1
+        contracts.append(
+            Contract(
+                contract_id = json_data["contract_id"],
+                federal_agency = json_data["federal_agency"],
+                military_branch = contract.military_branch,
+                contract_amount = None if pd.isna(amount) else float(amount),
+                contract_date = contract.contract_date,
+                company_name = json_data["company_name"],
+                location = json_data["location"],
+                contract_description = json_data["contract_description"],
+                estimated_completion_date = date.to_pydatetime(),
+                funds_obligated = json_data["funds_obligated"],
+                source_url = contract.source_url,
+                contract_text = contract.contract_text
+            )
+        )
+    return contracts, outcomes
+
+def record_outcomes(outcomes: Counter):
+    """
+    Adds a histogram of outcomes to validation_outcomes_total{outcome}. The
+    workers of validate_files cannot update the registry, so the outcomes
+    are recorded by whoever receives them.
+    """
+    for outcome, count in outcomes.items():
+        REGISTRY.inc("validation_outcomes_total", count, outcome=outcome)
+
+def validate_files(filenames: Iterable[str], data_dir: str = Config.data_dir,
+                   workers: int = None) -> Iterator[Tuple[str, List[Contract], Counter]]:
+    """
+    Validates many files across a process pool. Yields (filename, contracts,
+    histogram) in input order.
+    """
+    filenames = list(filenames)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(validate_file, filenames, [data_dir] * len(filenames), chunksize=16)
+        for filename, (contracts, outcomes) in zip(filenames, results):
+            record_outcomes(outcomes)
+            yield filename, contracts, outcomes
+
+def format_histogram(outcomes: Counter) -> str:
+    total = sum(outcomes.values())
+    lines = [f"{total} annotations, {outcomes['ok']} valid"]
+    for outcome, count in outcomes.most_common():
+        if outcome != "ok":
+            lines.append(f"  {outcome:28} {count:8} ({100 * count / total:.1f}%)")
+    return "\n".join(lines)
@@ -0,0 +1,45 @@
+import sys
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath("src")))
+
+from fakes import start_defense_gov, start_fake_openai, stop
+
+@pytest.fixture
+def defense_gov():
+    """
+    A local stand-in for defense.gov serving the recorded pages in fixtures/defense_gov.
+    """
+    server = start_defense_gov()
+    yield server
+    stop(server)
+
+@pytest.fixture
+def fake_openai():
+    """
+    A local fake chat completions endpoint.
+    """
+    server = start_fake_openai()
+    yield server
+    stop(server)
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """
+    An empty copy of the data/ layout.
+    """
+    for name in ("raw", "clean", "annotated", "blackbox", "manual", "spacy"):
+        tmp_path.joinpath(name).mkdir()
+    return tmp_path
+
+@pytest.fixture
+def no_scraper(monkeypatch):
+    """
+    Fails the test if a Scraper is built, for code that only reads data/clean.
+    """
+    import scraper
+
+    def fail(*args, **kwargs):
+        raise AssertionError("built a Scraper to read local files")
+    monkeypatch.setattr(scraper.Scraper, "__init__", fail)
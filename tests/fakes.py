@@ -0,0 +1,158 @@
+"""
+Local stand-ins for the external services the pipeline talks to, shared by
+the tests and the benchmarks.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES = Path(__file__).parent.joinpath("fixtures")
+
+class DefenseGovHandler(BaseHTTPRequestHandler):
+    """
+    Serves the recorded defense.gov pages in fixtures/defense_gov.
+    Listing pages live at /News/Contracts/?Page=N and articles at
+    /News/Contracts/Contract/Article/<id>/. Pages carry an ETag and answer
+    matching conditional requests with 304.
+    """
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.path)
+        server.headers.append(dict(self.headers))
+        if server.failures:
+            server.failures -= 1
+            self.send_error(503)
+            return
+        url = urlsplit(self.path)
+        if url.path == "/News/Contracts/":
+            page = parse_qs(url.query).get("Page", ["1"])[0]
+            name = "listing_last.html" if page == "1000000000" else f"listing_{page}.html"
+        else:
+            name = f"article_{url.path.rstrip('/').rsplit('/', 1)[-1]}.html"
+        path = FIXTURES.joinpath("defense_gov", name)
+        if not path.exists():
+            self.send_error(404)
+            return
+        body = path.read_text(encoding="utf-8").replace("{host}", server.host).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", "Fri, 19 Apr 2024 20:00:00 GMT")
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class Server(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections when many requests
+    # start at once, and the client retries them a second later
+    request_queue_size = 128
+
+def serve(server: ThreadingHTTPServer) -> ThreadingHTTPServer:
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    return server
+
+def stop(server: ThreadingHTTPServer):
+    server.shutdown()
+    server.server_close()
+
+def start_defense_gov() -> ThreadingHTTPServer:
+    """
+    A local stand-in for defense.gov. Its `base_url` attribute replaces Config.base_url.
+    """
+    server = Server(("127.0.0.1", 0), DefenseGovHandler)
+    server.host = f"http://127.0.0.1:{server.server_port}"
+    server.base_url = f"{server.host}/News/Contracts/"
+    server.requests = []
+    server.headers = []
+    server.failures = 0
+    return serve(server)
+
+class CompletionsHandler(BaseHTTPRequestHandler):
+    """
+    A fake chat completions endpoint. The reply echoes the user message back as
+    {"text": ...} after a random delay, so responses finish out of order.
+    Batched requests, {"contracts": [{"id", "text"}]}, get a
+    {"results": [{"id", "output"}]} reply. Status codes queued in
+    server.statuses are returned first.
+    """
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.bodies.append(body)
+            status = server.statuses.pop(0) if server.statuses else 200
+        completion_tokens = 0
+        if status != 200:
+            reply = {"error": {"message": f"status {status}", "type": "test", "code": None}}
+        else:
+            user = body["messages"][-1]["content"]
+            content = server.respond(user) if server.respond else self.echo(user)
+            prompt_tokens = sum(len(message["content"]) for message in body["messages"]) // 4
+            completion_tokens = len(content) // 4
+            reply = {
+                "id": "chatcmpl-test",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            }
+        if status == 200:
+            time.sleep(server.latency + completion_tokens * server.latency_per_token)
+        time.sleep(random.uniform(0, server.max_delay))
+        data = json.dumps(reply).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    @staticmethod
+    def echo(user: str) -> str:
+        try:
+            batch = json.loads(user)
+        except json.JSONDecodeError:
+            batch = None
+        if isinstance(batch, dict) and "contracts" in batch:
+            return json.dumps({"results": [
+                {"id": item["id"], "output": {"text": item["text"]}} for item in batch["contracts"]
+            ]})
+        return json.dumps({"text": user.strip('"')})
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fake_openai(latency: float = 0.0, latency_per_token: float = 0.0, max_delay: float = 0.02) -> ThreadingHTTPServer:
+    """
+    A fake chat completions server; `base_url` is the OpenAI base url to use.
+    Each reply takes latency + latency_per_token * completion tokens seconds,
+    plus a random delay of up to max_delay.
+    """
+    server = Server(("127.0.0.1", 0), CompletionsHandler)
+    server.base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    server.lock = threading.Lock()
+    server.bodies = []
+    server.statuses = []
+    server.latency = latency
+    server.latency_per_token = latency_per_token
+    server.max_delay = max_delay
+    server.respond = None
+    return serve(server)
@@ -0,0 +1,62 @@
+from datetime import datetime
+from config import Config
+from annotation_cache import AnnotationCache, open_annotation_cache
+from annotation_engine import AnnotationEngine
+from model import Precontract
+
+def make_params(text: str, prompt: str = "You are a parser.", model: str = "gpt-3.5-turbo-0125", **options) -> dict:
+    params = dict(model=model, max_tokens=1024, temperature=0.5, messages=[
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": f"\"{text}\""},
+    ])
+    params.update(options)
+    return params
+
+def test_hit_and_miss(tmp_path):
+    cache = AnnotationCache(tmp_path.joinpath("cache.sqlite"))
+    assert cache.get(make_params("HRL Laboratories LLC")) is None
+    cache.put(make_params("HRL Laboratories LLC"), '{"company_name": "HRL Laboratories LLC"}')
+    assert cache.get(make_params("HRL  Laboratories\nLLC")) == '{"company_name": "HRL Laboratories LLC"}'
+    assert cache.get(make_params("HRL Laboratories LLC", prompt="Another prompt")) is None
+    assert cache.get(make_params("HRL Laboratories LLC", model="gpt-4o")) is None
+    assert cache.get(make_params("HRL Laboratories LLC", temperature=0)) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 4, 1)
+
+def test_persists_across_instances(tmp_path):
+    AnnotationCache(tmp_path.joinpath("cache.sqlite")).put(make_params("a"), "{}")
+    assert AnnotationCache(tmp_path.joinpath("cache.sqlite")).get(make_params("a")) == "{}"
+
+def test_purge_stale(tmp_path):
+    cache = AnnotationCache(tmp_path.joinpath("cache.sqlite"))
+    cache.put(make_params("a", prompt="old prompt"), "{}")
+    cache.put(make_params("b", prompt="new prompt"), "{}")
+    cache.put(make_params("c", prompt="new prompt", model="gpt-4o"), "{}")
+    assert cache.purge_stale("new prompt", "gpt-3.5-turbo-0125") == 2
+    assert cache.get(make_params("b", prompt="new prompt")) == "{}"
+    assert cache.stats()["entries"] == 1
+
+def test_rule_mode_entries_survive_reopen(tmp_path):
+    config = Config(data_dir=str(tmp_path), rule_extraction=True, purge_stale_annotations=True)
+    engine = AnnotationEngine(config)
+    contract = Precontract(military_branch="AIR FORCE", source_url="https://www.defense.gov/",
+                           contract_text="HRL Laboratories LLC, Malibu, California, was awarded a contract.",
+                           contract_date=datetime(2024, 4, 19))
+    cache = open_annotation_cache(config)
+    cache.put(engine.request_params(contract, ("federal_agency", "contract_description")), "{}")
+    cache.put(engine.request_params(contract), "{}")
+    cache.put(make_params("a", prompt="old prompt"), "{}")
+    cache.close()
+    cache = open_annotation_cache(config)
+    assert cache.get(engine.request_params(contract, ("federal_agency", "contract_description"))) == "{}"
+    assert cache.get(engine.request_params(contract)) == "{}"
+    assert cache.stats()["entries"] == 2
+
+def test_lru_eviction(tmp_path):
+    cache = AnnotationCache(tmp_path.joinpath("cache.sqlite"), max_entries=2)
+    for text in ("a", "b", "c"):
+        cache.put(make_params(text), text)
+    cache.get(make_params("a"))
+    assert cache.evict() == 1
+    assert cache.get(make_params("b")) is None
+    assert cache.get(make_params("a")) == "a"
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import time
+from datetime import datetime
+import pytest
+from config import Config
+from annotation_cache import AnnotationCache
+from annotation_engine import AnnotationEngine, TokenBucket
+from model import Precontract
+
+openai = pytest.importorskip("openai")
+
+def make_contracts(n: int):
+    return [
+        Precontract(
+            military_branch="NAVY",
+            source_url="https://www.defense.gov/News/Contracts/Contract/Article/3749216/",
+            contract_text=f"Contract number {i} was awarded.",
+            contract_date=datetime(2024, 4, 19)
+        )
+        for i in range(n)
+    ]
+
+def make_engine(fake_openai, cache: AnnotationCache = None, **kwargs) -> AnnotationEngine:
+    config = Config(backoff_factor=0.01, **kwargs)
+    client = openai.AsyncOpenAI(base_url=fake_openai.base_url, api_key="test", max_retries=0)
+    return AnnotationEngine(config, client=client, cache=cache)
+
+def test_results_keep_input_order(fake_openai):
+    contracts = make_contracts(40)
+    engine = make_engine(fake_openai, max_concurrent_requests=8)
+    results = engine.run(contracts)
+    assert [json.loads(result)["text"] for result in results] == [c.contract_text for c in contracts]
+    assert engine.stats["requests"] == 40
+    assert engine.stats["prompt_tokens"] > 0
+
+def test_retries_rate_limits_and_server_errors(fake_openai):
+    fake_openai.statuses = [429, 500, 503]
+    engine = make_engine(fake_openai, max_concurrent_requests=1, max_retries=3)
+    results = engine.run(make_contracts(2))
+    assert all(result is not None for result in results)
+    assert engine.stats["retries"] == 3
+    assert len(fake_openai.bodies) == 5
+
+def test_gives_up_on_client_errors(fake_openai):
+    fake_openai.statuses = [400]
+    engine = make_engine(fake_openai, max_concurrent_requests=1)
+    results = engine.run(make_contracts(2))
+    assert results[0] is None and results[1] is not None
+    assert engine.stats["failed"] == 1 and engine.stats["retries"] == 0
+
+def test_run_files_writes_each_file_in_order(fake_openai):
+    files = [(f"2024-04-{day:02d}_1.json", make_contracts(day)) for day in range(1, 8)]
+    written = {}
+    engine = make_engine(fake_openai, max_concurrent_requests=4)
+    engine.run_files(iter(files), lambda name, annotations: written.update({name: annotations}))
+    assert sorted(written) == [name for name, _ in files]
+    for name, contracts in files:
+        assert [json.loads(result)["text"] for result in written[name]] == [c.contract_text for c in contracts]
+
+def test_token_bucket_waits_for_refill():
+    async def main():
+        bucket = TokenBucket(per_minute=600)  # 10 per second
+        await bucket.acquire(600)
+        start = time.monotonic()
+        await bucket.acquire(2)
+        return time.monotonic() - start
+    assert asyncio.run(main()) >= 0.15
+
+def test_cached_requests_skip_the_api(fake_openai, tmp_path):
+    cache = AnnotationCache(tmp_path.joinpath("cache.sqlite"))
+    contracts = make_contracts(5)
+    first = make_engine(fake_openai, cache=cache).run(contracts)
+    engine = make_engine(fake_openai, cache=cache)
+    assert engine.run(contracts) == first
+    assert engine.stats["cached"] == 5 and engine.stats["requests"] == 0
+    assert len(fake_openai.bodies) == 5
+
+def test_batched_matches_single_requests(fake_openai):
+    contracts = make_contracts(11)
+    single = make_engine(fake_openai).run(contracts)
+    engine = make_engine(fake_openai, annotation_batch_size=4)
+    assert engine.run(contracts) == single
+    assert engine.stats["requests"] == 3
+
+def test_batched_requeues_malformed_items(fake_openai):
+    def respond(user: str) -> str:
+        if not user.startswith("{"):
+            return json.dumps({"text": user.strip('"')})
+        items = json.loads(user)["contracts"]
+        # Drop the first item and garble the second
+        results = [{"id": items[1]["id"], "output": "not an object"}]
+        results += [{"id": item["id"], "output": {"text": item["text"]}} for item in items[2:]]
+        return json.dumps({"results": results})
+    fake_openai.respond = respond
+    contracts = make_contracts(5)
+    engine = make_engine(fake_openai, annotation_batch_size=5)
+    results = engine.run(contracts)
+    assert [json.loads(result)["text"] for result in results] == [c.contract_text for c in contracts]
+    assert engine.stats["requeued"] == 2 and engine.stats["requests"] == 3
+
+def test_split_batch():
+    content = json.dumps({"results": [{"id": "1", "output": {"a": 1}}, {"id": "1", "output": {"a": 2}}, {"id": "7", "output": {}}]})
+    assert AnnotationEngine.split_batch(content, 2) == [None, '{"a": 1}']
+    assert AnnotationEngine.split_batch("not json", 2) == [None, None]
+    assert AnnotationEngine.split_batch(None, 1) == [None]
+
+def test_rule_extraction_asks_only_for_missing_fields(fake_openai):
+    complete = ("HRL Laboratories LLC, Malibu, California, was awarded a $26,991,707 cost-reimbursement contract for "
+                "radar research. Work will be performed in Malibu, California, and is expected to be completed by "
+                "July 19, 2029. Fiscal 2024 funds in the amount of $26,991,707 are being obligated at time of award. "
+                "The Air Force Research Laboratory, Kirtland Air Force Base, New Mexico, is the contracting activity "
+                "(FA9453-24-C-X011).")
+    partial = complete.replace(" Work will be performed in Malibu, California, and is expected to be completed by July 19, 2029.", "")
+    contracts = make_contracts(3)
+    contracts[0].contract_text, contracts[1].contract_text = complete, partial
+
+    def respond(user: str) -> str:
+        return json.dumps({"estimated_completion_date": "July 19, 2029", "company_name": "ignored"})
+    fake_openai.respond = respond
+    engine = make_engine(fake_openai, rule_extraction=True)
+    results = engine.run(contracts)
+
+    assert engine.stats["rules_only"] == 1 and engine.stats["requests"] == 2
+    assert json.loads(results[0])["contract_id"] == "FA9453-24-C-X011"
+    merged = json.loads(results[1])
+    assert merged["estimated_completion_date"] == "July 19, 2029"
+    assert merged["company_name"] == "HRL Laboratories LLC"
+    assert len(merged) == 8
+    # Only the open fields are asked for
+    prompts = [body["messages"][0]["content"] for body in fake_openai.bodies]
+    assert any("estimated_completion_date" in prompt and "company_name" not in prompt for prompt in prompts)
+    assert engine.coverage["contracts"] == 3 and engine.coverage["complete"] == 1
@@ -0,0 +1,44 @@
+import sys
+import tracemalloc
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath("benchmarks")))
+
+from bench_suite import compare, measure, run_suite
+
+def test_stages_run_offline():
+    results = run_suite(["validate", "align"], scale=1, repeat=1)
+    for result in results.values():
+        assert result["items"] == 20 and result["items_per_sec"] > 0
+        assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+
+def test_stage_setup_errors_skip_the_stage(tmp_path):
+    def missing_model(workdir, scale):
+        raise OSError("[E050] Can't find model 'en_core_web_lg'")
+    assert measure(missing_model, tmp_path, 1, 1) == {"skipped": "[E050] Can't find model 'en_core_web_lg'"}
+
+def test_failing_run_stops_tracemalloc(tmp_path):
+    def failing(workdir, scale):
+        def run():
+            raise RuntimeError("boom")
+        return run, None
+    with pytest.raises(RuntimeError):
+        measure(failing, tmp_path, 1, 1)
+    assert not tracemalloc.is_tracing()
+
+def test_compare_flags_regressions():
+    baseline = {
+        "parse": {"items_per_sec": 100.0, "p95_ms": 10.0, "peak_mb": 1.0},
+        "clean": {"items_per_sec": 100.0, "p95_ms": 10.0, "peak_mb": 1.0},
+        "convert": {"skipped": "spaCy is not installed"},
+    }
+    results = {
+        "parse": {"items_per_sec": 70.0, "p95_ms": 13.0, "peak_mb": 1.1},
+        "clean": {"items_per_sec": 90.0, "p95_ms": 11.0, "peak_mb": 1.1},
+        "convert": {"items_per_sec": 1.0, "p95_ms": 1.0, "peak_mb": 1.0},
+        "align": {"items_per_sec": 1.0, "p95_ms": 1.0, "peak_mb": 1.0},
+    }
+    regressions = compare(results, baseline, tolerance=0.2)
+    assert list(regressions) == ["parse"]
+    assert regressions["parse"] == ["items/sec 100.0 -> 70.0", "p95 ms 10.00 -> 13.00"]
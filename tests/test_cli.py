@@ -0,0 +1,65 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from cli import build_parser, main
+
+SRC = Path(__file__).parent.parent.joinpath("src")
+
+def imported_after(code: str) -> set:
+    """
+    Modules loaded by a fresh interpreter that runs `code` from src.
+    """
+    output = subprocess.run([sys.executable, "-c", f"{code}\nimport sys, json; print(json.dumps(sorted(sys.modules)))"],
+                            cwd=SRC, check=True, capture_output=True, text=True).stdout
+    return set(json.loads(output.splitlines()[-1]))
+
+@pytest.mark.parametrize("module", ["annotator", "SpacyProcessor", "ManualData", "infer", "cli"])
+def test_modules_import_without_side_effects(module):
+    modules = imported_after(f"import {module}")
+    assert not {"openai", "spacy", "sentence_transformers", "torch"} & modules
+
+def test_help_loads_no_pipeline_module():
+    result = subprocess.run([sys.executable, "cli.py", "--help"], cwd=SRC, check=True, capture_output=True, text=True)
+    for command in ("crawl", "clean", "annotate", "validate", "convert", "infer"):
+        assert command in result.stdout
+    assert not {"scraper", "annotator", "pandas", "requests"} & imported_after("import cli; cli.build_parser()")
+
+def test_parser_options():
+    args = build_parser().parse_args(["crawl", "--incremental", "--workers", "4"])
+    assert args.incremental and args.workers == 4 and args.start_page == 0
+    args = build_parser().parse_args(["convert", "--dev-size", "0.1"])
+    assert args.dev_size == 0.1 and args.test_size == 0.3
+    args = build_parser().parse_args(["infer", "--model", "training/model-last", "--force"])
+    assert args.model == "training/model-last" and args.force
+    with pytest.raises(SystemExit):
+        build_parser().parse_args([])
+
+def test_validate_command(data_dir, monkeypatch):
+    # The Annotator works on data/ relative to the working directory
+    data = data_dir.joinpath("data")
+    for name in ("clean", "blackbox", "annotated"):
+        data.joinpath(name).mkdir(parents=True)
+    with open(data.joinpath("clean", "2024-04-19_3749216.json"), 'w') as file:
+        json.dump([{
+            "military_branch": "AIR FORCE",
+            "source_url": "https://www.defense.gov/News/Contracts/Contract/Article/3749216/",
+            "contract_text": "HRL Laboratories LLC, Malibu, California, was awarded a $26,991,707 contract.",
+            "contract_date": "2024-04-19T00:00:00"
+        }], file)
+    with open(data.joinpath("blackbox", "2024-04-19_3749216.json"), 'w') as file:
+        file.write(json.dumps({
+            "contract_id": "FA9453-24-C-X011",
+            "federal_agency": "Air Force Research Laboratory",
+            "contract_amount": "$26,991,707",
+            "company_name": "HRL Laboratories LLC",
+            "location": "Malibu, California",
+            "contract_description": "CASTLE program",
+            "estimated_completion_date": "July 19, 2029",
+            "funds_obligated": "$1,000,000"
+        }) + "\n")
+    monkeypatch.chdir(data_dir)
+    main(["validate"])
+    with open(data.joinpath("annotated", "2024-04-19_3749216.json")) as file:
+        assert [contract["contract_amount"] for contract in json.load(file)] == [26991707.0]
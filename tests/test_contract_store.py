@@ -0,0 +1,68 @@
+from datetime import date, datetime
+from dataclasses import replace
+import pytest
+from config import Config
+from contract_store import ContractStore, open_contract_store
+from model import Contract
+
+def contract(i: int, **fields) -> Contract:
+    return replace(Contract(
+        contract_id=f"FA9453-24-C-{i:04}",
+        federal_agency="Air Force Research Laboratory",
+        military_branch="AIR FORCE",
+        contract_amount=1e6 * i,
+        contract_date=datetime(2024, 1, 1 + i % 28),
+        company_name=f"Company {i}",
+        location="Malibu, California",
+        contract_description="research",
+        estimated_completion_date=datetime(2029, 7, 19),
+        funds_obligated="$1,000,000",
+        source_url=f"https://www.defense.gov/News/Contracts/Contract/Article/{3749000 + i}/",
+        contract_text=f"Company {i}, Malibu, California, was awarded a contract for radar research."
+    ), **fields)
+
+@pytest.fixture
+def store(data_dir):
+    store = open_contract_store(Config(data_dir=str(data_dir)))
+    store.upsert([contract(i) for i in range(1, 51)], batch_size=16)
+    store.upsert([
+        contract(100, company_name="HRL Laboratories LLC", military_branch="NAVY",
+                 contract_text="HRL Laboratories LLC was awarded a contract for hypersonic missile seekers."),
+    ])
+    yield store
+    store.close()
+
+def test_lookups(store):
+    assert len(store) == 51
+    assert [c.contract_id for c in store.find(contract_id="FA9453-24-C-0007")] == ["FA9453-24-C-0007"]
+    assert [c.company_name for c in store.find(company="hrl laboratories llc")] == ["HRL Laboratories LLC"]
+    assert len(store.find(agency="AIR FORCE RESEARCH LABORATORY", limit=1000)) == 51
+    assert {c.contract_id for c in store.find(min_amount=10e6, max_amount=12e6)} == \
+        {"FA9453-24-C-0010", "FA9453-24-C-0011", "FA9453-24-C-0012"}
+    found = store.find(start_date=date(2024, 1, 2), end_date=date(2024, 1, 3), limit=1000)
+    assert {c.contract_date for c in found} == {datetime(2024, 1, 2), datetime(2024, 1, 3)}
+
+def test_full_text_search(store):
+    assert [c.company_name for c in store.search("hypersonic")] == ["HRL Laboratories LLC"]
+    # Porter stemming: "missiles" matches "missile"
+    assert len(store.search("missiles")) == 1
+    assert len(store.find(text="radar", branch="AIR FORCE", limit=1000)) == 50
+    assert store.find(text="radar", branch="NAVY") == []
+
+def test_upsert_replaces(store):
+    store.upsert([contract(7, contract_amount=5.0, contract_text="Reworded text about sonar.")])
+    assert len(store) == 51
+    updated = store.find(contract_id="FA9453-24-C-0007")[0]
+    assert updated.contract_amount == 5.0
+    assert [c.contract_id for c in store.search("sonar")] == ["FA9453-24-C-0007"]
+    assert "FA9453-24-C-0007" not in {c.contract_id for c in store.search("radar", limit=1000)}
+
+def test_round_trip(store):
+    assert store.find(contract_id="FA9453-24-C-0003") == [contract(3)]
+
+def test_failed_batch_rolls_back(data_dir):
+    store = ContractStore(data_dir.joinpath("rollback.sqlite"))
+    with pytest.raises(AttributeError):
+        store.upsert([contract(1), None])
+    assert len(store) == 0
+    store.close()
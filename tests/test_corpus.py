@@ -0,0 +1,32 @@
+import pytest
+
+spacy = pytest.importorskip("spacy")
+from corpus import ShardWriter, read_shards
+
+def write(directory, texts, shard_size=2):
+    nlp = spacy.blank("en")
+    writer = ShardWriter(directory, "train", shard_size)
+    for text in texts:
+        writer.add(nlp.make_doc(text))
+    return writer
+
+def texts(directory):
+    return [doc.text for doc in read_shards(directory, spacy.blank("en").vocab)]
+
+def test_close_replaces_the_previous_shards(data_dir):
+    directory = data_dir.joinpath("spacy", "train")
+    write(directory, ["a", "b", "c", "d", "e"]).close()
+    assert len(list(directory.iterdir())) == 3
+    write(directory, ["f"]).close()
+    assert texts(directory) == ["f"]
+    assert [path.name for path in data_dir.joinpath("spacy").iterdir()] == ["train"]
+
+def test_interrupted_build_keeps_the_previous_corpus(data_dir):
+    directory = data_dir.joinpath("spacy", "train")
+    write(directory, ["a", "b", "c"]).close()
+    # A build that wrote a shard, then died before close()
+    write(directory, ["x", "y", "z"])
+    assert texts(directory) == ["a", "b", "c"]
+    write(directory, ["f"]).close()
+    assert texts(directory) == ["f"]
+    assert [path.name for path in data_dir.joinpath("spacy").iterdir()] == ["train"]
@@ -0,0 +1,50 @@
+import json
+from config import Config
+from dataprocesssor import DataProcessor
+
+def write_annotated(data_dir, count: int):
+    records = [{"contract_id": f"FA9453-24-C-{i:04}", "contract_text": f" Contract\n{i} "} for i in range(count)]
+    for start in range(0, count, 10):
+        name = f"2024-01-{start // 10 + 1:02}_1.json"
+        with open(data_dir.joinpath("annotated", name), 'w') as file:
+            json.dump(records[start:start + 10], file)
+    with open(data_dir.joinpath("annotated", "2024-02-01_1.jsonl"), 'w') as file:
+        file.write(json.dumps({"contract_id": "N00024-22-C-0001", "contract_text": "jsonl"}) + "\n\n")
+    return records
+
+def test_iter_data_is_lazy_and_complete(data_dir):
+    records = write_annotated(data_dir, 25)
+    processor = DataProcessor(config=Config(data_dir=str(data_dir)))
+    stream = processor.iter_data()
+    assert next(stream) == records[0]
+    assert [r["contract_id"] for r in processor.iter_data()] == [r["contract_id"] for r in records] + ["N00024-22-C-0001"]
+    assert next(processor.iter_preprocess(processor.iter_data()))["text"] == "Contract 0"
+
+def test_get_batches_accepts_any_iterable():
+    processor = DataProcessor()
+    assert list(processor.get_batches(iter(range(7)), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(processor.get_batches((i for i in range(0)), 3)) == []
+
+def test_shuffle_buffer_is_a_permutation():
+    processor = DataProcessor()
+    shuffled = list(processor.shuffle(range(1000), buffer_size=64, seed=1))
+    assert sorted(shuffled) == list(range(1000))
+    assert shuffled != list(range(1000))
+    assert shuffled == list(processor.shuffle(range(1000), buffer_size=64, seed=1))
+
+def test_split_is_stable_and_does_not_mutate(data_dir):
+    records = write_annotated(data_dir, 200)
+    original = list(records)
+    processor = DataProcessor(config=Config(data_dir=str(data_dir)))
+    train, test = processor.get_train_test_data(records, test_size=0.3, seed=5)
+    assert records == original
+    assert len(train) + len(test) == 200 and 30 < len(test) < 90
+    for split, side in (("train", train), ("test", test)):
+        assert sorted(r["contract_id"] for r in processor.iter_split(iter(records), split, 0.3)) == \
+            sorted(r["contract_id"] for r in side)
+    # Each side is shuffled, the same way for the same seed
+    assert train != list(processor.iter_split(iter(records), "train", 0.3))
+    assert (train, test) == processor.get_train_test_data(records, test_size=0.3, seed=5)
+    # Shuffling does not change which split a record lands in
+    shuffled_train, _ = processor.get_train_test_data(processor.shuffle(records, 16, seed=3), test_size=0.3)
+    assert sorted(r["contract_id"] for r in shuffled_train) == sorted(r["contract_id"] for r in train)
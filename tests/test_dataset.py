@@ -0,0 +1,67 @@
+import json
+from datetime import datetime
+import pandas as pd
+from config import Config
+from dataset import ContractDataset
+
+def contract(i: int, branch: str, amount: float, day: str) -> dict:
+    return {
+        "contract_id": f"N00024-22-C-{i:04}",
+        "federal_agency": "Naval Sea Systems Command" if branch == "NAVY" else "Air Force Research Laboratory",
+        "military_branch": branch,
+        "contract_amount": amount,
+        "contract_date": f"{day}T00:00:00",
+        "company_name": f"Company {i}",
+        "location": "Bath, Maine",
+        "contract_description": "shipbuilding",
+        "estimated_completion_date": "2029-07-19T00:00:00",
+        "funds_obligated": "$1,000,000",
+        "source_url": f"https://www.defense.gov/News/Contracts/Contract/Article/{3000000 + i}/",
+        "contract_text": f"Contract {i}"
+    }
+
+def write_annotated(data_dir, day: str, items: list):
+    with open(data_dir.joinpath("annotated", f"{day}_{3000000 + len(items)}.json"), 'w') as file:
+        json.dump(items, file, indent=4)
+
+def build(data_dir) -> ContractDataset:
+    write_annotated(data_dir, "2022-03-01", [contract(1, "NAVY", 250e6, "2022-03-01"), contract(2, "NAVY", 5e6, "2022-03-01")])
+    write_annotated(data_dir, "2022-11-15", [contract(3, "AIR FORCE", 300e6, "2022-11-15"), contract(4, "NAVY", 120e6, "2022-11-15"),
+                                             contract(5, "NAVY", None, "2022-11-15")])
+    write_annotated(data_dir, "2023-01-05", [contract(6, "NAVY", 900e6, "2023-01-05")])
+    dataset = ContractDataset(Config(data_dir=str(data_dir)))
+    assert dataset.ingest() == 6
+    return dataset
+
+def test_partitions_and_types(data_dir):
+    dataset = build(data_dir)
+    partitions = sorted(str(path.relative_to(dataset.root).parent) for path in dataset.root.rglob("*.parquet"))
+    assert partitions == ["year=2022/month=11", "year=2022/month=3", "year=2023/month=1"]
+
+    frame = dataset.load()
+    assert len(frame) == 6
+    assert frame["contract_amount"].dtype == "float64"
+    assert isinstance(frame["military_branch"].dtype, pd.CategoricalDtype)
+    assert isinstance(frame["federal_agency"].dtype, pd.CategoricalDtype)
+    assert frame["contract_amount"].isna().sum() == 1
+
+def test_projection_and_filters(data_dir):
+    dataset = build(data_dir)
+    frame = dataset.load(
+        columns=["contract_id", "contract_amount"],
+        filters=[("year", "==", 2022), ("military_branch", "==", "NAVY"), ("contract_amount", ">", 100e6)]
+    )
+    assert list(frame.columns) == ["contract_id", "contract_amount"]
+    assert sorted(frame["contract_id"]) == ["N00024-22-C-0001", "N00024-22-C-0004"]
+
+def test_rewrite_month_and_round_trip(data_dir):
+    dataset = build(data_dir)
+    # Writing a month again replaces it instead of appending duplicates
+    dataset.ingest()
+    assert len(dataset.load()) == 6
+
+    contracts = dataset.to_contracts(dataset.load(filters=[("year", "==", 2023)]))
+    assert len(contracts) == 1
+    assert contracts[0].contract_date == datetime(2023, 1, 5)
+    assert contracts[0].estimated_completion_date == datetime(2029, 7, 19)
+    assert contracts[0].contract_amount == 900e6
@@ -0,0 +1,65 @@
+import random
+import pytest
+from dataprocesssor import DataProcessor
+from dedup import NearDuplicateIndex, shingles
+
+AWARD = ("Lockheed Martin Corp., Grand Prairie, Texas, was awarded a $94,512,880 modification (P00023) to contract "
+         "W31P4Q-21-C-0040 for Precision Strike Missile production. Work will be performed in Grand Prairie, Texas, "
+         "with an estimated completion date of Nov. 30, 2026. Fiscal 2024 procurement, Army funds in the amount of "
+         "$94,512,880 were obligated at the time of the award. Army Contracting Command, Redstone Arsenal, Alabama, "
+         "is the contracting activity.")
+OTHER = ("HRL Laboratories LLC, Malibu, California, was awarded a $26,991,707 cost-reimbursement contract for "
+         "Creating Arrays for Strategic elecTro-optical, proLiferated and Exquisite (CASTLE) program. Work will be "
+         "performed in Malibu, California, and is expected to be completed by July 19, 2029. The Air Force Research "
+         "Laboratory, Kirtland Air Force Base, New Mexico, is the contracting activity (FA9453-24-C-X011).")
+
+def modification(amount: str, date: str) -> str:
+    return AWARD.replace("94,512,880", amount).replace("Nov. 30, 2026", date)
+
+def test_shingles_mask_numbers():
+    assert set(shingles(AWARD)) == set(shingles(modification("1,000", "Nov. 30, 2031")))
+    assert len(shingles("one")) == 1
+
+def test_modifications_cluster_with_the_first_award():
+    index = NearDuplicateIndex()
+    assert index.add("award", AWARD) == "award"
+    assert index.add("other", OTHER) == "other"
+    assert index.add("mod", modification("7,000,000", "Dec. 1, 2027")) == "award"
+    assert index.add("option", modification("12,500", "Jan. 5, 2030").replace("Army Contracting Command", "Army Command")) == "award"
+    assert index.add("award", OTHER) == "award"  # Known keys are not added again
+    assert index.clusters() == {"award": ["award", "mod", "option"], "other": ["other"]}
+    assert index.is_representative("award") and not index.is_representative("mod")
+    assert len(index) == 4
+
+def test_unrelated_texts_stay_apart():
+    rng = random.Random(0)
+    words = AWARD.split()
+    index = NearDuplicateIndex()
+    for i in range(200):
+        rng.shuffle(words)
+        index.add(i, " ".join(words))
+    assert len(index.clusters()) == 200
+
+def test_comparisons_grow_linearly_with_a_cluster():
+    index = NearDuplicateIndex()
+    for i in range(2000):
+        index.add(i, modification(f"{i},000", "Nov. 30, 2026"))
+    assert index.clusters() == {0: list(range(2000))}
+    # Each text is compared once, with the cluster's member in its first shared band
+    assert index.comparisons <= 2000
+    assert all(len(bucket) == 1 for buckets in index.buckets for bucket in buckets.values())
+
+def test_bands_must_divide_signature():
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(num_perm=100, bands=16)
+
+def test_cluster_aware_split():
+    records = [{"contract_id": f"W31P4Q-21-C-{i:04}", "contract_text": modification(f"{i},000", "Nov. 30, 2026")} for i in range(40)]
+    records += [{"contract_id": f"FA9453-24-C-{i:04}", "contract_text": f"{OTHER} Variant {i} " * (i % 3 + 1)} for i in range(3)]
+    processor = DataProcessor()
+    index = processor.cluster_data(records)
+    train, test = processor.get_train_test_data(records, test_size=0.5, near_duplicates=index)
+    assert len(index.clusters()) == 2
+    # Every modification lands on the same side as the award
+    assert {"test" if record in test else "train" for record in records[:40]} in ({"train"}, {"test"})
+    assert len(train) + len(test) == 43
@@ -0,0 +1,127 @@
+import json
+import zlib
+import numpy as np
+import pytest
+from config import Config
+import embedding_index
+from embedding_index import EmbeddingIndex, iter_clean_texts
+
+TEXTS = {
+    "a": "Boeing Co., Seattle, Washington, was awarded a contract for F-15 aircraft spares.",
+    "b": "Boeing Co., Seattle, Washington, was awarded a modification for F-15 aircraft spares.",
+    "c": "Navy ship repair and maintenance at Norfolk, Virginia.",
+    "d": "Army construction of barracks at Fort Bragg, North Carolina.",
+}
+
+class HashingEncoder:
+    """
+    Bag of words hashed into 64 dimensions; counts the texts it encodes.
+    """
+
+    def __init__(self):
+        self.encoded = 0
+
+    def __call__(self, texts):
+        self.encoded += len(texts)
+        vectors = np.zeros((len(texts), 64), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.encode()) % 64] += 1
+        return vectors
+
+def make_index(data_dir, encoder=None, **kwargs):
+    return EmbeddingIndex(Config(data_dir=str(data_dir), **kwargs), encoder=encoder or HashingEncoder())
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_search_and_similar(data_dir, dtype):
+    index = make_index(data_dir, embedding_dtype=dtype)
+    assert index.add(TEXTS.items()) == 4
+    results = index.similar("a", k=2)
+    assert [record_id for record_id, _ in results][0] == "b"
+    assert len(results) == 2 and results[0][1] >= results[1][1]
+    record_id, score = index.search(TEXTS["c"], k=1)[0]
+    assert record_id == "c" and score == pytest.approx(1.0, abs=1e-3)
+
+def test_top_k_matches_brute_force_across_blocks(data_dir):
+    index = make_index(data_dir)
+    index.add((str(i), f"contract {i} word{i % 7} word{i % 11}") for i in range(50))
+    query = index.vector("3")
+    expected = np.argsort(-(np.asarray(index.get_matrix()) @ query), kind="stable")[:5]
+    assert [record_id for record_id, _ in index.top_k(query, k=5, block_rows=8)] == [str(i) for i in expected]
+
+def test_reopen_appends_without_reencoding(data_dir):
+    encoder = HashingEncoder()
+    index = make_index(data_dir, encoder)
+    index.add(list(TEXTS.items())[:2])
+    reopened = make_index(data_dir, encoder)
+    assert len(reopened) == 2 and "a" in reopened
+    assert reopened.add(TEXTS.items()) == 2
+    assert encoder.encoded == 4
+    assert make_index(data_dir).similar("a", k=1)[0][0] == "b"
+
+def test_interrupted_append_is_dropped(data_dir):
+    index = make_index(data_dir)
+    index.add(list(TEXTS.items())[:2])
+    directory = data_dir.joinpath("embeddings")
+    # Rows and IDs written by an append that died before meta.json was replaced
+    with open(directory.joinpath("vectors.bin"), 'ab') as file:
+        file.write(b"\0" * 100)
+    with open(directory.joinpath("ids.txt"), 'a') as file:
+        file.write("torn\n")
+    reopened = make_index(data_dir)
+    assert len(reopened) == 2 and "torn" not in reopened
+    assert directory.joinpath("vectors.bin").stat().st_size == 2 * 64 * 4
+    assert reopened.add([("c", TEXTS["c"])]) == 1
+    assert reopened.similar("c", k=3)[0][0] in ("a", "b")
+
+def test_reopen_with_another_model_raises(data_dir):
+    make_index(data_dir, embedding_model="all-MiniLM-L6-v2").add(TEXTS.items())
+    with pytest.raises(ValueError):
+        make_index(data_dir, embedding_model="all-mpnet-base-v2")
+    assert len(make_index(data_dir, embedding_model="all-MiniLM-L6-v2")) == 4
+
+def test_iter_clean_texts(data_dir, no_scraper):
+    with open(data_dir.joinpath("clean", "2024-04-19_1.json"), 'w') as file:
+        json.dump([{
+            "military_branch": "NAVY",
+            "source_url": "https://www.defense.gov/",
+            "contract_text": text,
+            "contract_date": "2024-04-19T00:00:00"
+        } for text in list(TEXTS.values())[:2]], file)
+    assert list(iter_clean_texts(Config(data_dir=str(data_dir)))) == [
+        ("2024-04-19_1.json:0", TEXTS["a"]), ("2024-04-19_1.json:1", TEXTS["b"])
+    ]
+
+class OneHotEncoder:
+    def __call__(self, texts):
+        return np.array([[1.0 if text == axis else 0.0 for axis in "ABC"] for text in texts])
+
+def test_crash_between_vectors_and_ids_write(data_dir):
+    index = make_index(data_dir, OneHotEncoder())
+    index.add([("A", "A")])
+    # An append of "B" that died after vectors.bin was fsynced, before ids.txt
+    with open(data_dir.joinpath("embeddings", "vectors.bin"), 'ab') as file:
+        file.write(np.array([0, 1, 0], dtype=np.float32).tobytes())
+    reopened = make_index(data_dir, OneHotEncoder())
+    assert data_dir.joinpath("embeddings", "vectors.bin").stat().st_size == 3 * 4
+    reopened.add([("C", "C")])
+    assert reopened.vector("C").tolist() == [0, 0, 1]
+    assert make_index(data_dir, OneHotEncoder()).similar("C", k=1) == [("A", 0.0)]
+    assert make_index(data_dir, OneHotEncoder()).search("C", k=1) == [("C", 1.0)]
+
+def test_failed_append_is_rolled_back(data_dir, monkeypatch):
+    index = make_index(data_dir, OneHotEncoder())
+    index.add([("A", "A")])
+
+    def failing_open(path, mode='r', **kwargs):
+        if str(path).endswith("ids.txt") and mode == 'a':
+            raise OSError("disk full")
+        return open(path, mode, **kwargs)
+    monkeypatch.setattr(embedding_index, "open", failing_open, raising=False)
+    with pytest.raises(OSError):
+        index.add([("B", "B")])
+    monkeypatch.undo()
+    assert len(index) == 1
+    index.add([("C", "C")])
+    assert index.vector("C").tolist() == [0, 0, 1]
+    assert make_index(data_dir, OneHotEncoder()).search("C", k=1) == [("C", 1.0)]
@@ -0,0 +1,84 @@
+import json
+from pathlib import Path
+import pytest
+from config import Config
+from extractor import ANNOTATION_FIELDS, RuleExtractor, format_coverage
+from scraper import Scraper
+from validation import VALID_FIELDS, check_annotation
+
+FIXTURES = Path(__file__).parent.joinpath("fixtures", "defense_gov")
+
+HRL = ("HRL Laboratories LLC, Malibu, California, was awarded a $26,991,707 cost-reimbursement contract for "
+       "Creating Arrays for Strategic elecTro-optical, proLiferated and Exquisite (CASTLE) program. Work will be "
+       "performed in Malibu, California, and is expected to be completed by July 19, 2029. Fiscal 2024 research "
+       "funds in the amount of $26,991,707 are being obligated at time of award. The Air Force Research "
+       "Laboratory, Kirtland Air Force Base, New Mexico, is the contracting activity (FA9453-24-C-X011).")
+
+def fixture_texts():
+    scraper = Scraper(Config())
+    texts = []
+    for path in sorted(FIXTURES.glob("article_*.html")):
+        texts += [c.contract_text for c in scraper.parse_date_contract(path.read_bytes(), "https://example.test/") or []]
+    return texts
+
+def test_fields_match_validation():
+    assert set(ANNOTATION_FIELDS) == VALID_FIELDS
+
+def test_extracts_every_field():
+    fields = RuleExtractor().extract(HRL)
+    assert fields == {
+        "contract_id": "FA9453-24-C-X011",
+        "federal_agency": "Air Force Research Laboratory",
+        "contract_amount": "$26,991,707",
+        "company_name": "HRL Laboratories LLC",
+        "location": "Malibu, California",
+        "contract_description": "cost-reimbursement contract for Creating Arrays for Strategic elecTro-optical, "
+                                "proLiferated and Exquisite (CASTLE) program",
+        "estimated_completion_date": "July 19, 2029",
+        "funds_obligated": "$26,991,707",
+    }
+    # A complete extraction is a valid annotation on its own
+    assert check_annotation(json.dumps(fields))[1] == "ok"
+
+@pytest.mark.parametrize("text, expected", [
+    ("Lockheed Martin Corp., Rotary and Mission Systems, Owego, New York, was awarded a $5,000,000 contract.",
+     {"company_name": "Lockheed Martin Corp., Rotary and Mission Systems", "location": "Owego, New York"}),
+    ("Raytheon Co., Tucson, Arizona, is being awarded a $155,016,284 modification to previously awarded contract "
+     "HQ0147-19-C-0003 for engineering support. The work will be performed in Tucson, Arizona, with an expected "
+     "completion date of Sept. 30, 2024.",
+     {"contract_id": "HQ0147-19-C-0003", "estimated_completion_date": "Sept. 30, 2024",
+      "contract_description": "modification to previously awarded contract HQ0147-19-C-0003 for engineering support"}),
+    ("Sysco Corp., Houston, Texas, has been awarded a maximum $250,000,000 contract for food. This is a 60-month "
+     "contract. The contracting activity is the Defense Logistics Agency Troop Support, Philadelphia, Pennsylvania "
+     "(SPE300-24-D-3301).",
+     {"federal_agency": "Defense Logistics Agency Troop Support", "contract_amount": "$250,000,000"}),
+    ("Work is expected to be completed by Smarch 5, 2025. Naval Sea Systems Command, Washington, D.C., is the "
+     "contracting activity.",
+     {"federal_agency": "Naval Sea Systems Command", "estimated_completion_date": None}),
+])
+def test_patterns(text, expected):
+    fields = RuleExtractor().extract(text)
+    for name, value in expected.items():
+        assert fields.get(name) == value
+
+def test_coverage_on_recorded_pages():
+    extractor = RuleExtractor()
+    coverage = extractor.coverage(fixture_texts())
+    assert coverage["contracts"] == 8
+    assert coverage["complete"] >= 6
+    assert coverage["contract_amount"] == coverage["company_name"] == 8
+    assert "8 contracts" in format_coverage(coverage)
+
+def test_annotator_reads_clean_files_without_a_scraper(data_dir, no_scraper):
+    from annotator import Annotator
+    with open(data_dir.joinpath("clean", "2024-04-19_3749216.json"), 'w') as file:
+        json.dump([{
+            "military_branch": "AIR FORCE",
+            "source_url": "https://www.defense.gov/News/Contracts/Contract/Article/3749216/",
+            "contract_text": text,
+            "contract_date": "2024-04-19T00:00:00"
+        } for text in (HRL, HRL.replace("$26,991,707", "$1,000,000"))], file)
+    annotator = Annotator()
+    annotator.base_data_filename = data_dir
+    assert annotator.rule_coverage()["contracts"] == 2
+    assert len(annotator.near_duplicates().clusters()) == 1
@@ -0,0 +1,79 @@
+import json
+import sys
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from config import Config
+from extractor import RuleExtractor
+from infer import NerInference, entities_to_contract, peak_rss_mb
+from model import Precontract
+
+PRECONTRACT = Precontract(
+    military_branch="AIR FORCE",
+    source_url="https://www.defense.gov/News/Contracts/Contract/Article/3749216/",
+    contract_text="HRL Laboratories LLC, Malibu, California, was awarded a $26,991,707 contract.",
+    contract_date=datetime(2024, 4, 19)
+)
+
+class RulesPipeline:
+    """
+    Stands in for a trained pipeline: the entities are what RuleExtractor finds.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def pipe(self, texts, as_tuples=False, batch_size=None, n_process=None):
+        self.calls.append((batch_size, n_process))
+        for text, context in texts:
+            ents = [SimpleNamespace(label_=label, text=value) for label, value in RuleExtractor().extract(text).items()]
+            yield SimpleNamespace(ents=ents), context
+
+def test_entities_to_contract_normalizes():
+    contract = entities_to_contract([
+        ("company_name", "HRL Laboratories LLC"),
+        ("contract_amount", "$26,991,707"),
+        ("contract_amount", "$1"),
+        ("estimated_completion_date", "Sept. 30, 2029"),
+    ], PRECONTRACT)
+    assert contract.company_name == "HRL Laboratories LLC"
+    assert contract.contract_amount == 26991707.0
+    assert contract.estimated_completion_date == datetime(2029, 9, 30)
+    assert contract.contract_id == "" and contract.military_branch == "AIR FORCE"
+
+def test_run_writes_each_file(data_dir, no_scraper):
+    for day, count in (("2024-04-19_1.json", 3), ("2024-04-22_2.json", 1)):
+        with open(data_dir.joinpath("clean", day), 'w') as file:
+            json.dump([{
+                "military_branch": "AIR FORCE",
+                "source_url": PRECONTRACT.source_url,
+                "contract_text": PRECONTRACT.contract_text.replace("$26,991,707", f"${i + 1},000"),
+                "contract_date": "2024-04-19T00:00:00"
+            } for i in range(count)], file)
+    nlp = RulesPipeline()
+    inference = NerInference(Config(data_dir=str(data_dir)), nlp=nlp)
+    stats = inference.run(batch_size=2, n_process=1)
+    assert stats["docs"] == 4 and stats["files"] == 2
+    assert nlp.calls == [(2, 1)]
+    with open(data_dir.joinpath("ner", "2024-04-19_1.json")) as file:
+        contracts = json.load(file)
+    assert [c["contract_amount"] for c in contracts] == [1000.0, 2000.0, 3000.0]
+    assert contracts[0]["company_name"] == "HRL Laboratories LLC"
+    # Finished files are skipped unless forced
+    assert NerInference(Config(data_dir=str(data_dir)), nlp=nlp).run()["docs"] == 0
+    assert NerInference(Config(data_dir=str(data_dir)), nlp=nlp).run(force=True)["docs"] == 4
+
+def test_peak_rss_without_resource_module(data_dir, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "platform", "win32")
+    assert peak_rss_mb() is None
+    NerInference(Config(data_dir=str(data_dir)), nlp=RulesPipeline()).run()
+    assert "peak traced memory" in capsys.readouterr().out
+    assert not tracemalloc.is_tracing()
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="compares with the Linux scale")
+def test_peak_rss_scaled_per_platform(monkeypatch):
+    linux_mb = peak_rss_mb()[0]
+    monkeypatch.setattr(sys, "platform", "darwin")
+    # macOS reports bytes, so the same count reads 1024 times smaller
+    assert peak_rss_mb()[0] * 1024 == pytest.approx(linux_mb, rel=0.01)
@@ -0,0 +1,73 @@
+import json
+from ManualData import align_entities, assign_occurrences, correct_start_end, find_occurrences, iter_corrections
+
+TEXT = ("HRL Laboratories LLC, Malibu, California, was awarded a $26,991,707 contract. "
+        "Work will be performed in Malibu, California, and is expected to be completed by July 19, 2029.")
+FIRST = TEXT.find("Malibu, California")
+SECOND = TEXT.find("Malibu, California", FIRST + 1)
+
+def entity(type: str, value: str, start: int = -1) -> dict:
+    return {"type": type, "value": value, "start": start, "end": start + len(value) if start >= 0 else -1}
+
+def test_find_occurrences_includes_overlaps():
+    occurrences = find_occurrences(TEXT, ["Malibu, California", "Malibu", "California", "missing"])
+    assert occurrences["Malibu, California"] == [FIRST, SECOND]
+    assert occurrences["Malibu"] == [FIRST, SECOND]
+    assert occurrences["California"] == [FIRST + 8, SECOND + 8]
+    assert occurrences["missing"] == []
+
+def test_repeated_values_keep_order_and_nearest():
+    contract = {"text": TEXT, "entities": [
+        entity("company_name", "HRL Laboratories LLC", 0),
+        # Offsets drifted by a few characters, as after editing the text
+        entity("work_location", "Malibu, California", SECOND - 3),
+        entity("location", "Malibu, California", FIRST + 2),
+    ]}
+    assert align_entities(contract) == []
+    starts = {e["type"]: e["start"] for e in contract["entities"]}
+    assert starts == {"company_name": 0, "location": FIRST, "work_location": SECOND}
+    assert all(TEXT[e["start"]:e["end"]] == e["value"] for e in contract["entities"])
+
+def test_unknown_offsets_take_occurrences_in_order():
+    contract = {"text": TEXT, "entities": [entity("location", "Malibu, California"), entity("work_location", "Malibu, California")]}
+    align_entities(contract)
+    assert [e["start"] for e in contract["entities"]] == [FIRST, SECOND]
+
+def test_unaligned_entities_are_reported():
+    extra = entity("location", "Malibu, California", 500)
+    contract = {"text": TEXT, "entities": [
+        entity("location", "Malibu, California", FIRST), entity("location", "Malibu, California", SECOND), extra,
+        entity("contract_id", "FA9453-24-C-X011", 10)
+    ]}
+    unaligned = align_entities(contract)
+    assert [e["value"] for e in unaligned] == ["Malibu, California", "FA9453-24-C-X011"]
+    assert extra["start"] == 500
+
+def test_assign_occurrences_more_occurrences_than_entities():
+    assert assign_occurrences([95], [0, 50, 100], unaligned_cost=1000) == [100]
+    assert assign_occurrences([None, None], [0, 50, 100], unaligned_cost=1000) == [0, 50]
+
+def write_manual(manual):
+    for name in ("a.json", "b.json"):
+        with open(manual.joinpath(name), 'w') as file:
+            json.dump([{"text": TEXT, "entities": [entity("location", "Malibu, California"), entity("date", "July 20, 2029")]}], file)
+
+def test_correct_start_end(data_dir):
+    manual = data_dir.joinpath("manual")
+    write_manual(manual)
+    # A bare call aligns every file
+    unaligned = correct_start_end(manual, workers=2)
+    assert [(filename, index, e["value"]) for filename, index, e in unaligned] == \
+        [("a.json", 0, "July 20, 2029"), ("b.json", 0, "July 20, 2029")]
+    with open(manual.joinpath("a.json")) as file:
+        assert json.load(file)[0]["entities"][0]["start"] == FIRST
+
+def test_iter_corrections_aligns_as_consumed(data_dir):
+    manual = data_dir.joinpath("manual")
+    write_manual(manual)
+    corrections = iter_corrections(manual, workers=1)
+    with open(manual.joinpath("a.json")) as file:
+        assert json.load(file)[0]["entities"][0]["start"] == -1
+    assert [filename for filename, _, _ in corrections] == ["a.json", "b.json"]
+    with open(manual.joinpath("b.json")) as file:
+        assert json.load(file)[0]["entities"][0]["start"] == FIRST
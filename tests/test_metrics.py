@@ -0,0 +1,99 @@
+import json
+import pstats
+from datetime import datetime
+import pytest
+from config import Config
+from fetcher import Fetcher
+from metrics import REGISTRY, Histogram, Metrics, export, stage
+from model import Precontract
+from scraper import Scraper
+
+@pytest.fixture(autouse=True)
+def registry():
+    REGISTRY.reset()
+    yield REGISTRY
+    REGISTRY.reset()
+
+def test_histogram_quantiles():
+    histogram = Histogram(buckets=(1.0, 2.0, 4.0))
+    for value in (0.5, 1.5, 1.5, 3.0):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1, 0]
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    assert histogram.quantile(1.0) == pytest.approx(4.0)
+    assert Histogram().quantile(0.5) == 0.0
+
+def test_prometheus_text():
+    metrics = Metrics()
+    metrics.inc("http_requests_total", host="a", status=200)
+    metrics.inc("http_requests_total", 2, host="a", status=200)
+    metrics.set("stage_peak_memory_bytes", 1024, stage="crawl")
+    metrics.observe("parse_seconds", 0.003, page="article")
+    text = metrics.to_prometheus()
+    assert "# TYPE http_requests_total counter" in text
+    assert 'http_requests_total{host="a",status="200"} 3' in text
+    assert 'stage_peak_memory_bytes{stage="crawl"} 1024' in text
+    assert 'parse_seconds_bucket{page="article",le="0.0025"} 0' in text
+    assert 'parse_seconds_bucket{page="article",le="0.005"} 1' in text
+    assert 'parse_seconds_bucket{page="article",le="+Inf"} 1' in text
+    assert 'parse_seconds_count{page="article"} 1' in text
+
+def test_stage_profiles_traces_and_exports(tmp_path):
+    config = Config(data_dir=str(tmp_path), metrics_file="metrics.json", profile_stages=("crawl",), trace_memory=True)
+    with stage("crawl", config):
+        sorted(range(100000), key=lambda i: -i)
+    stats = pstats.Stats(str(tmp_path.joinpath("profiles", "crawl.prof")))
+    assert any(function == "<lambda>" for _, _, function in stats.stats)
+    with open(tmp_path.joinpath("metrics.json")) as file:
+        snapshot = json.load(file)
+    assert [h["count"] for h in snapshot["histograms"] if h["name"] == "stage_seconds"] == [1]
+    assert REGISTRY.value("stage_peak_memory_bytes", stage="crawl") > 100000 * 8
+
+def test_export_interval(tmp_path):
+    config = Config(data_dir=str(tmp_path))
+    export(config, interval=60)
+    tmp_path.joinpath("metrics.prom").unlink()
+    export(config, interval=60)
+    assert not tmp_path.joinpath("metrics.prom").exists()
+    export(Config(data_dir=str(tmp_path), metrics_file=""))
+    assert not tmp_path.joinpath("metrics.prom").exists()
+
+def test_fetcher_and_writes_are_recorded(defense_gov, data_dir):
+    defense_gov.failures = 1
+    host = defense_gov.base_url.split("/")[2]
+    config = Config(base_url=defense_gov.base_url, data_dir=str(data_dir), rate_limit=0, backoff_factor=0, page_cache=False)
+    scraper = Scraper(config, Fetcher(config))
+    contracts = scraper.get_date_contract(f"http://{host}/News/Contracts/Contract/Article/3749216/")
+    scraper.write_precontracts(contracts)
+    assert REGISTRY.value("http_requests_total", host=host, status=503) == 1
+    assert REGISTRY.value("http_requests_total", host=host, status=200) == 1
+    assert REGISTRY.value("http_retries_total", host=host) == 1
+    assert REGISTRY.value("contracts_extracted_total") == len(contracts)
+    snapshot = {(h["name"], tuple(h["labels"].items())): h["count"] for h in REGISTRY.snapshot()["histograms"]}
+    assert snapshot[("http_request_seconds", (("host", host),))] == 2
+    assert snapshot[("parse_seconds", (("page", "article"),))] == 1
+    assert snapshot[("file_write_seconds", (("dir", "raw"),))] == 1
+    assert REGISTRY.value("file_write_bytes_total", dir="raw") == data_dir.joinpath("raw", "2024-04-19_3749216.json").stat().st_size
+
+def test_sharded_writes_share_one_label(tmp_path):
+    from pagecache import PageCache
+    cache = PageCache(tmp_path)
+    for i in range(20):
+        cache.put(f"https://www.defense.gov/News/Contracts/?Page={i}", f"page {i}".encode())
+    writes = {tuple(h["labels"].items()): h["count"] for h in REGISTRY.snapshot()["histograms"] if h["name"] == "file_write_seconds"}
+    # A body and a ref per page, across up to 40 shard directories
+    assert writes == {(("dir", "cache"),): 40}
+
+def test_engine_records_tokens_and_retries(fake_openai):
+    openai = pytest.importorskip("openai")
+    from annotation_engine import AnnotationEngine
+    fake_openai.statuses = [429]
+    client = openai.AsyncOpenAI(base_url=fake_openai.base_url, api_key="test", max_retries=0)
+    engine = AnnotationEngine(Config(backoff_factor=0.01, max_concurrent_requests=1), client=client)
+    contract = Precontract("NAVY", "https://www.defense.gov/", "Contract number 1 was awarded.", datetime(2024, 4, 19))
+    engine.run([contract])
+    model = Config.model
+    assert REGISTRY.value("llm_requests_total", model=model, status="ok") == 1
+    assert REGISTRY.value("llm_requests_total", model=model, status="RateLimitError") == 1
+    assert REGISTRY.value("llm_retries_total", model=model) == 1
+    assert REGISTRY.value("llm_tokens_total", model=model, kind="prompt") == engine.stats["prompt_tokens"] > 0
@@ -0,0 +1,52 @@
+from datetime import datetime
+import pandas as pd
+import pytest
+from normalize import parse_date, parse_date_batch, parse_money, parse_money_batch
+
+MONEY = ["$26,991,707", "$1.2 million", "$5B", "$750K", "26991707", "$0.5 billion",
+         "about $5 million", "", "$", "N/A", "$26,991,707"]
+DATES = ["July 19, 2029", "Sept. 30, 2024", "Sep 30 2024", "Dec 1 2025", "December 2025",
+         "March 3rd, 2027", "Feb. 30, 2025", "2029-07-19", "sometime in 2029", "", "July 19, 2029"]
+
+@pytest.mark.parametrize("raw, expected", [
+    ("$26,991,707", 26991707.0),
+    ("$1.2 million", 1200000.0),
+    ("$5B", 5e9),
+    ("$750K", 750000.0),
+    ("$.5 million", 500000.0),
+    ("about $5 million", None),
+    ("$", None),
+])
+def test_parse_money(raw, expected):
+    assert parse_money(raw) == expected
+
+@pytest.mark.parametrize("raw, expected", [
+    ("Sept. 19, 2023", datetime(2023, 9, 19)),
+    ("Sep 19, 2023", datetime(2023, 9, 19)),
+    ("Jan. 2, 2024", datetime(2024, 1, 2)),
+    ("March 3rd, 2027", datetime(2027, 3, 3)),
+    ("Feb. 30, 2025", None),
+    ("Ju 19, 2029", None),
+])
+def test_parse_date(raw, expected):
+    assert parse_date(raw) == expected
+
+def test_money_batch_matches_scalar():
+    batch = parse_money_batch(MONEY)
+    assert len(batch) == len(MONEY)
+    for raw, value in zip(MONEY, batch):
+        expected = parse_money(raw)
+        assert pd.isna(value) if expected is None else value == expected
+
+def test_date_batch_matches_scalar():
+    batch = parse_date_batch(DATES)
+    assert len(batch) == len(DATES)
+    for raw, value in zip(DATES, batch):
+        expected = parse_date(raw)
+        assert value is pd.NaT if expected is None else value.to_pydatetime() == expected
+
+def test_batch_empty_and_missing():
+    assert len(parse_money_batch([])) == 0
+    assert len(parse_date_batch([])) == 0
+    assert pd.isna(parse_money_batch([None])[0])
+    assert parse_date_batch([None])[0] is pd.NaT
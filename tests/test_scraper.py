@@ -0,0 +1,204 @@
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+import pytest
+from config import Config
+from crawlstate import CrawlState
+from fetcher import Fetcher, RateLimiter
+from htmlparse import PARSERS, get_parser
+from pagecache import CachedPage, CacheMiss, PageCache
+from scraper import Scraper
+
+FIXTURES = Path(__file__).parent.joinpath("fixtures", "defense_gov")
+
+def make_scraper(defense_gov, data_dir, **kwargs) -> Scraper:
+    config = Config(base_url=defense_gov.base_url, data_dir=str(data_dir), rate_limit=0, backoff_factor=0, **kwargs)
+    return Scraper(config)
+
+def read_raw(data_dir) -> dict:
+    return {path.name: path.read_text() for path in sorted(data_dir.joinpath("raw").iterdir())}
+
+def test_get_max_pages(defense_gov, data_dir):
+    assert make_scraper(defense_gov, data_dir).get_max_pages() == 3
+
+def test_get_date_contract(defense_gov, data_dir):
+    scraper = make_scraper(defense_gov, data_dir)
+    url = f"{defense_gov.host}/News/Contracts/Contract/Article/3749216/"
+    contracts = scraper.get_date_contract(url)
+    assert [c.military_branch for c in contracts] == ["AIR FORCE", "NAVY"]
+    assert all(c.contract_date == datetime(2024, 4, 19) for c in contracts)
+    assert contracts[0].contract_text.startswith("HRL Laboratories LLC")
+    assert scraper.contract_filename(contracts[0]) == "2024-04-19_3749216.json"
+
+def test_get_date_contract_not_contracts(defense_gov, data_dir):
+    scraper = make_scraper(defense_gov, data_dir)
+    assert scraper.get_date_contract(f"{defense_gov.host}/News/Contracts/Contract/Article/3390001/") is None
+
+def test_download_all_contracts_is_deterministic(defense_gov, tmp_path):
+    outputs = []
+    for workers in (1, 4):
+        data_dir = tmp_path.joinpath(f"workers_{workers}")
+        data_dir.joinpath("raw").mkdir(parents=True)
+        make_scraper(defense_gov, data_dir, workers=workers).download_all_contracts(0)
+        outputs.append(read_raw(data_dir))
+    assert outputs[0] == outputs[1]
+    assert sorted(outputs[0]) == [
+        "2023-02-03_3291122.json",
+        "2023-09-19_3531234.json",
+        "2024-04-18_3748001.json",
+        "2024-04-19_3749216.json",
+    ]
+    # 3748001 is listed on two pages, the second write replaces the first
+    assert len(json.loads(outputs[0]["2024-04-18_3748001.json"])) == 3
+
+def test_fetcher_retries(defense_gov):
+    defense_gov.failures = 2
+    fetcher = Fetcher(Config(rate_limit=0, backoff_factor=0, max_retries=2, page_cache=False))
+    assert fetcher.get(f"{defense_gov.base_url}?Page=0").status_code == 200
+    assert len(defense_gov.requests) == 3
+
+def read_clean(data_dir) -> dict:
+    scraper = Scraper(Config(data_dir=str(data_dir)))
+    return {path.name: scraper.read_precontract(path) for path in sorted(data_dir.joinpath("clean").glob("*.json"))}
+
+def test_clean_data(defense_gov, data_dir):
+    scraper = make_scraper(defense_gov, data_dir)
+    scraper.download_all_contracts(0)
+    scraper.clean_data(workers=2)
+    cleaned = read_clean(data_dir)
+    assert sorted(cleaned) == sorted(read_raw(data_dir))
+    texts = [contract.contract_text for contracts in cleaned.values() for contract in contracts]
+    assert not any(char in text for text in texts for char in "\n\t\r")
+    assert any("completed byDecember 2025." in text for text in texts)
+
+def test_clean_data_skips_unchanged(defense_gov, data_dir, capsys):
+    scraper = make_scraper(defense_gov, data_dir)
+    scraper.download_all_contracts(0)
+    scraper.clean_data(workers=2)
+    scraper.clean_data(workers=2)
+    assert "Cleaning 0 of 4 files" in capsys.readouterr().out
+
+def test_clean_inline_matches_clean_data(defense_gov, tmp_path):
+    separate = tmp_path.joinpath("separate")
+    inline = tmp_path.joinpath("inline")
+    for data_dir in (separate, inline):
+        data_dir.joinpath("raw").mkdir(parents=True)
+        data_dir.joinpath("clean").mkdir()
+    scraper = make_scraper(defense_gov, separate)
+    scraper.download_all_contracts(0)
+    scraper.clean_data(workers=2)
+    make_scraper(defense_gov, inline, clean_inline=True).download_all_contracts(0)
+    assert list(inline.joinpath("raw").iterdir()) == []
+    assert read_clean(inline) == read_clean(separate)
+
+def test_offline_replay_from_page_cache(defense_gov, tmp_path):
+    online = tmp_path.joinpath("online")
+    online.joinpath("raw").mkdir(parents=True)
+    make_scraper(defense_gov, online).download_all_contracts(0)
+
+    # Replay into a fresh data directory that shares the page cache
+    offline = tmp_path.joinpath("offline")
+    offline.joinpath("raw").mkdir(parents=True)
+    defense_gov.requests.clear()
+    config = Config(base_url=defense_gov.base_url, data_dir=str(offline), offline=True)
+    config.cache_dir = str(online.joinpath("cache"))
+    Scraper(config).download_all_contracts(0)
+    assert defense_gov.requests == []
+    assert read_raw(offline) == read_raw(online)
+
+def test_offline_cache_miss(data_dir):
+    fetcher = Fetcher(Config(data_dir=str(data_dir), offline=True))
+    with pytest.raises(CacheMiss):
+        fetcher.get("https://www.defense.gov/News/Contracts/?Page=1")
+
+def test_page_cache_is_content_addressed(tmp_path):
+    cache = PageCache(tmp_path)
+    cache.put("https://example.com/a", b"<html>same</html>", etag='"1"')
+    cache.put("https://example.com/b", b"<html>same</html>")
+    assert cache.get("https://example.com/a") == CachedPage("https://example.com/a", b"<html>same</html>", '"1"', None)
+    assert cache.get("https://example.com/c") is None
+    assert len(list(tmp_path.joinpath("objects").rglob("*.gz"))) == 1
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(20)
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.wait("example.com")
+    limiter.wait("other.example.com")
+    assert time.monotonic() - start >= 4 / 20
+
+def test_download_all_contracts_records_state(defense_gov, data_dir):
+    make_scraper(defense_gov, data_dir).download_all_contracts(0)
+    state = CrawlState(data_dir.joinpath("crawl_state.json"))
+    assert len(state) == 5
+    url = f"{defense_gov.host}/News/Contracts/Contract/Article/3749216/"
+    assert state.conditional_headers(url)["If-None-Match"].startswith('"')
+
+def test_incremental_stops_at_known_page(defense_gov, data_dir):
+    make_scraper(defense_gov, data_dir).download_all_contracts(0)
+    # Pretend the newest article was posted after the first crawl
+    new_url = f"{defense_gov.host}/News/Contracts/Contract/Article/3749216/"
+    state = CrawlState(data_dir.joinpath("crawl_state.json"))
+    del state.articles[new_url]
+    state.save()
+    defense_gov.requests.clear()
+
+    make_scraper(defense_gov, data_dir).download_all_contracts(0, incremental=True)
+    # Page 1 is prefetched while page 0's article downloads, so the order of
+    # the requests varies; what matters is that the crawl stops at page 1
+    requests = defense_gov.requests
+    assert "/News/Contracts/?Page=2" not in requests
+    assert {request for request in requests if "?Page=" in request} == {
+        "/News/Contracts/?Page=1000000000", "/News/Contracts/?Page=0", "/News/Contracts/?Page=1"
+    }
+    # Only the new article is downloaded, once
+    assert [request for request in requests if "/Article/" in request] == ["/News/Contracts/Contract/Article/3749216/"]
+    assert len(requests) == 4
+    assert CrawlState(data_dir.joinpath("crawl_state.json")).is_known(new_url)
+
+def test_revalidate_sends_conditional_requests(defense_gov, data_dir):
+    make_scraper(defense_gov, data_dir).download_all_contracts(0)
+    before = read_raw(data_dir)
+    defense_gov.headers.clear()
+    make_scraper(defense_gov, data_dir).download_all_contracts(2, revalidate=True)
+    article_headers = defense_gov.headers[2:]
+    assert len(article_headers) == 2
+    assert all("If-None-Match" in headers for headers in article_headers)
+    assert read_raw(data_dir) == before
+
+def test_write_precontracts_replaces_day_file(defense_gov, data_dir):
+    scraper = make_scraper(defense_gov, data_dir)
+    contracts = scraper.get_date_contract(f"{defense_gov.host}/News/Contracts/Contract/Article/3748001/")
+    scraper.write_precontracts(contracts)
+    scraper.write_precontracts(contracts)
+    filepath = data_dir.joinpath("raw", "2024-04-18_3748001.json")
+    assert scraper.read_precontract(filepath) == contracts
+    assert [path.name for path in data_dir.joinpath("raw").iterdir()] == ["2024-04-18_3748001.json"]
+
+def test_jsonl_append_and_stream(defense_gov, data_dir):
+    scraper = make_scraper(defense_gov, data_dir, storage_format="jsonl")
+    contracts = scraper.get_date_contract(f"{defense_gov.host}/News/Contracts/Contract/Article/3748001/")
+    scraper.write_precontracts(contracts[:1])
+    scraper.write_precontracts(contracts[1:], append=True)
+    filepath = data_dir.joinpath("raw", "2024-04-18_3748001.jsonl")
+    assert len(filepath.read_text().splitlines()) == 3
+    # An interrupted append leaves a torn last line behind
+    with open(filepath, "a") as file:
+        file.write('{"military_branch": "NAVY", "sour')
+    assert list(scraper.iter_precontracts(filepath)) == contracts
+
+@pytest.mark.parametrize("name", sorted(path.name for path in FIXTURES.glob("article_*.html")))
+def test_parsers_agree_on_articles(name):
+    content = FIXTURES.joinpath(name).read_bytes()
+    url = "https://www.defense.gov/News/Contracts/Contract/Article/1/"
+    results = [Scraper(Config(html_parser=parser)).parse_date_contract(content, url) for parser in PARSERS]
+    assert results[0] == results[1]
+
+@pytest.mark.parametrize("name", sorted(path.name for path in FIXTURES.glob("listing_*.html")))
+def test_parsers_agree_on_listings(name):
+    content = FIXTURES.joinpath(name).read_bytes()
+    parsers = [get_parser(parser) for parser in PARSERS]
+    assert parsers[0].article_urls(content) == parsers[1].article_urls(content)
+    if name == "listing_last.html":
+        assert [parser.max_page(content) for parser in parsers] == [3, 3]
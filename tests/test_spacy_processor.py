@@ -0,0 +1,62 @@
+from collections import Counter
+import pytest
+from config import Config
+import SpacyProcessor as spacy_processor
+from SpacyProcessor import SpacyProcessor
+
+spacy = pytest.importorskip("spacy")
+from spacy.tokens import DocBin
+
+TEXT = "HRL Laboratories LLC, Malibu, California, was awarded a $26,991,707 contract."
+
+def entity(type: str, value: str, offset: int = 0) -> dict:
+    start = TEXT.index(value) + offset
+    return {"type": type, "value": value, "start": start, "end": TEXT.index(value) + len(value)}
+
+def record(*entities: dict) -> dict:
+    return {"text": TEXT, "entities": list(entities)}
+
+def make_processor(data_dir) -> SpacyProcessor:
+    # "blank:en" loads spacy.blank("en"), a tokenizer without trained components
+    return SpacyProcessor(Config(data_dir=str(data_dir), spacy_model="blank:en"))
+
+def test_make_docs_reports_dropped_and_overlapping_spans(data_dir):
+    data = [
+        record(entity("company_name", "HRL Laboratories LLC"), entity("location", "Malibu, California")),
+        # Starts inside a token
+        record(entity("company_name", "HRL Laboratories LLC", offset=1), entity("contract_amount", "$26,991,707")),
+        # Inside the location span, the longer span is kept
+        record(entity("location", "Malibu, California"), entity("city", "Malibu")),
+        record(entity("location", "Malibu, California", offset=1), entity("location", "California", offset=2)),
+    ]
+    report = Counter()
+    docs = [doc for _, doc in make_processor(data_dir).make_docs(data, report, batch_size=2)]
+    assert [[(ent.label_, ent.text) for ent in doc.ents] for doc in docs] == [
+        [("company_name", "HRL Laboratories LLC"), ("location", "Malibu, California")],
+        [("contract_amount", "$26,991,707")],
+        [("location", "Malibu, California")],
+        [],
+    ]
+    assert report["docs"] == 4 and report["spans"] == 8
+    assert report["dropped"] == 3 and report["company_name"] == 1 and report["location"] == 2
+    assert report["overlapping"] == 1 and report["city"] == 0
+
+@pytest.mark.parametrize("checkpoint_every, writes", [(0, 1), (2, 3), (5, 2)])
+def test_convert_data_writes_one_readable_doc_bin(data_dir, monkeypatch, checkpoint_every, writes):
+    written = []
+    write_atomic = spacy_processor.write_atomic
+
+    def counting_write_atomic(path, content):
+        written.append(path)
+        write_atomic(path, content)
+    monkeypatch.setattr(spacy_processor, "write_atomic", counting_write_atomic)
+    data = [record(entity("company_name", "HRL Laboratories LLC"))] * 5
+    report = make_processor(data_dir).convert_data(data, checkpoint_every=checkpoint_every)
+    assert report["docs"] == 5
+    assert len(written) == writes and set(written) == {data_dir.joinpath("spacy", "dataset.spacy")}
+    # Only the DocBin is left behind, no temporary files of the atomic writes
+    assert [path.name for path in data_dir.joinpath("spacy").iterdir()] == ["dataset.spacy"]
+    nlp = spacy.blank("en")
+    docs = list(DocBin().from_bytes(data_dir.joinpath("spacy", "dataset.spacy").read_bytes()).get_docs(nlp.vocab))
+    assert len(docs) == 5
+    assert all([ent.text for ent in doc.ents] == ["HRL Laboratories LLC"] for doc in docs)
@@ -0,0 +1,27 @@
+from splits import assign_split, hash_fraction, record_key
+
+def test_record_key():
+    assert record_key({"contract_id": "FA9453-24-C-X011", "text": "a"}) == "FA9453-24-C-X011"
+    assert record_key({"text": "a b", "entities": [{"type": "contract_id", "value": "N00024-22-C-0001"}]}) == "N00024-22-C-0001"
+    assert record_key({"text": " HRL  Laboratories\n LLC ", "entities": []}) == "HRL Laboratories LLC"
+
+def test_assign_split_is_stable_and_proportional():
+    keys = [f"FA9453-24-C-{i:04}" for i in range(10000)]
+    splits = [assign_split(key, 0.3) for key in keys]
+    assert splits == [assign_split(key, 0.3) for key in reversed(keys)][::-1]
+    assert 0.28 < splits.count("test") / len(keys) < 0.32
+    # Growing the test share only moves keys from train to test
+    for key, split in zip(keys, splits):
+        if split == "test":
+            assert assign_split(key, 0.4) == "test"
+
+def test_seed_changes_assignment():
+    assert hash_fraction("FA9453-24-C-X011") == hash_fraction("FA9453-24-C-X011")
+    assert hash_fraction("FA9453-24-C-X011") != hash_fraction("FA9453-24-C-X011", seed="1")
+
+def test_dev_split_is_taken_from_train():
+    keys = [f"FA9453-24-C-{i:04}" for i in range(10000)]
+    splits = [assign_split(key, 0.3, dev_size=0.15) for key in keys]
+    assert 0.13 < splits.count("dev") / len(keys) < 0.17
+    # The test set is the same with or without a dev split
+    assert [split == "test" for split in splits] == [assign_split(key, 0.3) == "test" for key in keys]
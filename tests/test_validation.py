@@ -0,0 +1,91 @@
+import json
+from collections import Counter
+from datetime import datetime
+import pytest
+from normalize import parse_date, parse_money
+from validation import check_annotation, format_histogram, validate_file, validate_files
+
+VALID = {
+    "contract_id": "FA9453-24-C-X011",
+    "federal_agency": "Air Force Research Laboratory",
+    "contract_amount": "$26,991,707",
+    "company_name": "HRL Laboratories LLC",
+    "location": "Malibu, California",
+    "contract_description": "cost-reimbursement contract for Creating Arrays for Strategic elecTro-optical program",
+    "estimated_completion_date": "July 19, 2029",
+    "funds_obligated": "$26,991,707"
+}
+
+def annotation(**fields) -> str:
+    return json.dumps({**VALID, **fields})
+
+@pytest.mark.parametrize("line, outcome", [
+    (annotation(), "ok"),
+    ("This is a string", "invalid_json"),
+    (json.dumps({"contract_id": "FA9453-24-C-X011"}), "fields"),
+    (annotation(contract_id="FA9453"), "contract_id"),
+    (annotation(contract_amount=26991707), "contract_amount"),
+    (annotation(contract_amount="26,991,707"), "contract_amount"),
+    (annotation(location="Not specified"), "location"),
+    (annotation(funds_obligated="N/A"), "funds_obligated"),
+    (annotation(company_name=""), "company_name"),
+    (annotation(estimated_completion_date="No completion date"), "estimated_completion_date"),
+    (annotation(estimated_completion_date="sometime in 2029"), "estimated_completion_date"),
+])
+def test_check_annotation(line, outcome):
+    assert check_annotation(line)[1] == outcome
+
+@pytest.mark.parametrize("raw, expected", [
+    ("July 19, 2029", datetime(2029, 7, 19)),
+    ("Sept. 30, 2024", datetime(2024, 9, 30)),
+    ("Dec 1 2025", datetime(2025, 12, 1)),
+    ("December 2025", datetime(2025, 12, 1)),
+    ("May 2025", datetime(2025, 5, 1)),
+    ("2029-07-19", None),
+    ("July 19, 2029 or later", None),
+])
+def test_parse_date(raw, expected):
+    assert parse_date(raw) == expected
+
+def test_parse_money():
+    assert parse_money("$26,991,707") == 26991707.0
+    assert parse_money("about $5 million") is None
+
+def write_day(data_dir, name: str, lines: list):
+    precontracts = [{
+        "military_branch": "AIR FORCE",
+        "source_url": "https://www.defense.gov/News/Contracts/Contract/Article/3749216/",
+        "contract_text": f"Contract {i}",
+        "contract_date": "2024-04-19T00:00:00"
+    } for i in range(3)]
+    data_dir.joinpath("clean", name).write_text(json.dumps(precontracts))
+    data_dir.joinpath("blackbox", name).write_text("\n".join(lines) + "\n")
+
+def test_validate_file_keeps_lines_aligned(data_dir):
+    write_day(data_dir, "2024-04-19_3749216.json", [annotation(), "", annotation(contract_id="FA9453-24-C-X013")])
+    contracts, outcomes = validate_file("2024-04-19_3749216.json", str(data_dir))
+    assert [(c.contract_id, c.contract_text) for c in contracts] == [
+        ("FA9453-24-C-X011", "Contract 0"), ("FA9453-24-C-X013", "Contract 2")
+    ]
+    assert contracts[0].contract_amount == 26991707.0
+    assert contracts[0].estimated_completion_date == datetime(2029, 7, 19)
+    assert outcomes == {"ok": 2, "not_annotated": 1}
+
+def test_validate_file_reports_missing_lines(data_dir):
+    write_day(data_dir, "2024-04-19_3749216.json", [annotation()])
+    _, outcomes = validate_file("2024-04-19_3749216.json", str(data_dir))
+    assert outcomes == {"ok": 1, "missing_annotation": 2}
+
+def test_validate_file_needs_no_scraper(data_dir, no_scraper):
+    write_day(data_dir, "2024-04-19_3749216.json", [annotation()] * 3)
+    _, outcomes = validate_file("2024-04-19_3749216.json", str(data_dir))
+    assert outcomes == {"ok": 3}
+
+def test_validate_files(data_dir):
+    names = [f"2024-04-{day:02d}_1.json" for day in range(1, 6)]
+    for name in names:
+        write_day(data_dir, name, [annotation(), annotation(location="N/A"), "garbage"])
+    results = list(validate_files(names, str(data_dir), workers=2))
+    assert [name for name, _, _ in results] == names
+    assert all(outcomes == {"ok": 1, "location": 1, "invalid_json": 1} for _, _, outcomes in results)
+    assert "15 annotations, 5 valid" in format_histogram(sum((outcomes for _, _, outcomes in results), Counter()))